@@ -0,0 +1,8 @@
+"""
+Career advisor chat core: catalogue, retrieval, caching, routing and the generation engine.
+
+Importing the package or any of its modules has no side effects: configuration (.env) is read,
+heavy dependencies (groq, httpx, numpy) are imported and shared resources are built only on
+first use, so the core starts fast and works without a Groq API key until a model is called.
+The Streamlit app (app.py) is a thin shell over it.
+"""
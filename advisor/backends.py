@@ -0,0 +1,385 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from advisor.config import env_number, getenv
+from advisor.groq_client import build_async_groq_client, connection_settings, pool_options
+from advisor.history import count_tokens
+from advisor.ratelimit import RateLimitedStream, UpstreamStatusError
+from advisor.resources import shared_resource
+from advisor.telemetry import get_telemetry
+
+logger = logging.getLogger(__name__)
+
+# Hedging: a second backend is tried once the primary's first token is later than its p95,
+# clamped to [min, max]; until enough samples exist the max delay is used
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_MIN_DELAY = 0.25
+DEFAULT_HEDGE_MAX_DELAY = 3.0
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+
+# First-token latencies kept per backend for the percentile estimates
+LATENCY_WINDOW = 256
+
+# Request and token rate for self-hosted backends without configured limits
+UNLIMITED_PER_MINUTE = 1e9
+
+
+async def groq_stream(client, request):
+    """
+    Stream the text deltas of a chat completion from the async Groq client.
+    """
+    completion = await client.chat.completions.create(**request, stream=True)
+    try:
+        async for chunk in completion:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+    finally:
+        # Also on cancellation, so the connection is released instead of left half-read
+        await completion.close()
+
+
+async def openai_stream(client, request):
+    """
+    Stream the text deltas of a chat completion from any OpenAI-compatible server over SSE.
+    """
+    body = dict(request, stream=True)
+    # Older servers (e.g. llama.cpp) only understand max_tokens
+    if "max_completion_tokens" in body:
+        body.setdefault("max_tokens", body["max_completion_tokens"])
+    async with client.stream("POST", "chat/completions", json=body) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            raise UpstreamStatusError(response)
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or []
+            content = (choices[0].get("delta") or {}).get("content") if choices else None
+            if content:
+                yield content
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Backend:
+    """
+    One OpenAI-compatible chat endpoint with its own client, rate limiter and circuit breaker.
+
+    kind "groq" talks to the Groq API through its SDK; kind "openai" speaks plain HTTP + SSE to
+    any OpenAI-compatible server (llama.cpp, vLLM, ...). models maps the app's model names to
+    the backend's ("*" matches any); a backend with a mapping serves only the models in it.
+    """
+
+    def __init__(self, name, kind="openai", base_url=None, api_key=None, models=None, rate_limiter=None):
+        self.name = name
+        self.kind = kind
+        self.base_url = base_url
+        self.api_key = api_key
+        self.models = models
+        self.rate_limiter = rate_limiter or RateLimitedStream(
+            groq_stream if kind == "groq" else openai_stream,
+            requests_per_minute=UNLIMITED_PER_MINUTE,
+            tokens_per_minute=UNLIMITED_PER_MINUTE,
+        )
+        self._lock = threading.Lock()
+        self._ttfts = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {"requests": 0, "errors": 0, "hedges": 0, "wins": 0}
+
+    def model_for(self, model):
+        """
+        The backend's name for model, or None if this backend does not serve it.
+        """
+        if not self.models:
+            return model
+        return self.models.get(model) or self.models.get("*")
+
+    @property
+    def healthy(self):
+        return self.rate_limiter.breaker.state != "open"
+
+    def build_client(self):
+        import httpx
+
+        if self.kind == "groq":
+            if self.api_key is None and self.base_url is None:
+                return build_async_groq_client()
+            return build_async_groq_client(connection_settings(self.api_key, self.base_url))
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        base_url = self.base_url.rstrip("/") + "/"
+        return httpx.AsyncClient(base_url=base_url, headers=headers, **pool_options(connection_settings(self.api_key)))
+
+    def stream(self, client, request):
+        return self.rate_limiter(client, request)
+
+    def hedge_delay(self, fraction, min_delay, max_delay, min_samples):
+        with self._lock:
+            samples = list(self._ttfts)
+        if len(samples) < min_samples:
+            return max_delay
+        return min(max_delay, max(min_delay, percentile(samples, fraction)))
+
+    def record(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def observe_ttft(self, seconds):
+        with self._lock:
+            self._ttfts.append(seconds)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            samples = list(self._ttfts)
+        stats["healthy"] = self.healthy
+        stats["breaker"] = self.rate_limiter.breaker.state
+        stats["p50_ttft"] = percentile(samples, 0.5)
+        stats["p95_ttft"] = percentile(samples, 0.95)
+        return stats
+
+
+class BackendClients:
+    """
+    Lazily built clients for every backend, bound to the engine's event loop.
+
+    This is what the engine's client factory returns, so reset_client() rebuilds every pool.
+    """
+
+    def __init__(self, backends):
+        self._backends = backends
+        self._clients = {}
+
+    def get(self, backend):
+        if backend.name not in self._clients:
+            self._clients[backend.name] = backend.build_client()
+        return self._clients[backend.name]
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await (client.close() if hasattr(client, "close") else client.aclose())
+            except Exception:
+                pass
+
+
+class _Attempt:
+    """
+    A streaming request to one backend whose first token is being awaited as a task.
+    """
+
+    def __init__(self, pool, clients, backend, request):
+        self.backend = backend
+        self.started_at = time.perf_counter()
+        self.iterator = pool._backend_stream(clients, backend, request).__aiter__()
+        self.first = asyncio.ensure_future(self.iterator.__anext__())
+
+    async def cancel(self):
+        self.first.cancel()
+        await asyncio.wait([self.first])
+        await self.iterator.aclose()
+
+
+class BackendPool:
+    """
+    Streams each request from the healthiest backend that serves its model, with hedging.
+
+    Backends are tried in configured order, skipping ones whose breaker is open. If the chosen
+    backend has not produced a first token by its p95 first-token time, the same request is
+    sent to the next backend too; whichever streams first is kept and the other is cancelled.
+    Errors before the first token fail over to the next backend.
+    """
+
+    def __init__(self, backends, hedging=True, hedge_percentile=DEFAULT_HEDGE_PERCENTILE,
+                 hedge_min_delay=DEFAULT_HEDGE_MIN_DELAY, hedge_max_delay=DEFAULT_HEDGE_MAX_DELAY,
+                 hedge_min_samples=DEFAULT_HEDGE_MIN_SAMPLES, on_event=None):
+        if not backends:
+            raise ValueError("at least one backend is required")
+        self.backends = list(backends)
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_min_samples = hedge_min_samples
+        # Called with (event, backend name) for "hedged", "hedge_won" and "failover"
+        self._on_event = on_event
+
+    @property
+    def primary(self):
+        return self.backends[0]
+
+    def build_clients(self):
+        return BackendClients(self.backends)
+
+    def candidates(self, model):
+        serving = [backend for backend in self.backends if backend.model_for(model) is not None]
+        return [backend for backend in serving if backend.healthy] + [backend for backend in serving if not backend.healthy]
+
+    async def _backend_stream(self, clients, backend, request):
+        backend.record("requests")
+        client = clients.get(backend)
+        async for text in backend.stream(client, dict(request, model=backend.model_for(request["model"]))):
+            yield text
+
+    def _event(self, event, backend):
+        if self._on_event is not None:
+            self._on_event(event, backend.name)
+
+    async def stream(self, clients, request):
+        """
+        Engine stream function: clients is the BackendClients built by build_clients().
+        """
+        remaining = self.candidates(request["model"])
+        if not remaining:
+            raise ValueError(f"no backend serves model {request['model']!r}")
+        attempts = [_Attempt(self, clients, remaining.pop(0), request)]
+        primary = attempts[0].backend
+        hedged = False
+        hedge_at = None
+        if self.hedging and remaining:
+            hedge_at = attempts[0].started_at + self.primary_delay(attempts[0].backend)
+
+        winner = None
+        try:
+            while winner is None:
+                timeout = None
+                if hedge_at is not None:
+                    timeout = max(0.0, hedge_at - time.perf_counter())
+                done, _ = await asyncio.wait(
+                    [attempt.first for attempt in attempts], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Primary is slower than usual: race the same request on the next backend
+                    hedge_at = None
+                    hedged = True
+                    backend = remaining.pop(0)
+                    backend.record("hedges")
+                    self._event("hedged", backend)
+                    logger.info("backends: hedging %s with %s", attempts[0].backend.name, backend.name)
+                    attempts.append(_Attempt(self, clients, backend, request))
+                    continue
+
+                for attempt in [attempt for attempt in attempts if attempt.first in done]:
+                    error = attempt.first.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = attempt
+                        break
+                    attempt.backend.record("errors")
+                    attempts.remove(attempt)
+                    await attempt.iterator.aclose()
+                    if not attempts and not remaining:
+                        raise error
+                    if not attempts:
+                        backend = remaining.pop(0)
+                        logger.warning("backends: %s failed (%s), failing over to %s",
+                                       attempt.backend.name, type(error).__name__, backend.name)
+                        self._event("failover", backend)
+                        attempts.append(_Attempt(self, clients, backend, request))
+                        hedge_at = None
+        finally:
+            for attempt in attempts:
+                if attempt is not winner:
+                    await attempt.cancel()
+
+        if hedged and winner.backend is not primary:
+            winner.backend.record("wins")
+            self._event("hedge_won", winner.backend)
+        if winner.first.exception() is not None:
+            return
+        winner.backend.observe_ttft(time.perf_counter() - winner.started_at)
+        yield winner.first.result()
+        async for text in winner.iterator:
+            yield text
+
+    def primary_delay(self, backend):
+        return backend.hedge_delay(
+            self.hedge_percentile, self.hedge_min_delay, self.hedge_max_delay, self.hedge_min_samples
+        )
+
+    def stats(self):
+        return {backend.name: backend.stats() for backend in self.backends}
+
+
+def backends_from_env(count_tokens=None, on_event=None):
+    """
+    Backends from LLM_BACKENDS, a JSON list of {name, kind, base_url, api_key_env, models, rpm,
+    tpm}; without it, the single Groq backend configured by the GROQ_* variables.
+
+    on_event(event, backend name) receives each backend's rate limiter events.
+    """
+    def events_for(name):
+        return (lambda event: on_event(event, name)) if on_event is not None else None
+
+    groq_limiter = RateLimitedStream.from_env(groq_stream, count_tokens, on_event=events_for("groq"))
+    configured = getenv("LLM_BACKENDS")
+    if not configured:
+        return [Backend("groq", kind="groq", rate_limiter=groq_limiter)]
+
+    backends = []
+    for entry in json.loads(configured):
+        name = entry["name"]
+        kind = entry.get("kind", "openai")
+        api_key = getenv(entry["api_key_env"]) if entry.get("api_key_env") else entry.get("api_key")
+        if kind == "groq" and not entry.get("base_url") and not api_key:
+            # The default Groq endpoint keeps the GROQ_* rate limits and retry settings
+            rate_limiter = RateLimitedStream.from_env(groq_stream, count_tokens, on_event=events_for(name))
+        else:
+            rate_limiter = RateLimitedStream(
+                groq_stream if kind == "groq" else openai_stream,
+                requests_per_minute=float(entry.get("rpm") or UNLIMITED_PER_MINUTE),
+                tokens_per_minute=float(entry.get("tpm") or UNLIMITED_PER_MINUTE),
+                max_attempts=int(entry.get("retry_attempts") or 2),
+                count_tokens=count_tokens,
+                on_event=events_for(name),
+            )
+        backends.append(Backend(
+            name, kind=kind, base_url=entry.get("base_url"), api_key=api_key,
+            models=entry.get("models"), rate_limiter=rate_limiter,
+        ))
+    return backends
+
+
+@shared_resource
+def get_backend_pool():
+    """
+    Return the process-wide backend pool; hedging is on with more than one backend unless
+    HEDGE_REQUESTS=0 (tuned by HEDGE_PERCENTILE, HEDGE_MIN_DELAY and HEDGE_MAX_DELAY).
+    """
+    telemetry = get_telemetry()
+    pool_events = telemetry.counter("advisor_backend_events_total", "Hedged requests, hedges won and failovers by backend")
+    pool = BackendPool(
+        backends_from_env(
+            count_tokens, on_event=lambda event, backend: telemetry.upstream_events.inc(event=event, backend=backend)
+        ),
+        hedging=getenv("HEDGE_REQUESTS", "1") != "0",
+        hedge_percentile=env_number("HEDGE_PERCENTILE", DEFAULT_HEDGE_PERCENTILE),
+        hedge_min_delay=env_number("HEDGE_MIN_DELAY", DEFAULT_HEDGE_MIN_DELAY),
+        hedge_max_delay=env_number("HEDGE_MAX_DELAY", DEFAULT_HEDGE_MAX_DELAY),
+        hedge_min_samples=env_number("HEDGE_MIN_SAMPLES", DEFAULT_HEDGE_MIN_SAMPLES, int),
+        on_event=lambda event, backend: pool_events.inc(event=event, backend=backend),
+    )
+    telemetry.gauge(
+        "advisor_backend_healthy", "1 while a backend's circuit breaker is not open",
+        lambda: {(("backend", backend.name),): int(backend.healthy) for backend in pool.backends},
+    )
+    telemetry.gauge(
+        "advisor_backend_ttft_p95_seconds", "Recent p95 time to first token by backend",
+        lambda: {
+            (("backend", name),): stats["p95_ttft"] for name, stats in pool.stats().items() if stats["p95_ttft"] is not None
+        },
+    )
+    return pool
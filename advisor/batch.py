@@ -0,0 +1,316 @@
+"""
+Answer a JSONL file of student questions offline, with the same prompts as the chat UI.
+
+    python -m advisor.batch questions.jsonl advice.jsonl [--workers 8] [--resume]
+
+Each input line is a JSON object with a "question" and optionally an "id" and a "profile"
+(an object or a string describing the student). Each output line carries the input line
+number, id, reply, answer source and timings, written as soon as the answer is complete.
+
+Input is read lazily through a bounded queue, so memory does not grow with the file. Upstream
+calls go through the shared generation engine, whose rate limiter keeps the batch within the
+Groq tier (GROQ_RPM, GROQ_TPM) and whose concurrency cap is GENERATION_MAX_CONCURRENCY.
+Progress is checkpointed next to the output file; --resume continues an interrupted run and
+answers again the lines that failed (e.g. during an upstream outage). Lines that are not valid
+input are written with an "error" instead and are not retried.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from advisor.catalogue import get_catalogue
+from advisor.chat import SYSTEM_PROMPT, get_advisor
+from advisor.history import count_tokens
+from advisor.session import Conversation
+from advisor.store import MemoryConversationStore
+from advisor.telemetry import get_telemetry
+
+# Fair-queuing key for batch generations, so a running batch shares the engine with live users
+BATCH_SESSION_ID = "batch"
+
+# Default seconds between checkpoint writes and between progress lines
+DEFAULT_CHECKPOINT_INTERVAL = 5.0
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+
+def parse_record(line):
+    """
+    The input record on one line; ValueError if it is not a JSON object with a question.
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict) or "question" not in record:
+        raise ValueError('expected a JSON object with a "question"')
+    return record
+
+
+def format_question(record):
+    """
+    The user message for one input record: the student's profile followed by their question.
+    """
+    question = str(record["question"]).strip()
+    profile = record.get("profile")
+    if not profile:
+        return question
+    if isinstance(profile, dict):
+        profile = "\n".join(f"- {key}: {value}" for key, value in profile.items() if value not in (None, ""))
+    return f"Student profile:\n{profile}\n\nQuestion: {question}"
+
+
+class Checkpoint:
+    """
+    Which input lines are done, as a low watermark plus the finished lines above it, and how
+    much of the output file those results occupy.
+
+    Saved atomically after the output is flushed, so on resume the output is cut back to the
+    saved length and every line past the watermark that is not in done is answered again.
+    """
+
+    def __init__(self, path, input_path, watermark=0, done=(), output_bytes=0):
+        self.path = path
+        self.input_path = input_path
+        self.watermark = watermark
+        self.done = set(done)
+        self.output_bytes = output_bytes
+
+    @classmethod
+    def load(cls, path, input_path):
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state["input"] != input_path:
+            raise ValueError(f"checkpoint {path} belongs to {state['input']}, not {input_path}")
+        return cls(path, input_path, state["watermark"], state["done"], state["output_bytes"])
+
+    def is_done(self, line_number):
+        return line_number < self.watermark or line_number in self.done
+
+    def mark_done(self, line_number):
+        self.done.add(line_number)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def save(self, output_bytes):
+        self.output_bytes = output_bytes
+        state = {
+            "input": self.input_path,
+            "watermark": self.watermark,
+            "done": sorted(self.done),
+            "output_bytes": output_bytes,
+        }
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temporary_path, self.path)
+
+
+class BatchStats:
+    """
+    Running totals for the progress and summary lines.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.completed = 0
+        self.failed = 0
+        self.invalid = 0
+        self.skipped = 0
+        self.output_tokens = 0
+        self.sources = {}
+
+    def record(self, result):
+        if result.get("error"):
+            self.invalid += 1
+        else:
+            self.completed += 1
+            self.output_tokens += result["output_tokens"]
+            self.sources[result["source"]] = self.sources.get(result["source"], 0) + 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started_at
+        answered = self.completed + self.failed + self.invalid
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "invalid": self.invalid,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 1),
+            "records_per_s": round(answered / elapsed, 2) if elapsed else 0.0,
+            "output_tokens_per_s": round(self.output_tokens / elapsed, 1) if elapsed else 0.0,
+            "sources": self.sources,
+        }
+
+
+def answer(advisor, overview, record):
+    """
+    Answer one record the way the chat UI answers a first message; runs on a worker thread.
+    """
+    trace = get_telemetry().start_trace("batch_item")
+    started_at = time.perf_counter()
+    try:
+        conversation = Conversation.start(MemoryConversationStore(), SYSTEM_PROMPT, overview)
+        cache_context = conversation.log.api_digest()
+        user_input = format_question(record)
+        verdict = advisor.screen(user_input, trace=trace)
+        conversation.record("user", user_input, api=verdict.allowed)
+
+        # Offline runs wait for a slot rather than take the degraded answers of a full queue
+        turn = advisor.start_turn(
+            BATCH_SESSION_ID, conversation, user_input, cache_context, trace=trace, verdict=verdict, bounded=False
+        )
+        trace.set(source=turn.source, model=turn.details.get("model"))
+        parts = []
+        first_token_at = None
+        for content in turn.chunks:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(content)
+        reply = "".join(parts)
+        advisor.finish_turn(turn, reply)
+    except Exception as e:
+        trace.finish(error=e)
+        raise
+
+    ttft = first_token_at - started_at if first_token_at is not None else None
+    trace.set(ttft=ttft)
+    trace.finish()
+    return {
+        "reply": reply,
+        "source": turn.source,
+        "model": turn.details.get("model"),
+        "output_tokens": count_tokens(reply),
+        "ttft_s": round(ttft, 3) if ttft is not None else None,
+        "total_s": round(time.perf_counter() - started_at, 3),
+    }
+
+
+async def run_batch(input_path, output_path, workers, resume=False,
+                    checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, progress_interval=DEFAULT_PROGRESS_INTERVAL,
+                    log=sys.stderr):
+    """
+    Answer every pending line of input_path into output_path and return the run summary.
+    """
+    input_path = os.path.abspath(input_path)
+    checkpoint_path = f"{output_path}.checkpoint"
+    if resume and os.path.exists(checkpoint_path):
+        checkpoint = Checkpoint.load(checkpoint_path, input_path)
+    elif os.path.exists(output_path) and os.path.getsize(output_path):
+        if resume:
+            # Without a checkpoint nothing says which lines are done, and a fresh one would truncate the output
+            raise FileNotFoundError(f"{checkpoint_path} not found; cannot resume {output_path} without it")
+        raise FileExistsError(f"{output_path} already exists; pass --resume to continue it")
+    else:
+        checkpoint = Checkpoint(checkpoint_path, input_path)
+
+    advisor = get_advisor()
+    overview = get_catalogue().overview_markdown
+    stats = BatchStats()
+    pending = asyncio.Queue(maxsize=workers * 2)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    loop = asyncio.get_running_loop()
+
+    # Results past the last checkpoint are discarded, since the checkpoint does not count them as done
+    output = open(output_path, "a+b")
+    output.truncate(checkpoint.output_bytes)
+    output.seek(0, os.SEEK_END)
+
+    def save_checkpoint():
+        output.flush()
+        os.fsync(output.fileno())
+        checkpoint.save(output.tell())
+
+    def write_result(line_number, result):
+        output.write(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+        checkpoint.mark_done(line_number)
+        stats.record(result)
+
+    async def read_input():
+        with open(input_path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f):
+                if checkpoint.is_done(line_number):
+                    stats.skipped += 1
+                elif line.strip():
+                    await pending.put((line_number, line))
+                else:
+                    checkpoint.mark_done(line_number)
+        for _ in range(workers):
+            await pending.put(None)
+
+    async def worker():
+        while (item := await pending.get()) is not None:
+            line_number, line = item
+            result = {"line": line_number, "id": None}
+            try:
+                record = parse_record(line)
+            except ValueError as e:
+                # A bad input line fails the same way every time, so it is recorded as done
+                result["error"] = f"{type(e).__name__}: {e}"
+                write_result(line_number, result)
+                continue
+            result["id"] = record.get("id")
+            try:
+                result.update(await loop.run_in_executor(executor, answer, advisor, overview, record))
+            except Exception as e:
+                # Left out of the output and the checkpoint, so --resume answers it again
+                stats.failed += 1
+                print(f"batch: line {line_number} failed ({type(e).__name__}: {e})", file=log, flush=True)
+                continue
+            write_result(line_number, result)
+
+    async def report():
+        last_checkpoint = last_progress = time.perf_counter()
+        while True:
+            await asyncio.sleep(1.0)
+            now = time.perf_counter()
+            if now - last_checkpoint >= checkpoint_interval:
+                save_checkpoint()
+                last_checkpoint = now
+            if progress_interval and now - last_progress >= progress_interval:
+                print(f"batch: {json.dumps(stats.summary())}", file=log, flush=True)
+                last_progress = now
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(read_input(), *(worker() for _ in range(workers)))
+    finally:
+        reporter.cancel()
+        save_checkpoint()
+        output.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return stats.summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL file of {id, question, profile} records")
+    parser.add_argument("output", help="JSONL file the answers are appended to")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="answers in flight at once (default: GENERATION_MAX_CONCURRENCY)",
+    )
+    parser.add_argument("--resume", action="store_true", help="continue from the output's checkpoint")
+    parser.add_argument("--checkpoint-interval", type=float, default=DEFAULT_CHECKPOINT_INTERVAL)
+    parser.add_argument("--progress-interval", type=float, default=DEFAULT_PROGRESS_INTERVAL)
+    args = parser.parse_args(argv)
+
+    workers = args.workers or get_advisor().engine.max_concurrency
+    try:
+        summary = asyncio.run(run_batch(
+            args.input, args.output, workers, resume=args.resume,
+            checkpoint_interval=args.checkpoint_interval, progress_interval=args.progress_interval,
+        ))
+    except KeyboardInterrupt:
+        print("batch: interrupted; rerun with --resume to continue", file=sys.stderr)
+        sys.exit(130)
+    except (FileExistsError, FileNotFoundError, ValueError) as e:
+        sys.exit(f"batch: {e}")
+    print(json.dumps(summary, indent=2))
+    if summary["failed"]:
+        print(f"batch: {summary['failed']} lines failed; rerun with --resume to retry them", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Opt-in capture of real chat traffic, for replaying realistic load offline (see bench.replay).
+
+Set CAPTURE_DIR to record user turns, card clicks and every upstream generation (prompt
+messages, sampling parameters, chunk payloads and the gaps between chunks) to a compressed
+JSONL file per process. Session ids are replaced by salted hashes and text is redacted first:
+CAPTURE_REDACT=pii (default) masks e-mail addresses, URLs and long numbers, and "full" also
+replaces every word with a pseudo-word of the same length. Repeated texts such as the system
+prompt are stored once and referenced by id.
+"""
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from advisor.config import env_number, getenv
+from advisor.resources import shared_resource
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+URL_PATTERN = re.compile(r"\bhttps?://\S+|\bwww\.\S+")
+NUMBER_PATTERN = re.compile(r"\+?\d[\d\s().-]{6,}\d")
+# Words, but not the <email>/<url>/<number> masks
+WORD_PATTERN = re.compile(r"(?<!<)\b[^\W\d_]+\b(?!>)")
+
+# Records waiting for the writer thread; beyond this they are dropped rather than block a turn
+MAX_PENDING_RECORDS = 10000
+
+# Texts and sessions remembered for de-duplication and hashing
+MAX_REMEMBERED = 10000
+
+# Seconds between flushes of the compressed stream
+FLUSH_INTERVAL = 2.0
+
+
+def redact(text, mode="pii", salt=""):
+    """
+    Mask personal data in text; "full" also swaps each word for a stable pseudo-word.
+    """
+    text = EMAIL_PATTERN.sub("<email>", text)
+    text = URL_PATTERN.sub("<url>", text)
+    text = NUMBER_PATTERN.sub("<number>", text)
+    if mode == "full":
+        text = WORD_PATTERN.sub(lambda match: _pseudo_word(match.group(), salt), text)
+    return text
+
+
+def _pseudo_word(word, salt):
+    digest = hashlib.blake2b(f"{salt}:{word.lower()}".encode("utf-8"), digest_size=16).digest()
+    letters = "".join(chr(ord("a") + byte % 26) for byte in digest)
+    pseudo = (letters * (len(word) // len(letters) + 1))[:len(word)]
+    return pseudo.capitalize() if word[0].isupper() else pseudo
+
+
+def open_capture_writer(path):
+    """
+    Binary stream for a new capture file, compressed by its suffix (.zst needs zstandard).
+    """
+    if path.endswith(".zst"):
+        import zstandard
+
+        return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wb")
+    return open(path, "wb")
+
+
+def open_capture_reader(path):
+    """
+    Text stream over a capture file written by open_capture_writer().
+    """
+    if path.endswith(".zst"):
+        import zstandard
+
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+    elif path.endswith(".gz"):
+        raw = gzip.open(path, "rb")
+    else:
+        raw = open(path, "rb")
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def read_capture(path):
+    """
+    Yield the records of a capture file; a file cut short by a crash ends at its last full line.
+    """
+    with open_capture_reader(path) as f:
+        try:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+        except EOFError:
+            return
+
+
+def capture_suffix(compression="zstd"):
+    """
+    File suffix for the requested compression, falling back to gzip when zstandard is missing.
+    """
+    if compression == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            logger.info("capture: zstandard is not installed, writing gzip instead")
+            compression = "gzip"
+    return {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz"}.get(compression, ".jsonl")
+
+
+class TrafficRecorder:
+    """
+    Writes capture records from any thread through a bounded queue and one writer thread.
+    """
+
+    def __init__(self, directory, redact_mode="pii", sample_rate=1.0, compression="zstd", salt=None):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory, f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{capture_suffix(compression)}"
+        )
+        self.redact_mode = redact_mode
+        self.sample_rate = sample_rate
+        self.salt = salt or os.urandom(8).hex()
+        self.dropped = 0
+        self._started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._texts = OrderedDict()
+        self._queue = queue.Queue(maxsize=MAX_PENDING_RECORDS)
+        self._writer = threading.Thread(target=self._write_loop, name="traffic-capture", daemon=True)
+        self._writer.start()
+        self._emit({"type": "start", "wall": time.time(), "redact": redact_mode})
+        atexit.register(self.close)
+
+    def now(self):
+        """
+        Seconds since the recorder started, the time base of every record.
+        """
+        return time.monotonic() - self._started_at
+
+    def session(self, session_id):
+        """
+        Anonymous id for a sampled session, or None if the session is not being captured.
+        """
+        with self._lock:
+            anonymous = self._sessions.get(session_id)
+            if anonymous is None:
+                sampled = random.random() < self.sample_rate
+                digest = hashlib.blake2b(f"{self.salt}:{session_id}".encode("utf-8"), digest_size=8).hexdigest()
+                anonymous = digest if sampled else ""
+                self._sessions[session_id] = anonymous
+                if len(self._sessions) > MAX_REMEMBERED:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+        return anonymous or None
+
+    def record_turn(self, session_id, user_input, industry=None):
+        session = self.session(session_id)
+        if session is not None:
+            self._emit({
+                "type": "turn", "session": session, "t": round(self.now(), 3),
+                "input": self._text(user_input), "industry": industry,
+            })
+
+    def record_click(self, session_id, industry):
+        session = self.session(session_id)
+        if session is not None:
+            self._emit({"type": "click", "session": session, "t": round(self.now(), 3), "industry": industry})
+
+    def record_generation(self, session_id, request, started_at, chunks, error=None):
+        """
+        One upstream generation: started_at from now(), chunks as [(seconds since start, text)].
+        """
+        session = self.session(session_id)
+        if session is None:
+            return
+        previous = 0.0
+        gaps = []
+        for offset, text in chunks:
+            gaps.append([round((offset - previous) * 1000), self._redact(text)])
+            previous = offset
+        self._emit({
+            "type": "generation",
+            "session": session,
+            "t": round(started_at, 3),
+            "model": request.get("model"),
+            "params": {key: value for key, value in request.items() if key not in ("messages", "fallback_models")},
+            "messages": [[message["role"], self._text(message["content"])] for message in request["messages"]],
+            "chunks": gaps,
+            "error": type(error).__name__ if error is not None else None,
+        })
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def _redact(self, text):
+        return redact(text, self.redact_mode, self.salt)
+
+    def _text(self, text):
+        """
+        Id of a redacted text, emitting its {"type": "text"} record the first time it is seen.
+        """
+        redacted = self._redact(text)
+        text_id = hashlib.blake2b(redacted.encode("utf-8"), digest_size=8).hexdigest()
+        with self._lock:
+            known = text_id in self._texts
+            self._texts[text_id] = True
+            self._texts.move_to_end(text_id)
+            if len(self._texts) > MAX_REMEMBERED:
+                self._texts.popitem(last=False)
+        if not known:
+            self._emit({"type": "text", "id": text_id, "text": redacted})
+        return text_id
+
+    def _emit(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        stream = open_capture_writer(self.path)
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    record = self._queue.get(timeout=FLUSH_INTERVAL)
+                except queue.Empty:
+                    record = False
+                if record is None:
+                    break
+                if record:
+                    stream.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    stream.flush()
+                    last_flush = time.monotonic()
+        except OSError as e:
+            logger.warning("capture: stopped writing %s (%s)", self.path, e)
+        finally:
+            stream.close()
+
+
+@shared_resource
+def get_traffic_recorder():
+    """
+    Return the process-wide traffic recorder, or None unless CAPTURE_DIR is set.
+
+    CAPTURE_SAMPLE_RATE picks the share of sessions recorded, CAPTURE_REDACT is "pii" or
+    "full", and CAPTURE_COMPRESSION is "zstd" (gzip when zstandard is missing), "gzip" or "none".
+    """
+    directory = getenv("CAPTURE_DIR")
+    if not directory:
+        return None
+    recorder = TrafficRecorder(
+        directory,
+        redact_mode=getenv("CAPTURE_REDACT") or "pii",
+        sample_rate=env_number("CAPTURE_SAMPLE_RATE", 1.0),
+        compression=getenv("CAPTURE_COMPRESSION") or "zstd",
+    )
+    logger.info("capture: recording traffic to %s", recorder.path)
+    return recorder
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+from types import MappingProxyType
+
+from advisor.config import ROOT, getenv
+from advisor.resources import shared_resource
+
+logger = logging.getLogger(__name__)
+
+# Versioned industry catalogue shipped with the app (override with INDUSTRIES_PATH)
+DEFAULT_CATALOGUE_PATH = os.path.join(ROOT, "data", "industries.json")
+SUPPORTED_VERSIONS = (1,)
+
+
+def _detail_markdown(industry):
+    return (
+        f"**Industry**: {industry['industry']}\n\n"
+        f"**Growth Estimate**: {industry['growth_estimate']}\n\n"
+        f"**Key Skills**: {', '.join(industry['key_skills'])}\n\n"
+        f"**High-Level Subjects**: {', '.join(industry['subjects'])}\n\n"
+        f"**Description**: {industry['description']}"
+    )
+
+
+def _index(entries, field):
+    """
+    Map each lower-cased value of a list field to the industries that list it.
+    """
+    index = {}
+    for entry in entries:
+        for value in entry[field]:
+            index.setdefault(value.lower(), []).append(entry)
+    return MappingProxyType({key: tuple(value) for key, value in index.items()})
+
+
+class Catalogue:
+    """
+    Read-only industry catalogue with precomputed markdown and lookup indexes.
+
+    A single instance is shared by every session, so nothing in it may be mutated.
+    """
+
+    def __init__(self, data):
+        version = data.get("version")
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"Unsupported industry catalogue version: {version!r}")
+
+        entries = []
+        for raw in data["industries"]:
+            entry = dict(raw)
+            entry["key_skills"] = tuple(raw["key_skills"])
+            entry["subjects"] = tuple(raw["subjects"])
+            entry["detail_markdown"] = _detail_markdown(entry)
+            entry["button_label"] = f"{entry['icon']} **{entry['industry']}**\nGrowth Estimate: {entry['growth_estimate']}"
+            entries.append(MappingProxyType(entry))
+
+        self.version = version
+        self.industries = tuple(entries)
+        self.by_name = MappingProxyType({entry["industry"].lower(): entry for entry in entries})
+        self.by_skill = _index(entries, "key_skills")
+        self.by_subject = _index(entries, "subjects")
+
+        overview = f"Here are {len(entries)} growing industries along with their estimated growth:\n\n"
+        overview += "".join(
+            f"{idx + 1}. **{entry['industry']}** - Estimated Growth: {entry['growth_estimate']}\n"
+            for idx, entry in enumerate(entries)
+        )
+        self.overview_markdown = overview
+
+    def get(self, name):
+        """
+        Look up an industry by name (case-insensitive), or None.
+        """
+        return self.by_name.get(name.lower())
+
+    def with_skill(self, skill):
+        return self.by_skill.get(skill.lower(), ())
+
+    def with_subject(self, subject):
+        return self.by_subject.get(subject.lower(), ())
+
+
+@shared_resource(max_entries=2)
+def _load_catalogue(path, mtime_ns):
+    """
+    Parse the catalogue file; cached per (path, mtime) so an edited file is picked up once.
+
+    A file that does not parse (e.g. one caught half-written) is logged once and gives None.
+    """
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return Catalogue(json.load(handle))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.error("catalogue: could not load %s (%s: %s)", path, type(e).__name__, e)
+        return None
+
+
+# Last catalogue that loaded from each path, served while the file on disk is broken
+_last_good = {}
+
+
+def get_catalogue(path=None):
+    """
+    Return the shared catalogue, reloading it if the data file has changed on disk.
+
+    If the changed file cannot be read, the last good catalogue from that path is kept.
+    """
+    path = path or getenv("INDUSTRIES_PATH") or DEFAULT_CATALOGUE_PATH
+    try:
+        catalogue = _load_catalogue(path, os.stat(path).st_mtime_ns)
+    except OSError as e:
+        # Missing for a moment, e.g. while the file is being replaced
+        logger.warning("catalogue: could not stat %s (%s)", path, e)
+        catalogue = None
+    if catalogue is not None:
+        _last_good[path] = catalogue
+        return catalogue
+    if path in _last_good:
+        return _last_good[path]
+    raise RuntimeError(f"Industry catalogue {path} could not be loaded")
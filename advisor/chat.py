@@ -0,0 +1,240 @@
+import math
+
+from advisor.capture import get_traffic_recorder
+from advisor.catalogue import get_catalogue
+from advisor.config import env_number
+from advisor.engine import SHED_HELP, SHED_METRIC, QueueFull, get_generation_engine
+from advisor.input_filter import ALLOW, Verdict, get_input_filter
+from advisor.model_router import get_model_router
+from advisor.prefetch import get_prefetcher
+from advisor.query_router import get_query_router
+from advisor.ratelimit import DEFAULT_SESSION_BURST, DEFAULT_SESSION_MESSAGES_PER_MINUTE, SessionRateLimiter
+from advisor.resources import shared_resource
+from advisor.response_cache import get_response_cache, replay_chunks
+from advisor.retrieval import retrieve_context
+from advisor.telemetry import NULL_TRACE, get_telemetry
+
+# System prompt sent at the start of every conversation
+SYSTEM_PROMPT = (
+    "You are a helpful career advisor for students. Answer concisely and, when reference material "
+    "is provided, base your answer on it."
+)
+
+# Sampling settings for chat replies
+CHAT_REQUEST = {"temperature": 1, "max_completion_tokens": 1024, "top_p": 1, "stop": None}
+
+# Appended to a reply that was cut short by a rerun, a disconnect or the Stop button
+STOPPED_MARKER = "_[stopped]_"
+
+# Replies when admission control turns a message away
+RATE_LIMITED_REPLY = "You're sending messages faster than I can answer. Please wait {seconds} s and ask again."
+BUSY_NOTICE = (
+    "_The advisor is very busy right now, so here is what I can tell you from the industry "
+    "catalogue. Ask again in a minute for a full answer._"
+)
+
+
+class Turn:
+    """
+    The answer to one user message: where it comes from and the text chunks to stream.
+
+    handle is the engine generation for "llm" turns and live prefetches (so a caller can show
+    the queue position while it waits); details holds per-turn metrics such as the model used,
+    and cache_key is set when the finished reply should go into the response cache. api is
+    False for notices (screened input, admission control) the model should not see.
+    """
+
+    def __init__(self, source, chunks, handle=None, details=None, cache_key=None, api=True):
+        self.source = source
+        self.chunks = chunks
+        self.handle = handle
+        self.details = details or {}
+        self.cache_key = cache_key
+        self.api = api
+
+
+class Advisor:
+    """
+    Answers a user message with the cheapest source that can: the local catalogue router, a
+    prefetched answer, the response cache, and only then a retrieval-grounded generation.
+
+    With a traffic recorder, every turn and card click is captured for offline replay; with an
+    input filter, off-topic, spam and abusive messages can be answered before any of that, and
+    with a session limiter, sessions sending too many messages are asked to slow down. When the
+    engine's queue is full, messages get a cache or catalogue answer instead of a generation.
+    """
+
+    def __init__(self, engine, response_cache, query_router, model_router, prefetcher, recorder=None,
+                 input_filter=None, session_limiter=None, on_shed=None):
+        self.engine = engine
+        self.response_cache = response_cache
+        self.query_router = query_router
+        self.model_router = model_router
+        self.prefetcher = prefetcher
+        self.recorder = recorder
+        self.input_filter = input_filter
+        self.session_limiter = session_limiter
+        # Called with the reason ("rate_limited") whenever a message is turned away here
+        self._on_shed = on_shed
+
+    def select_industry(self, session_id, industry):
+        """
+        A student opened an industry card: prefetch its likely follow-up questions.
+        """
+        if self.recorder is not None:
+            self.recorder.record_click(session_id, industry["industry"])
+        self.prefetcher.prefetch(industry)
+
+    def screen(self, user_input, trace=NULL_TRACE, session_id=None):
+        """
+        Verdict of the input filter on user_input; call before recording the message, so a
+        screened-out message can be kept out of the model's view of the conversation.
+
+        With a session_id, the session's message rate limit is checked first.
+        """
+        if session_id is not None and self.session_limiter is not None:
+            wait = self.session_limiter.try_acquire(session_id)
+            if wait > 0:
+                if self._on_shed is not None:
+                    self._on_shed("rate_limited")
+                trace.set(filter_label="rate_limited", filter_action="reject")
+                return Verdict(
+                    "rate_limited", 1.0, "reject", "reject", reason="rate_limited",
+                    reply=RATE_LIMITED_REPLY.format(seconds=math.ceil(wait)),
+                )
+        if self.input_filter is None:
+            return ALLOW
+        with trace.span("filter"):
+            verdict = self.input_filter.screen(user_input)
+        trace.set(filter_label=verdict.label, filter_action=verdict.would_act)
+        return verdict
+
+    def start_turn(self, session_id, conversation, user_input, cache_context, selected_industry=None,
+                   trace=NULL_TRACE, verdict=ALLOW, bounded=True):
+        """
+        Plan the reply to user_input, which must already be recorded in the conversation.
+
+        cache_context identifies the conversation state before the user message (see
+        MessageLog.api_digest); session_id is the engine's fair-queuing key; verdict is the
+        result of screen(). With bounded=False the generation waits however long the engine's
+        queue is, instead of being answered from the cache or catalogue when it is full. Each
+        phase is recorded as a span on trace.
+        """
+        if self.recorder is not None:
+            self.recorder.record_turn(session_id, user_input, selected_industry)
+
+        if not verdict.allowed:
+            return Turn("filter", [verdict.reply], details={"filter_label": verdict.label}, api=False)
+
+        with trace.span("route"):
+            routed_reply = self.query_router.route(user_input, get_catalogue())
+        if routed_reply is not None:
+            return Turn("router", [routed_reply])
+
+        with trace.span("cache_lookup"):
+            model, fallback_models, model_reason = self.model_router.choose(user_input)
+            cached_reply = self.response_cache.get(model, user_input, cache_context)
+
+            # A follow-up to the last clicked card may already have been answered in the background,
+            # unless the question is about another industry
+            prefetched = None
+            if cached_reply is None and selected_industry:
+                mentioned = self.query_router.mentioned_industries(user_input)
+                if not mentioned or selected_industry in mentioned:
+                    prefetched = self.prefetcher.lookup(selected_industry, user_input)
+
+        if prefetched is not None:
+            kind, prefetched_reply = prefetched
+            if kind == "stream":
+                return Turn("prefetch", prefetched_reply, handle=prefetched_reply)
+            return Turn("prefetch", replay_chunks(prefetched_reply))
+
+        if cached_reply is not None:
+            return Turn("cache", replay_chunks(cached_reply))
+
+        # Ground the answer in the most relevant passages from the local career corpus
+        with trace.span("retrieval"):
+            reference_context, retrieval_ms = retrieve_context(user_input)
+
+        # Cap the prompt: pinned messages, rolling summary, references and recent turns
+        with trace.span("build_prompt"):
+            prompt_messages, input_tokens = conversation.history.build_messages(
+                conversation.log.api_view(), reference_context
+            )
+
+        try:
+            handle = self.engine.submit(session_id, dict(
+                CHAT_REQUEST, model=model, fallback_models=fallback_models, messages=prompt_messages,
+            ), bounded=bounded)
+        except QueueFull:
+            return self._degraded_turn(user_input, cache_context, fallback_models, selected_industry)
+        return Turn("llm", handle, handle=handle, details={
+            "model": model,
+            "model_reason": model_reason,
+            "input_tokens": input_tokens,
+            "retrieval_ms": retrieval_ms,
+        }, cache_key=(model, user_input, cache_context))
+
+    def _degraded_turn(self, user_input, cache_context, fallback_models, selected_industry):
+        """
+        The best answer available without a generation: a cached reply from another model tier,
+        else the catalogue card or matches for the question, else the catalogue overview.
+        """
+        for model in fallback_models:
+            cached_reply = self.response_cache.get(model, user_input, cache_context)
+            if cached_reply is not None:
+                return Turn("cache", replay_chunks(cached_reply), details={"shed": "queue_full"})
+
+        catalogue = get_catalogue()
+        answer = self.query_router.catalogue_answer(user_input, catalogue, selected_industry)
+        reply = f"{BUSY_NOTICE}\n\n{answer or catalogue.overview_markdown}"
+        return Turn("degraded", replay_chunks(reply), details={"shed": "queue_full"}, api=False)
+
+    def stop_turn(self, turn, shown=""):
+        """
+        Cancel a turn's generation and return the partial reply to keep, with the stopped marker.
+
+        shown is what was already streamed to the student; a generation may have produced more.
+        """
+        partial = shown
+        if turn is not None and turn.handle is not None:
+            turn.handle.cancel()
+            partial = turn.handle.text() or shown
+        partial = partial.rstrip()
+        return f"{partial}\n\n{STOPPED_MARKER}" if partial else STOPPED_MARKER
+
+    def finish_turn(self, turn, reply):
+        """
+        Remember a generated reply for identical or near-identical later questions.
+        """
+        if turn.cache_key is not None and reply:
+            model, user_input, cache_context = turn.cache_key
+            self.response_cache.put(model, user_input, reply, cache_context)
+
+
+@shared_resource
+def get_advisor():
+    """
+    Return the process-wide advisor over the shared engine, caches and routers.
+
+    SESSION_MESSAGES_PER_MINUTE and SESSION_MESSAGE_BURST limit how fast one session may send
+    messages (0 per minute for no limit).
+    """
+    shed = get_telemetry().counter(SHED_METRIC, SHED_HELP)
+    messages_per_minute = env_number("SESSION_MESSAGES_PER_MINUTE", DEFAULT_SESSION_MESSAGES_PER_MINUTE)
+    session_limiter = None
+    if messages_per_minute > 0:
+        session_limiter = SessionRateLimiter(
+            messages_per_minute, burst=env_number("SESSION_MESSAGE_BURST", DEFAULT_SESSION_BURST, int)
+        )
+    return Advisor(
+        get_generation_engine(),
+        get_response_cache(),
+        get_query_router(),
+        get_model_router(),
+        get_prefetcher(SYSTEM_PROMPT),
+        recorder=get_traffic_recorder(),
+        input_filter=get_input_filter(),
+        session_limiter=session_limiter,
+        on_shed=lambda reason: shed.inc(reason=reason),
+    )
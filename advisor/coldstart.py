@@ -0,0 +1,74 @@
+"""
+Measure cold-start time of the advisor core and the Streamlit app in fresh interpreters.
+
+    python -m advisor.coldstart [--runs 5] [--json]
+
+Each stage runs in a new subprocess, so nothing is warm in sys.modules; the median wall time
+of --runs runs is reported, along with the heavy dependencies the stage ended up importing.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from advisor.config import ROOT
+
+HEAVY_MODULES = ("streamlit", "groq", "httpx", "numpy")
+
+STAGES = (
+    ("import core", "import advisor.chat, advisor.session, advisor.store"),
+    ("build core", "from advisor.chat import get_advisor; get_advisor()"),
+    ("import app shell", "import streamlit, static_assets, advisor.chat, advisor.session, advisor.store"),
+    (
+        "first page render",
+        "from streamlit.testing.v1 import AppTest; "
+        f"AppTest.from_file({os.path.join(ROOT, 'app.py')!r}, default_timeout=60).run()",
+    ),
+)
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(code, runs, env):
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(code=code, heavy=HEAVY_MODULES)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        timings.append(result["ms"])
+        loaded = result["loaded"]
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings), "loaded": loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    # No API key: the core must import and build without one
+    env = {key: value for key, value in os.environ.items() if key != "GROQ_API_KEY"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+
+    results = {name: measure(code, args.runs, env) for name, code in STAGES}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, result in results.items():
+        loaded = ", ".join(result["loaded"]) or "none"
+        print(f"{name:<18} {result['median_ms']:8.1f} ms median ({result['min_ms']:.1f} min)  heavy imports: {loaded}")
+
+
+if __name__ == "__main__":
+    main()
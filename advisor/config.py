@@ -0,0 +1,41 @@
+import os
+import threading
+
+# Project root (the directory holding app.py, data/ and corpus/)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+
+def load_env():
+    """
+    Load the .env file into the environment, once per process and only when a setting is read.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _env_loaded = True
+
+
+def getenv(name, default=None):
+    """
+    os.getenv after the .env file has been loaded.
+    """
+    load_env()
+    return os.getenv(name, default)
+
+
+def env_number(name, default, cast=float):
+    """
+    Read a numeric setting from the environment, falling back to the default.
+    """
+    value = getenv(name)
+    if value is None or value == "":
+        return default
+    return cast(value)
@@ -0,0 +1,442 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+from advisor.backends import get_backend_pool, groq_stream
+from advisor.capture import get_traffic_recorder
+from advisor.config import getenv
+from advisor.model_router import get_model_router
+from advisor.resources import shared_resource
+from advisor.telemetry import get_telemetry
+
+# Default number of upstream generations allowed to run at once across all sessions
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Default number of generations allowed to wait for a slot; submits beyond it are shed
+DEFAULT_MAX_QUEUE = 32
+
+# Weight of the latest generation in the running average used for wait estimates
+DURATION_SMOOTHING = 0.2
+
+# Counter of requests turned away by admission control (queue full, session rate limit)
+SHED_METRIC = "advisor_requests_shed_total"
+SHED_HELP = "Requests turned away by admission control, by reason"
+
+
+def request_key(request):
+    """
+    Canonical hash of a chat completion request (model, sampling params and messages).
+    """
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class GenerationCancelled(Exception):
+    """
+    Raised to subscribers of a generation that was stopped before it finished.
+    """
+
+
+class QueueFull(Exception):
+    """
+    Raised by submit() when the wait queue is full; nothing was queued.
+    """
+
+
+class GenerationHandle:
+    """
+    A queued or running generation; iterate it from the script thread to receive text chunks.
+
+    Chunks are kept until the generation ends, so any number of subscribers can iterate the
+    same handle and each one replays the stream from the first token.
+    """
+
+    def __init__(self, engine, session_id, request, on_complete=None):
+        self.session_id = session_id
+        self.request = request
+        self.key = None
+        self.subscribers = 1
+        self.started = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+        self.cancelled = False
+        self._task = None
+        self._callbacks = [on_complete] if on_complete is not None else []
+        self._engine = engine
+        self._chunks = []
+        self._done = False
+        self._changed = threading.Condition()
+
+    def position(self):
+        """
+        Number of queued generations that will be dispatched before this one (0 once running).
+        """
+        return self._engine.queue_position(self)
+
+    def estimated_wait(self):
+        """
+        Seconds until this generation should start, or None before any generation has finished.
+        """
+        return self._engine.estimated_wait(self)
+
+    def cancel(self):
+        """
+        Unsubscribe; the generation is stopped once no subscriber is left. Returns True if it was.
+        """
+        return self._engine.cancel(self)
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._changed:
+                while index == len(self._chunks) and not self._done:
+                    self._changed.wait()
+                new_chunks = self._chunks[index:]
+                done = self._done
+            index += len(new_chunks)
+            yield from new_chunks
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+
+    def text(self):
+        with self._changed:
+            return "".join(self._chunks)
+
+    def _put(self, text):
+        with self._changed:
+            self._chunks.append(text)
+            self._changed.notify_all()
+
+    def _close(self):
+        with self._changed:
+            self._done = True
+            self._changed.notify_all()
+
+
+class GenerationEngine:
+    """
+    Process-wide asyncio engine that runs upstream generations for every session.
+
+    A global limit caps how many generations run at once. Waiting requests are queued per
+    session and dispatched round-robin, so one student sending many messages cannot starve the
+    rest of the class. At most max_queue requests wait (None for no limit); bounded submits
+    beyond that raise QueueFull, so callers can answer another way instead of making everyone
+    wait longer. Chunks are handed back to each session's script thread through the
+    GenerationHandle.
+
+    Requests identical to one already queued or running (same model, params and messages) are
+    coalesced: they subscribe to the in-flight handle instead of opening another upstream
+    stream, so a whole class asking the same question at once costs one generation.
+    """
+
+    def __init__(self, client_factory, max_concurrency=DEFAULT_MAX_CONCURRENCY, stream=groq_stream, rate_limiter=None,
+                 coalesce=True, on_submit=None, on_cancel=None, backends=None, recorder=None,
+                 max_queue=DEFAULT_MAX_QUEUE, on_shed=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.rate_limiter = rate_limiter
+        self.backends = backends
+        self.recorder = recorder
+        self.coalesce = coalesce
+        self._on_submit = on_submit
+        self._on_cancel = on_cancel
+        self._on_shed = on_shed
+        self._cancelled = 0
+        self._shed = 0
+        self._average_duration = None
+        self._in_flight = {}
+        self._submitted = 0
+        self._coalesced = 0
+        self._client_factory = client_factory
+        self._client = None
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()
+        self._active = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="generation-engine", daemon=True)
+        self._thread.start()
+
+    def submit(self, session_id, request, on_complete=None, bounded=True):
+        """
+        Queue a chat completion request (the create() keyword arguments) for a session.
+
+        on_complete(text, error) is called on the engine thread when the generation ends, for
+        background work that nobody iterates. If an identical request is already in flight, its
+        handle is returned instead of queueing a new one. A bounded submit that would have to
+        wait while max_queue requests are already waiting raises QueueFull.
+        """
+        key = request_key(request) if self.coalesce else None
+        with self._lock:
+            handle = self._in_flight.get(key) if key is not None else None
+            # Joining an in-flight generation costs no slot, so only new ones can be shed
+            shed = handle is None and bounded and self._is_full()
+            if shed:
+                self._shed += 1
+            elif handle is not None:
+                self._submitted += 1
+                self._coalesced += 1
+                handle.subscribers += 1
+                if on_complete is not None:
+                    handle._callbacks.append(on_complete)
+            else:
+                handle = GenerationHandle(self, session_id, request, on_complete)
+                if key is not None:
+                    handle.key = key
+                    self._in_flight[key] = handle
+                self._submitted += 1
+                self._queues.setdefault(session_id, deque()).append(handle)
+        if shed:
+            if self._on_shed is not None:
+                self._on_shed()
+            raise QueueFull(f"{self.max_queue} generations are already waiting")
+        if self._on_submit is not None:
+            self._on_submit(handle.subscribers > 1)
+        if handle.subscribers == 1:
+            self._loop.call_soon_threadsafe(self._dispatch)
+        return handle
+
+    def queue_position(self, handle):
+        with self._lock:
+            session_queue = self._queues.get(handle.session_id)
+            if session_queue is None or handle not in session_queue:
+                return 0
+
+            # Round-robin order: round r dispatches the r-th waiting request of every session in turn
+            rank = session_queue.index(handle)
+            ahead = 0
+            for session_id, other in self._queues.items():
+                if session_id == handle.session_id:
+                    ahead += rank
+                    continue
+                ahead += min(len(other), rank)
+                if len(other) > rank and self._comes_before(session_id, handle.session_id):
+                    ahead += 1
+            return ahead
+
+    def estimated_wait(self, handle):
+        """
+        Seconds until handle gets a slot: the generations ahead of it (plus itself) finishing
+        max_concurrency at a time, at the running average duration of recent generations.
+        """
+        if handle.started.is_set():
+            return 0.0
+        average_duration = self._average_duration
+        if average_duration is None:
+            return None
+        return (self.queue_position(handle) + 1) * average_duration / self.max_concurrency
+
+    def cancel(self, handle):
+        """
+        Drop one subscriber of handle and stop the generation when it was the last one.
+
+        A queued generation is removed from its queue; a running one has its task cancelled on
+        the engine loop, which closes the upstream stream and releases its connection.
+        """
+        with self._lock:
+            if handle.finished.is_set() or handle.cancelled:
+                return False
+            handle.subscribers -= 1
+            if handle.subscribers > 0:
+                return False
+            handle.cancelled = True
+            self._cancelled += 1
+            if self._in_flight.get(handle.key) is handle:
+                del self._in_flight[handle.key]
+            session_queue = self._queues.get(handle.session_id)
+            queued = session_queue is not None and handle in session_queue
+            if queued:
+                session_queue.remove(handle)
+                if not session_queue:
+                    del self._queues[handle.session_id]
+        if self._on_cancel is not None:
+            self._on_cancel("queued" if queued else "running")
+        if queued:
+            handle.error = GenerationCancelled("generation stopped before it started")
+            handle._close()
+            handle.finished.set()
+            for on_complete in handle._callbacks:
+                on_complete("", handle.error)
+        else:
+            self._loop.call_soon_threadsafe(self._cancel_task, handle)
+        return True
+
+    def reset_client(self):
+        """
+        Close the async client and its connection pool; the next generation builds a fresh one.
+        """
+        self._loop.call_soon_threadsafe(self._reset_client)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "active": self._active,
+                "queued": self._queued_count(),
+                "sessions_waiting": len(self._queues),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "shed": self._shed,
+                "average_duration": self._average_duration,
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "coalescing_ratio": self._coalesced / self._submitted if self._submitted else 0.0,
+                "cancelled": self._cancelled,
+            }
+        if self.rate_limiter is not None:
+            stats["upstream"] = self.rate_limiter.stats()
+        if self.backends is not None:
+            stats["backends"] = self.backends.stats()
+        return stats
+
+    def _queued_count(self):
+        return sum(len(session_queue) for session_queue in self._queues.values())
+
+    def _is_full(self):
+        """
+        Whether a new request would have to wait beyond max_queue (called with the lock held).
+
+        Requests queued for a free slot but not dispatched yet by the loop do not count as waiting.
+        """
+        if self.max_queue is None:
+            return False
+        free_slots = max(0, self.max_concurrency - self._active)
+        return self._queued_count() >= self.max_queue + free_slots
+
+    def _comes_before(self, session_id, other_session_id):
+        for candidate in self._queues:
+            if candidate == session_id:
+                return True
+            if candidate == other_session_id:
+                return False
+        return False
+
+    def _next_handle(self):
+        """
+        Pop the next request round-robin across sessions (called with the lock held).
+        """
+        if self._active >= self.max_concurrency or not self._queues:
+            return None
+        session_id, session_queue = next(iter(self._queues.items()))
+        handle = session_queue.popleft()
+        # Move the session to the back of the ring (or drop it once it has nothing waiting)
+        del self._queues[session_id]
+        if session_queue:
+            self._queues[session_id] = session_queue
+        self._active += 1
+        return handle
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                handle = self._next_handle()
+            if handle is None:
+                return
+            handle._task = self._loop.create_task(self._run(handle))
+
+    def _cancel_task(self, handle):
+        # A task that has not taken its first step must not be cancelled: its finally would never
+        # run. _run sees handle.cancelled on that first step and finishes it instead.
+        if handle.started.is_set() and handle._task is not None and not handle._task.done():
+            handle._task.cancel()
+
+    def _reset_client(self):
+        client, self._client = self._client, None
+        if client is not None:
+            self._loop.create_task(client.close())
+
+    async def _run(self, handle):
+        handle.started.set()
+        dispatched_at = time.monotonic()
+        recorder = self.recorder
+        captured = [] if recorder is not None and recorder.session(handle.session_id) else None
+        started_at = recorder.now() if captured is not None else None
+        try:
+            # Cancelled between leaving the queue and this first step
+            if handle.cancelled:
+                raise asyncio.CancelledError
+            # The async client is bound to this loop, so it is built here on first use
+            if self._client is None:
+                self._client = self._client_factory()
+            async for text in self._stream(self._client, handle.request):
+                handle._put(text)
+                if captured is not None:
+                    captured.append((recorder.now() - started_at, text))
+        except asyncio.CancelledError:
+            handle.error = GenerationCancelled("generation stopped")
+        except Exception as e:
+            handle.error = e
+        finally:
+            # Later identical requests start a new generation (or hit the response cache)
+            with self._lock:
+                if handle.key is not None and self._in_flight.get(handle.key) is handle:
+                    del self._in_flight[handle.key]
+                callbacks = list(handle._callbacks)
+                self._active -= 1
+                if handle.error is None:
+                    duration = time.monotonic() - dispatched_at
+                    average = self._average_duration
+                    self._average_duration = duration if average is None else (
+                        average + DURATION_SMOOTHING * (duration - average)
+                    )
+            handle._close()
+            handle.finished.set()
+            self._dispatch()
+
+        for on_complete in callbacks:
+            on_complete(handle.text(), handle.error)
+        if captured is not None:
+            recorder.record_generation(handle.session_id, handle.request, started_at, captured, handle.error)
+
+
+@shared_resource
+def get_generation_engine():
+    """
+    Return the process-wide generation engine, streaming through the configured backends.
+
+    Each request goes through model-tier fallback, then the backend pool (health-ordered
+    backends with hedging), then that backend's rate limiter, retry policy and circuit breaker.
+    Clients (and the API key check) are only built on the first generation, so the engine can
+    be created without a key. Identical concurrent requests share
+    one generation unless GENERATION_COALESCE=0. GENERATION_MAX_QUEUE bounds how many may wait
+    for one of the GENERATION_MAX_CONCURRENCY slots (0 for no bound).
+    """
+    telemetry = get_telemetry()
+    backends = get_backend_pool()
+    generations = telemetry.counter(
+        "advisor_generations_submitted_total", "Generation requests, by whether they joined an identical one in flight"
+    )
+    cancelled = telemetry.counter(
+        "advisor_generations_cancelled_total", "Generations stopped by a rerun, disconnect or Stop button"
+    )
+    shed = telemetry.counter(SHED_METRIC, SHED_HELP)
+    max_queue = int(getenv("GENERATION_MAX_QUEUE") or DEFAULT_MAX_QUEUE)
+    engine = GenerationEngine(
+        backends.build_clients,
+        max_concurrency=int(getenv("GENERATION_MAX_CONCURRENCY") or DEFAULT_MAX_CONCURRENCY),
+        stream=get_model_router().wrap(backends.stream),
+        rate_limiter=backends.primary.rate_limiter,
+        coalesce=getenv("GENERATION_COALESCE", "1") != "0",
+        on_submit=lambda coalesced: generations.inc(coalesced=str(coalesced).lower()),
+        on_cancel=lambda stage: cancelled.inc(stage=stage),
+        backends=backends,
+        recorder=get_traffic_recorder(),
+        max_queue=max_queue or None,
+        on_shed=lambda: shed.inc(reason="queue_full"),
+    )
+    telemetry.gauge("advisor_generations_active", "Generations streaming right now", lambda: engine.stats()["active"])
+    telemetry.gauge("advisor_generations_queued", "Generations waiting for a slot", lambda: engine.stats()["queued"])
+    telemetry.gauge(
+        "advisor_coalescing_ratio", "Share of generation requests served by an identical in-flight one",
+        lambda: engine.stats()["coalescing_ratio"],
+    )
+    telemetry.gauge(
+        "advisor_circuit_open", "1 while the primary backend's circuit breaker is open",
+        lambda: int(backends.primary.rate_limiter.breaker.state == "open"),
+    )
+    return engine
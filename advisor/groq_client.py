@@ -0,0 +1,80 @@
+from advisor.config import env_number, getenv
+from advisor.resources import shared_resource
+
+# Defaults for the shared HTTP connection pool (overridable through the environment)
+DEFAULT_POOL_SIZE = 20
+DEFAULT_KEEPALIVE_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+
+@shared_resource
+def load_settings():
+    """
+    Return the Groq connection settings; raises ValueError only here, when a client is needed.
+    """
+    api_key = getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("API key not found. Please make sure the .env file contains 'GROQ_API_KEY'.")
+
+    return connection_settings(api_key, getenv("GROQ_BASE_URL") or None)
+
+
+def connection_settings(api_key, base_url=None):
+    """
+    Settings for one endpoint: its key and URL plus the pool options from the environment.
+    """
+    return {
+        "api_key": api_key,
+        "base_url": base_url,
+        "pool_size": env_number("GROQ_POOL_SIZE", DEFAULT_POOL_SIZE, int),
+        "keepalive_connections": env_number("GROQ_KEEPALIVE_CONNECTIONS", DEFAULT_KEEPALIVE_CONNECTIONS, int),
+        "keepalive_expiry": env_number("GROQ_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY),
+        "connect_timeout": env_number("GROQ_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT),
+        "read_timeout": env_number("GROQ_READ_TIMEOUT", DEFAULT_READ_TIMEOUT),
+    }
+
+
+def build_async_groq_client(settings=None):
+    """
+    Build an async Groq client with the configured pool settings; it must only be used on one event loop.
+
+    SDK-level retries are disabled because retries are handled by ratelimit.RateLimitedStream.
+    """
+    import httpx
+    from groq import AsyncGroq
+
+    settings = settings or load_settings()
+    return AsyncGroq(
+        api_key=settings["api_key"],
+        base_url=settings["base_url"],
+        max_retries=0,
+        http_client=httpx.AsyncClient(**pool_options(settings)),
+    )
+
+
+def pool_options(settings):
+    """
+    httpx connection limits and timeouts for a settings dict from load_settings().
+    """
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings["pool_size"],
+            max_keepalive_connections=settings["keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+        "timeout": httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"]),
+    }
+
+
+def is_connection_error(error):
+    """
+    True for errors that mean a pooled connection went bad and the pool should be rebuilt.
+    """
+    import httpx
+    from groq import APIConnectionError
+
+    return isinstance(error, (APIConnectionError, httpx.TransportError))
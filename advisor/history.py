@@ -0,0 +1,215 @@
+import logging
+import math
+import re
+import threading
+from concurrent.futures import Future
+
+from advisor.config import getenv
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the prompt budget (overridable through the environment)
+DEFAULT_MAX_PROMPT_TOKENS = 3000
+DEFAULT_WINDOW_MESSAGES = 8
+SUMMARY_MAX_TOKENS = 300
+
+# Engine session id for summaries, so they share one background fair-queue slot instead of one per student
+SUMMARY_SESSION_ID = "__summary__"
+
+# Number of leading history messages that are always sent (system prompt + seeded industries)
+PINNED_MESSAGES = 2
+
+# Fixed per-message overhead of the chat template (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below between a student and a career advisor in at most 120 words. "
+    "Keep the student's interests, background, constraints and any advice already given. "
+    "If a previous summary is provided, merge it into the new one."
+)
+
+
+def count_tokens(text):
+    """
+    Estimate the number of model tokens in a piece of text without calling the API.
+
+    Words are split into ~4-character pieces and each punctuation mark counts as one token,
+    which tracks the Llama tokenizer closely enough for budgeting.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+
+def count_message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summarize_turns(previous_summary, turns, model=None):
+    """
+    Fold older conversation turns (and the previous summary) into a short rolling summary.
+
+    The request goes through the generation engine on the fast model tier (or model), so it
+    shares the connection pool, rate limits and circuit breaker with chat turns. It is queued
+    under SUMMARY_SESSION_ID and bounded: when the engine is busy it fails with QueueFull and is
+    tried again on a later turn. Returns a Future of the summary text.
+    """
+    # Imported here: the engine imports this module (through the model router)
+    from advisor.engine import QueueFull, get_generation_engine
+    from advisor.model_router import get_model_router
+
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in turns)
+    if previous_summary:
+        transcript = f"Previous summary: {previous_summary}\n\n{transcript}"
+
+    future = Future()
+
+    def complete(text, error):
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(text.strip())
+
+    try:
+        get_generation_engine().submit(
+            SUMMARY_SESSION_ID,
+            {
+                "model": model or get_model_router().fast_model,
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript},
+                ],
+                "temperature": 0.2,
+                "max_completion_tokens": SUMMARY_MAX_TOKENS,
+            },
+            on_complete=complete,
+        )
+    except QueueFull as e:
+        future.set_exception(e)
+    return future
+
+
+class HistoryManager:
+    """
+    Builds a token-budgeted prompt from the full conversation history.
+
+    The system prompt and seeded industries message are always kept, followed by a rolling
+    summary of older turns and a sliding window of the most recent ones. Turns that slide out
+    of the window are summarized in the background, so the user's reply never waits:
+    summarize(previous_summary, turns) returns a Future of the new summary.
+    """
+
+    def __init__(self, max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS, window_messages=DEFAULT_WINDOW_MESSAGES,
+                 summarize=summarize_turns):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.window_messages = window_messages
+        self._summarize = summarize
+
+        self._summary = ""
+        # Absolute position (counting turns dropped from memory) up to which turns are summarized
+        self._summarized_upto = PINNED_MESSAGES
+        self._dropped = 0
+        self._pending = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_prompt_tokens=int(getenv("HISTORY_MAX_PROMPT_TOKENS") or DEFAULT_MAX_PROMPT_TOKENS),
+            window_messages=int(getenv("HISTORY_WINDOW_MESSAGES") or DEFAULT_WINDOW_MESSAGES),
+            summarize=lambda previous, turns: summarize_turns(
+                previous, turns, getenv("HISTORY_SUMMARY_MODEL") or None
+            ),
+        )
+
+    @property
+    def summary(self):
+        with self._lock:
+            return self._summary
+
+    def forgettable(self):
+        """
+        How many of the oldest (non-pinned) turns are already summarized and may leave memory.
+        """
+        with self._lock:
+            return self._summarized_upto - self._dropped - PINNED_MESSAGES
+
+    def forget(self, count):
+        """
+        Record that `count` of the oldest non-pinned turns were removed from the history list.
+
+        Turns removed before a summary covered them are skipped by later summaries.
+        """
+        with self._lock:
+            self._dropped += count
+            self._summarized_upto = max(self._summarized_upto, self._dropped + PINNED_MESSAGES)
+
+    def build_messages(self, history, context=""):
+        """
+        Return (messages, input_tokens) for the next API call.
+
+        A non-empty context (e.g. retrieved reference passages) is sent as an extra system message
+        and counts towards the token budget.
+        """
+        pinned = history[:PINNED_MESSAGES]
+        with self._lock:
+            summary = self._summary
+            summarized_upto = self._summarized_upto - self._dropped
+
+        summary_message = None
+        if summary:
+            summary_message = {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+        context_message = {"role": "system", "content": context} if context else None
+
+        used = sum(count_message_tokens(message) for message in pinned)
+        for extra in (summary_message, context_message):
+            if extra is not None:
+                used += count_message_tokens(extra)
+
+        # Walk back from the newest turn until the window or the token budget is full
+        window = []
+        oldest_allowed = max(summarized_upto, len(history) - self.window_messages)
+        for index in range(len(history) - 1, max(oldest_allowed, PINNED_MESSAGES) - 1, -1):
+            tokens = count_message_tokens(history[index])
+            if window and used + tokens > self.max_prompt_tokens:
+                break
+            window.append(history[index])
+            used += tokens
+        window.reverse()
+
+        self._schedule_summary(history, len(history) - len(window))
+
+        messages = list(pinned)
+        if summary_message is not None:
+            messages.append(summary_message)
+        if context_message is not None:
+            messages.append(context_message)
+        messages.extend(window)
+        return messages, used
+
+    def _schedule_summary(self, history, window_start):
+        """
+        Summarize the turns between the current summary and the window in the background.
+        """
+        with self._lock:
+            summarized_upto = self._summarized_upto - self._dropped
+            if self._pending is not None or window_start <= summarized_upto:
+                return
+            previous_summary = self._summary
+            turns = list(history[summarized_upto:window_start])
+            pending = self._pending = self._summarize(previous_summary, turns)
+            absolute_window_start = window_start + self._dropped
+
+        # Attached outside the lock: the callback runs inline if the future has already finished
+        pending.add_done_callback(lambda future: self._finish_summary(future, absolute_window_start))
+
+    def _finish_summary(self, future, window_start):
+        with self._lock:
+            self._pending = None
+            error = future.exception()
+            if error is None:
+                self._summary = future.result()
+                self._summarized_upto = max(self._summarized_upto, window_start)
+        if error is not None:
+            logger.warning("history: summarizing older turns failed (%s: %s)", type(error).__name__, error)
@@ -0,0 +1,392 @@
+"""
+Local screening of chat input before any model call: a linear classifier over hashed n-grams.
+
+    python -m advisor.input_filter evaluate [data/input_filter/eval.jsonl] [--save]
+    python -m advisor.input_filter train [data/input_filter/train.jsonl] [--output MODEL]
+
+Messages are labelled ok, off_topic (homework, chit-chat, testing the bot), spam or abuse.
+Features are word unigrams and bigrams plus character trigrams, hashed into a fixed number of
+buckets, so the shipped model is a small sparse weight table and scoring a message is a few
+hundred dictionary lookups. Fixture files are JSONL lines of {"text": ..., "label": ...}.
+
+Very short messages ("ok", "thanks!", "explain that shorter") are always allowed: they are
+follow-ups in a conversation, not something the model can judge. Training writes the model's
+evaluation report next to it, and enforce mode is only used when that report shows blocking
+precision of at least INPUT_FILTER_MIN_PRECISION; otherwise the filter stays in shadow mode.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import statistics
+import time
+import zlib
+
+from advisor.config import ROOT, env_number, getenv
+from advisor.resources import shared_resource
+
+logger = logging.getLogger(__name__)
+
+LABELS = ("ok", "off_topic", "spam", "abuse")
+
+DEFAULT_MODEL_PATH = os.path.join(ROOT, "data", "input_filter", "model.json")
+DEFAULT_TRAIN_PATH = os.path.join(ROOT, "data", "input_filter", "train.jsonl")
+DEFAULT_EVAL_PATH = os.path.join(ROOT, "data", "input_filter", "eval.jsonl")
+
+# Hash space for n-gram features
+DEFAULT_BUCKETS = 1 << 18
+
+# A non-ok label only acts when its probability reaches this
+DEFAULT_THRESHOLD = 0.6
+
+# Longer messages (pasted essays, logs) are refused before any other work
+DEFAULT_MAX_CHARS = 2000
+
+# Messages with fewer words than this are always allowed, without scoring
+DEFAULT_MIN_WORDS = 4
+
+# Enforce mode needs at least this blocking precision in the model's evaluation report
+DEFAULT_MIN_PRECISION = 0.95
+
+# Replies for screened messages, by action
+REDIRECT_REPLY = (
+    "I'm a career advisor, so I can't help with that. Try asking about careers, what to study, "
+    "or one of the growing industries above."
+)
+REJECT_REPLY = "I can only help with respectful questions about careers and study options."
+TOO_LONG_REPLY = "That message is too long for me (over {max_chars} characters). Please ask a shorter question."
+
+# What each label leads to when the filter is enforcing
+ACTIONS = {"ok": "allow", "off_topic": "redirect", "spam": "reject", "abuse": "reject"}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+URL_PATTERN = re.compile(r"https?://|www\.|\.com\b|\.ly\b")
+
+
+def features(text, buckets=DEFAULT_BUCKETS):
+    """
+    {bucket: weight} of hashed word 1-2 grams, character trigrams and a few shape features.
+    """
+    lowered = text.lower()
+    tokens = TOKEN_PATTERN.findall(lowered)
+    grams = [f"w:{token}" for token in tokens]
+    grams += [f"b:{first} {second}" for first, second in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f" {token} "
+        grams += [f"c:{padded[index:index + 3]}" for index in range(len(padded) - 2)]
+    if URL_PATTERN.search(lowered):
+        grams.append("s:url")
+    letters = [char for char in text if char.isalpha()]
+    if len(letters) >= 8 and sum(char.isupper() for char in letters) / len(letters) > 0.6:
+        grams.append("s:shouting")
+    if re.search(r"(.)\1{4,}", lowered):
+        grams.append("s:repeat")
+    grams.append(f"s:len{min(len(tokens), 40) // 5}")
+
+    counts = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode("utf-8")) % buckets
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {bucket: value / norm for bucket, value in counts.items()}
+
+
+def is_short(text, min_words=DEFAULT_MIN_WORDS):
+    return len(TOKEN_PATTERN.findall(text.lower())) < min_words
+
+
+def softmax(scores):
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [value / total for value in exps]
+
+
+class LinearModel:
+    """
+    Multinomial logistic regression over hashed features, stored as sparse per-bucket weights.
+    """
+
+    def __init__(self, labels=LABELS, buckets=DEFAULT_BUCKETS, weights=None, bias=None):
+        self.labels = tuple(labels)
+        self.buckets = buckets
+        self.weights = weights or {}
+        self.bias = list(bias or [0.0] * len(self.labels))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            labels=data["labels"],
+            buckets=data["buckets"],
+            weights={int(bucket): row for bucket, row in data["weights"].items()},
+            bias=data["bias"],
+        )
+
+    def save(self, path, precision=4, min_weight=1e-3):
+        weights = {
+            str(bucket): [round(value, precision) for value in row]
+            for bucket, row in sorted(self.weights.items())
+            if max(abs(value) for value in row) >= min_weight
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"labels": self.labels, "buckets": self.buckets, "bias": self.bias, "weights": weights},
+                      f, separators=(",", ":"))
+
+    def probabilities(self, text):
+        scores = list(self.bias)
+        for bucket, value in features(text, self.buckets).items():
+            row = self.weights.get(bucket)
+            if row is not None:
+                for index, weight in enumerate(row):
+                    scores[index] += weight * value
+        return softmax(scores)
+
+    def predict(self, text):
+        probabilities = self.probabilities(text)
+        best = max(range(len(self.labels)), key=probabilities.__getitem__)
+        return self.labels[best], probabilities[best]
+
+    def fit(self, examples, epochs=30, learning_rate=0.5, l2=1e-5, seed=0):
+        """
+        Train with plain SGD on (text, label) pairs; returns self.
+        """
+        rows = [(features(text, self.buckets), self.labels.index(label)) for text, label in examples]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(rows)
+            rate = learning_rate / (1 + epoch * 0.1)
+            for row, target in rows:
+                scores = list(self.bias)
+                for bucket, value in row.items():
+                    weights = self.weights.get(bucket)
+                    if weights is not None:
+                        for index, weight in enumerate(weights):
+                            scores[index] += weight * value
+                probabilities = softmax(scores)
+                for index, probability in enumerate(probabilities):
+                    gradient = probability - (1.0 if index == target else 0.0)
+                    self.bias[index] -= rate * gradient
+                    for bucket, value in row.items():
+                        weights = self.weights.setdefault(bucket, [0.0] * len(self.labels))
+                        weights[index] -= rate * (gradient * value + l2 * weights[index])
+        return self
+
+
+class Verdict:
+    """
+    Outcome of screening one message.
+
+    label and confidence are the model's; action is what happens ("allow", "redirect" or
+    "reject"); would_act is what enforce mode would have done, so shadow mode can be measured.
+    """
+
+    __slots__ = ("label", "confidence", "action", "would_act", "reason", "reply", "elapsed_ms")
+
+    def __init__(self, label, confidence, action, would_act, reason=None, reply=None, elapsed_ms=0.0):
+        self.label = label
+        self.confidence = confidence
+        self.action = action
+        self.would_act = would_act
+        self.reason = reason
+        self.reply = reply
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def allowed(self):
+        return self.action == "allow"
+
+
+ALLOW = Verdict("ok", 1.0, "allow", "allow")
+
+
+class InputFilter:
+    """
+    Screens user messages before routing, caching or generation.
+
+    mode "enforce" answers off-topic messages with a redirect and spam or abuse with a refusal;
+    "shadow" only records what it would have done; "off" skips the model. The length limit
+    applies in both shadow and enforce mode; messages under min_words words are always allowed.
+    """
+
+    def __init__(self, model, mode="shadow", threshold=DEFAULT_THRESHOLD, max_chars=DEFAULT_MAX_CHARS,
+                 min_words=DEFAULT_MIN_WORDS, on_verdict=None):
+        self.model = model
+        self.mode = mode
+        self.threshold = threshold
+        self.max_chars = max_chars
+        self.min_words = min_words
+        self._on_verdict = on_verdict
+
+    def screen(self, text):
+        if self.mode == "off":
+            return ALLOW
+        started_at = time.perf_counter()
+        if len(text) > self.max_chars:
+            verdict = Verdict(
+                "too_long", 1.0, "reject", "reject", reason="too_long",
+                reply=TOO_LONG_REPLY.format(max_chars=self.max_chars),
+            )
+        elif is_short(text, self.min_words):
+            verdict = Verdict("ok", 1.0, "allow", "allow", reason="short")
+        else:
+            label, confidence = self.model.predict(text)
+            would_act = ACTIONS.get(label, "allow") if confidence >= self.threshold else "allow"
+            action = would_act if self.mode == "enforce" else "allow"
+            reply = REDIRECT_REPLY if action == "redirect" else REJECT_REPLY if action == "reject" else None
+            verdict = Verdict(label, confidence, action, would_act, reason="model", reply=reply)
+        verdict.elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+        if verdict.would_act != "allow":
+            logger.info(
+                "input filter (%s): %s %.2f -> %s", self.mode, verdict.label, verdict.confidence, verdict.would_act
+            )
+        if self._on_verdict is not None:
+            self._on_verdict(verdict, self.mode)
+        return verdict
+
+
+def read_fixtures(path):
+    with open(path, encoding="utf-8") as f:
+        return [(record["text"], record["label"]) for record in map(json.loads, f) if record.get("text")]
+
+
+def evaluate(model, examples, threshold=DEFAULT_THRESHOLD, min_words=DEFAULT_MIN_WORDS):
+    """
+    Per-label precision and recall, blocked-vs-allowed precision/recall and scoring latency.
+
+    Short messages count as allowed, as they are in InputFilter.screen.
+    """
+    predictions = []
+    latencies = []
+    for text, _ in examples:
+        if is_short(text, min_words):
+            predictions.append("ok")
+            continue
+        started_at = time.perf_counter()
+        label, confidence = model.predict(text)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+        predictions.append(label if confidence >= threshold or label == "ok" else "ok")
+
+    report = {"examples": len(examples), "labels": {}}
+    for label in model.labels:
+        true_positive = sum(1 for (_, gold), predicted in zip(examples, predictions) if gold == label == predicted)
+        predicted_count = sum(1 for predicted in predictions if predicted == label)
+        gold_count = sum(1 for _, gold in examples if gold == label)
+        report["labels"][label] = {
+            "precision": true_positive / predicted_count if predicted_count else None,
+            "recall": true_positive / gold_count if gold_count else None,
+            "support": gold_count,
+        }
+
+    # What matters in production: blocked messages that should have been answered, and the reverse
+    blocked = [predicted != "ok" for predicted in predictions]
+    should_block = [gold != "ok" for _, gold in examples]
+    true_blocks = sum(1 for b, s in zip(blocked, should_block) if b and s)
+    report["blocking"] = {
+        "precision": true_blocks / sum(blocked) if sum(blocked) else None,
+        "recall": true_blocks / sum(should_block) if sum(should_block) else None,
+        "false_blocks": sum(1 for b, s in zip(blocked, should_block) if b and not s),
+    }
+    latencies = sorted(latencies) or [0.0]
+    report["latency_ms"] = {
+        "p50": statistics.median(latencies),
+        "p99": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+    }
+    return report
+
+
+def report_path(model_path):
+    """
+    Where the evaluation report of the model at model_path is kept (model.json -> model.report.json).
+    """
+    return os.path.splitext(model_path)[0] + ".report.json"
+
+
+def enforce_allowed(model_path, min_precision=DEFAULT_MIN_PRECISION):
+    """
+    (allowed, reason): whether the model's saved evaluation report supports enforce mode.
+    """
+    try:
+        with open(report_path(model_path), encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError) as e:
+        return False, f"no evaluation report ({e})"
+    precision = report.get("blocking", {}).get("precision")
+    if precision is None or precision < min_precision:
+        return False, f"blocking precision {precision} is below {min_precision}"
+    return True, f"blocking precision {precision:.2f} on {report.get('examples')} examples"
+
+
+@shared_resource
+def get_input_filter():
+    """
+    Return the process-wide input filter, configured by INPUT_FILTER_MODE (off, shadow or
+    enforce; shadow by default), INPUT_FILTER_THRESHOLD, INPUT_FILTER_MIN_WORDS, INPUT_MAX_CHARS
+    and INPUT_FILTER_MODEL. Enforce mode falls back to shadow unless the model's evaluation
+    report reaches INPUT_FILTER_MIN_PRECISION.
+    """
+    from advisor.telemetry import get_telemetry
+
+    model_path = getenv("INPUT_FILTER_MODEL") or DEFAULT_MODEL_PATH
+    mode = getenv("INPUT_FILTER_MODE") or "shadow"
+    if mode == "enforce":
+        allowed, reason = enforce_allowed(model_path, env_number("INPUT_FILTER_MIN_PRECISION", DEFAULT_MIN_PRECISION))
+        if not allowed:
+            logger.warning("input filter: enforce mode not available (%s), running in shadow mode", reason)
+            mode = "shadow"
+    verdicts = get_telemetry().counter("advisor_input_filter_total", "Screened chat messages by label and action")
+    return InputFilter(
+        LinearModel.load(model_path),
+        mode=mode,
+        threshold=env_number("INPUT_FILTER_THRESHOLD", DEFAULT_THRESHOLD),
+        max_chars=env_number("INPUT_MAX_CHARS", DEFAULT_MAX_CHARS, int),
+        min_words=env_number("INPUT_FILTER_MIN_WORDS", DEFAULT_MIN_WORDS, int),
+        on_verdict=lambda verdict, mode: verdicts.inc(label=verdict.label, action=verdict.would_act, mode=mode),
+    )
+
+
+def save_report(report, model_path):
+    with open(report_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="fit the model on a labelled fixture file, then evaluate it")
+    train.add_argument("fixtures", nargs="?", default=DEFAULT_TRAIN_PATH)
+    train.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    train.add_argument("--epochs", type=int, default=30)
+    train.add_argument("--eval", default=DEFAULT_EVAL_PATH, help="fixtures for the saved evaluation report")
+    check = commands.add_parser("evaluate", help="precision/recall of the shipped model on labelled fixtures")
+    check.add_argument("fixtures", nargs="?", default=DEFAULT_EVAL_PATH)
+    check.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    check.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    check.add_argument("--save", action="store_true", help="save the report next to the model (gates enforce mode)")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        # Short messages never reach the model, so they are not trained on either
+        examples = [(text, label) for text, label in read_fixtures(args.fixtures) if not is_short(text)]
+        model = LinearModel().fit(examples, epochs=args.epochs)
+        model.save(args.output)
+        print(f"saved {len(model.weights)} weight rows to {args.output}")
+        report = evaluate(model, read_fixtures(args.eval))
+        save_report(report, args.output)
+        print(json.dumps(report, indent=2))
+        return
+    report = evaluate(LinearModel.load(args.model), read_fixtures(args.fixtures), args.threshold)
+    if args.save:
+        save_report(report, args.model)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import hashlib
+import sys
+
+from advisor.history import PINNED_MESSAGES
+
+# Role strings are interned so every message shares the same three objects
+ROLES = {role: sys.intern(role) for role in ("system", "user", "assistant")}
+
+DISPLAY = 1
+API = 2
+
+
+class Message:
+    """
+    One conversation message; flags say whether it is shown in the chat, sent to the API, or both.
+    """
+
+    __slots__ = ("seq", "role", "content", "flags", "_payload")
+
+    def __init__(self, seq, role, content, flags):
+        self.seq = seq
+        self.role = ROLES[role]
+        self.content = content
+        self.flags = flags
+        self._payload = None
+
+    @property
+    def display(self):
+        return bool(self.flags & DISPLAY)
+
+    @property
+    def api(self):
+        return bool(self.flags & API)
+
+    def payload(self):
+        """
+        The API message dict, built once and reused on every later turn.
+        """
+        if self._payload is None:
+            self._payload = {"role": self.role, "content": self.content}
+        return self._payload
+
+
+class MessageLog:
+    """
+    Single source of truth for a session's messages, with cheap derived views.
+
+    render_view() and recent_display() yield the messages shown in the chat; api_view() is the list of payload
+    dicts sent to the model, maintained incrementally so a turn never rebuilds it. The first
+    PINNED_MESSAGES API messages (system prompt and seeded industries) are never trimmed.
+    """
+
+    __slots__ = ("next_seq", "_pinned", "_body", "_api_payloads", "_digest")
+
+    def __init__(self, next_seq=0):
+        self.next_seq = next_seq
+        self._pinned = []
+        self._body = []
+        self._api_payloads = []
+        self._digest = hashlib.sha256()
+
+    def append(self, role, content, display=True, api=True):
+        """
+        The one append path for user turns, replies, card details and errors.
+        """
+        message = Message(self.next_seq, role, content, (DISPLAY if display else 0) | (API if api else 0))
+        self.next_seq += 1
+        self._add(message)
+        return message
+
+    def _add(self, message):
+        if message.api and len(self._pinned) < PINNED_MESSAGES and not self._body:
+            self._pinned.append(message)
+        else:
+            self._body.append(message)
+        if message.api:
+            self._api_payloads.append(message.payload())
+            self._digest.update(f"{message.role}\0{message.content}\0".encode("utf-8"))
+
+    @classmethod
+    def restore(cls, pinned_rows, recent_rows, next_seq):
+        """
+        Rebuild a log from stored rows (dicts with seq, role, content, display, api).
+        """
+        log = cls(next_seq)
+        pinned_seqs = {row["seq"] for row in pinned_rows}
+        for row in pinned_rows + [row for row in recent_rows if row["seq"] not in pinned_seqs]:
+            flags = (DISPLAY if row["display"] else 0) | (API if row["api"] else 0)
+            log._add(Message(row["seq"], row["role"], row["content"], flags))
+        return log
+
+    def render_view(self):
+        for message in self._pinned:
+            if message.display:
+                yield message
+        for message in self._body:
+            if message.display:
+                yield message
+
+    def recent_display(self, limit):
+        """
+        The newest `limit` displayed messages, oldest first, and whether older displayed
+        messages are still resident. Walks backwards, so the cost depends on limit only.
+        """
+        recent = []
+        for message in reversed(self._body):
+            if message.display:
+                if len(recent) == limit:
+                    return recent[::-1], True
+                recent.append(message)
+        for message in reversed(self._pinned):
+            if message.display:
+                if len(recent) == limit:
+                    return recent[::-1], True
+                recent.append(message)
+        return recent[::-1], False
+
+    def truncated(self):
+        """
+        True if older messages were trimmed and now only live in the store (seqs are contiguous).
+        """
+        first_body_seq = self._pinned[-1].seq + 1 if self._pinned else 0
+        return bool(self._body) and self._body[0].seq > first_body_seq
+
+    def api_view(self):
+        """
+        Payload dicts for the API, pinned messages first. Callers must not mutate the list.
+        """
+        return self._api_payloads
+
+    def api_digest(self):
+        """
+        Running digest of every API message appended so far (a cheap conversation-state key).
+        """
+        return self._digest.hexdigest()
+
+    def oldest_seq(self):
+        return self._body[0].seq if self._body else self.next_seq
+
+    def trim(self, max_resident):
+        """
+        Drop the oldest non-pinned messages beyond max_resident. Returns the number of API
+        messages dropped.
+        """
+        dropped = len(self._body) - max_resident
+        if dropped <= 0:
+            return 0
+        api_dropped = sum(1 for message in self._body[:dropped] if message.api)
+        del self._body[:dropped]
+        del self._api_payloads[len(self._pinned):len(self._pinned) + api_dropped]
+        return api_dropped
+
+    def __len__(self):
+        return len(self._pinned) + len(self._body)
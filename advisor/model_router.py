@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+
+from advisor.config import getenv
+from advisor.history import count_tokens
+from advisor.resources import shared_resource
+from advisor.response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+# Model tiers, cheapest first (override with MODEL_FAST / MODEL_LARGE)
+DEFAULT_FAST_MODEL = "llama-3.1-8b-instant"
+DEFAULT_LARGE_MODEL = "llama-3.3-70b-versatile"
+
+# Seconds to wait for the first token before trying the next tier
+DEFAULT_FIRST_TOKEN_TIMEOUT = 10.0
+
+# Turns longer than this (in words) always go to the large model
+DEFAULT_MAX_FAST_WORDS = 12
+
+# Acknowledgements and rewrite requests that the small model handles well
+SIMPLE_PATTERNS = re.compile(
+    r"^(thanks|thank you|thx|ok|okay|cool|great|nice|got it|yes|no|sure|bye|goodbye|hi|hello|hey)\b"
+    r"|\b(shorter|simpler|summari[sz]e|in one sentence|in simple words|rephrase|tl ?dr|bullet points)\b"
+)
+
+# Signals of a planning or comparison question that needs the large model
+COMPLEX_PATTERNS = re.compile(
+    r"\b(plan|roadmap|step by step|steps|compare|comparison|versus|vs|pros and cons|better|should i|"
+    r"strategy|switch|transition|long term|university|bursary|scholarship|career path|why)\b"
+)
+
+
+class ModelRouter:
+    """
+    Picks a model tier per turn with cheap local rules and falls back across tiers on errors.
+
+    Short acknowledgements and rewrite requests go to the fast model; planning, comparison and
+    long questions go to the large one. Per-tier turn counts, latency and token usage are kept
+    so the thresholds can be tuned.
+    """
+
+    def __init__(self, fast_model=DEFAULT_FAST_MODEL, large_model=DEFAULT_LARGE_MODEL,
+                 max_fast_words=DEFAULT_MAX_FAST_WORDS, first_token_timeout=DEFAULT_FIRST_TOKEN_TIMEOUT):
+        self.fast_model = fast_model
+        self.large_model = large_model
+        self.max_fast_words = max_fast_words
+        self.first_token_timeout = first_token_timeout
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            fast_model=getenv("MODEL_FAST") or DEFAULT_FAST_MODEL,
+            large_model=getenv("MODEL_LARGE") or DEFAULT_LARGE_MODEL,
+            max_fast_words=int(getenv("MODEL_MAX_FAST_WORDS") or DEFAULT_MAX_FAST_WORDS),
+            first_token_timeout=float(getenv("MODEL_FIRST_TOKEN_TIMEOUT") or DEFAULT_FIRST_TOKEN_TIMEOUT),
+        )
+
+    def choose(self, user_input):
+        """
+        Return (model, fallback_models, reason) for a user turn.
+        """
+        text = normalize_prompt(user_input)
+        words = len(text.split())
+
+        if words > self.max_fast_words:
+            model, reason = self.large_model, "long"
+        elif COMPLEX_PATTERNS.search(text):
+            model, reason = self.large_model, "complex"
+        elif SIMPLE_PATTERNS.search(text) or words <= 3:
+            model, reason = self.fast_model, "simple"
+        else:
+            model, reason = self.large_model, "default"
+
+        fallbacks = [candidate for candidate in (self.large_model, self.fast_model) if candidate != model]
+        logger.info("model router: %s (%s, %d words)", model, reason, words)
+        return model, fallbacks, reason
+
+    def wrap(self, stream):
+        """
+        Wrap an engine stream function so a request's "fallback_models" are tried in order when
+        the chosen model fails or produces no first token within first_token_timeout.
+        """
+        async def tiered_stream(client, request):
+            request = dict(request)
+            models = [request["model"]] + list(request.pop("fallback_models", ()))
+            input_tokens = sum(count_tokens(message["content"]) for message in request["messages"])
+
+            for index, model in enumerate(models):
+                is_last = index == len(models) - 1
+                started_at = time.perf_counter()
+                produced = []
+                iterator = stream(client, dict(request, model=model)).__aiter__()
+                try:
+                    first = await asyncio.wait_for(iterator.__anext__(), self.first_token_timeout)
+                    ttft = time.perf_counter() - started_at
+                    produced.append(first)
+                    yield first
+                    async for text in iterator:
+                        produced.append(text)
+                        yield text
+                except StopAsyncIteration:
+                    ttft = None
+                except Exception as e:
+                    self._record(model, error=True)
+                    if produced or is_last:
+                        raise
+                    logger.warning("model router: %s failed (%s), falling back to %s", model, type(e).__name__, models[index + 1])
+                    self._record(models[index + 1], fallback=True)
+                    continue
+                finally:
+                    await iterator.aclose()
+
+                self._record(
+                    model,
+                    ttft=ttft,
+                    latency=time.perf_counter() - started_at,
+                    input_tokens=input_tokens,
+                    output_tokens=sum(count_tokens(text) for text in produced),
+                )
+                return
+
+        return tiered_stream
+
+    def _record(self, model, error=False, fallback=False, ttft=None, latency=None, input_tokens=0, output_tokens=0):
+        with self._lock:
+            stats = self._stats.setdefault(model, {
+                "turns": 0, "errors": 0, "fallbacks": 0, "ttft_total": 0.0, "latency_total": 0.0,
+                "input_tokens": 0, "output_tokens": 0,
+            })
+            if error:
+                stats["errors"] += 1
+                return
+            if fallback:
+                stats["fallbacks"] += 1
+                return
+            stats["turns"] += 1
+            stats["ttft_total"] += ttft or 0.0
+            stats["latency_total"] += latency or 0.0
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+
+    def stats(self):
+        """
+        Per-model counters with average time-to-first-token and latency.
+        """
+        with self._lock:
+            snapshot = {model: dict(stats) for model, stats in self._stats.items()}
+        for stats in snapshot.values():
+            turns = stats["turns"]
+            stats["avg_ttft"] = stats["ttft_total"] / turns if turns else None
+            stats["avg_latency"] = stats["latency_total"] / turns if turns else None
+        return snapshot
+
+
+@shared_resource
+def get_model_router():
+    """
+    Return the process-wide model router shared by every session.
+    """
+    return ModelRouter.from_env()
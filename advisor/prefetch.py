@@ -0,0 +1,235 @@
+import logging
+import re
+import threading
+import time
+
+from advisor.config import getenv
+from advisor.engine import QueueFull, get_generation_engine
+from advisor.history import count_tokens
+from advisor.model_router import get_model_router
+from advisor.ratelimit import TokenBucket
+from advisor.resources import shared_resource
+from advisor.response_cache import minhash_signature, normalize_prompt, signature_similarity
+from advisor.retrieval import retrieve_context
+
+logger = logging.getLogger(__name__)
+
+# Follow-up questions students almost always ask after opening an industry card, most likely first
+FOLLOW_UP_TEMPLATES = (
+    "What jobs are in {industry}?",
+    "What should I study for {industry}?",
+    "What are entry-level salaries in {industry}?",
+)
+
+# Defaults for the prefetch budget (overridable through the environment)
+DEFAULT_MAX_PER_CLICK = 3
+DEFAULT_TOKENS_PER_HOUR = 30000
+DEFAULT_TTL_SECONDS = 10 * 60
+DEFAULT_MATCH_THRESHOLD = 0.7
+PREFETCH_MAX_COMPLETION_TOKENS = 512
+
+# Engine session id for prefetches, so they share one fair-queue slot instead of one per student
+PREFETCH_SESSION_ID = "__prefetch__"
+
+
+# Filler words dropped before matching a question against the prefetched ones
+FILLER_WORDS = frozenset(
+    "a an and & the in for of to are is there any do does i me my you your can it this that field industry".split()
+)
+
+
+def _question_key(question, industry):
+    """
+    Normalized question without the industry name and filler words, so "what jobs are there?"
+    after clicking Technology matches the prefetched "What jobs are in Technology?".
+    """
+    text = normalize_prompt(question)
+    for part in re.split(r"[&()]", industry):
+        part = normalize_prompt(part)
+        if part:
+            text = re.sub(rf"\b{re.escape(part)}\b", " ", text)
+    return " ".join(word for word in text.split() if word not in FILLER_WORDS)
+
+
+class Prefetcher:
+    """
+    Speculatively generates answers to the likely follow-ups of an industry card click.
+
+    Answers are generated in the background on the shared engine and kept for a short time,
+    keyed by industry, so whichever student asks first gets them instantly. Spend is capped
+    by a token bucket and prefetching is skipped while real requests are queued.
+    """
+
+    def __init__(self, engine, system_prompt, max_per_click=DEFAULT_MAX_PER_CLICK,
+                 tokens_per_hour=DEFAULT_TOKENS_PER_HOUR, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 match_threshold=DEFAULT_MATCH_THRESHOLD):
+        self.engine = engine
+        self.system_prompt = system_prompt
+        self.max_per_click = max_per_click
+        self.ttl_seconds = ttl_seconds
+        self.match_threshold = match_threshold
+        self.budget = TokenBucket(tokens_per_hour / 60.0, capacity=tokens_per_hour)
+
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "launched": 0, "skipped_budget": 0, "skipped_busy": 0, "hits": 0, "misses": 0,
+            "used_tokens": 0, "wasted_tokens": 0,
+        }
+
+    def prefetch(self, industry):
+        """
+        Start background generations for the top follow-ups of an industry card.
+        """
+        self._expire()
+        if self.engine.stats()["queued"] > 0:
+            self._count("skipped_busy")
+            return
+
+        for template in FOLLOW_UP_TEMPLATES[:self.max_per_click]:
+            question = template.format(industry=industry["industry"])
+            key = (industry["industry"], _question_key(question, industry["industry"]))
+            with self._lock:
+                if key in self._entries:
+                    continue
+
+            if self.budget.try_acquire(PREFETCH_MAX_COMPLETION_TOKENS) > 0:
+                self._count("skipped_budget")
+                return
+
+            model, fallback_models, _ = get_model_router().choose(question)
+            reference_context, _ = retrieve_context(question)
+            messages = [{"role": "system", "content": self.system_prompt}]
+            if reference_context:
+                messages.append({"role": "system", "content": reference_context})
+            messages.append({"role": "assistant", "content": industry["detail_markdown"]})
+            messages.append({"role": "user", "content": question})
+
+            entry = {
+                "signature": minhash_signature(key[1]),
+                "created": time.monotonic(),
+                "text": None,
+                "handle": None,
+                "claimed": False,
+                "used": False,
+                "tokens": 0,
+            }
+            with self._lock:
+                self._entries[key] = entry
+            try:
+                entry["handle"] = self.engine.submit(
+                    PREFETCH_SESSION_ID,
+                    {
+                        "model": model,
+                        "fallback_models": fallback_models,
+                        "messages": messages,
+                        "temperature": 1,
+                        "max_completion_tokens": PREFETCH_MAX_COMPLETION_TOKENS,
+                        "top_p": 1,
+                        "stop": None,
+                    },
+                    on_complete=lambda text, error, key=key: self._complete(key, text, error),
+                )
+            except QueueFull:
+                # Real requests come first; give back the budget and stop
+                with self._lock:
+                    self._entries.pop(key, None)
+                self.budget.refund(PREFETCH_MAX_COMPLETION_TOKENS)
+                self._count("skipped_busy")
+                return
+            self._count("launched")
+            logger.info("prefetch: started %r", question)
+
+    def lookup(self, industry_name, question):
+        """
+        Return ("text", reply), ("stream", handle) or None for a question about an industry.
+        """
+        self._expire()
+        key = _question_key(question, industry_name)
+        signature = minhash_signature(key)
+
+        with self._lock:
+            best, best_score = None, self.match_threshold
+            for (entry_industry, _), entry in self._entries.items():
+                if entry_industry != industry_name:
+                    continue
+                score = signature_similarity(signature, entry["signature"])
+                if score >= best_score:
+                    best, best_score = entry, score
+
+            if best is None:
+                self._stats["misses"] += 1
+                return None
+
+            if best["text"] is not None:
+                self._mark_used(best)
+                return "text", best["text"]
+            if not best["claimed"] and best["handle"] is not None:
+                # Still generating: the first asker consumes the live stream from the start
+                best["claimed"] = True
+                self._mark_used(best)
+                return "stream", best["handle"]
+            self._stats["misses"] += 1
+            return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        asked = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / asked if asked else 0.0
+        return stats
+
+    def _mark_used(self, entry):
+        """
+        Count a hit (called with the lock held); each entry's tokens count as used only once.
+        """
+        self._stats["hits"] += 1
+        if not entry["used"]:
+            entry["used"] = True
+            self._stats["used_tokens"] += entry["tokens"]
+
+    def _complete(self, key, text, error):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if error is not None or not text:
+                del self._entries[key]
+                return
+            entry["text"] = text
+            entry["tokens"] = count_tokens(text)
+            if entry["used"]:
+                self._stats["used_tokens"] += entry["tokens"]
+
+        # Give back the part of the reservation the answer did not use
+        self.budget.refund(max(0, PREFETCH_MAX_COMPLETION_TOKENS - count_tokens(text)))
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - entry["created"] <= self.ttl_seconds or entry["text"] is None:
+                    continue
+                if not entry["used"]:
+                    self._stats["wasted_tokens"] += entry["tokens"]
+                del self._entries[key]
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+@shared_resource
+def get_prefetcher(system_prompt):
+    """
+    Return the process-wide prefetcher shared by every session.
+    """
+    return Prefetcher(
+        get_generation_engine(),
+        system_prompt,
+        max_per_click=int(getenv("PREFETCH_MAX_PER_CLICK") or DEFAULT_MAX_PER_CLICK),
+        tokens_per_hour=float(getenv("PREFETCH_TOKENS_PER_HOUR") or DEFAULT_TOKENS_PER_HOUR),
+        ttl_seconds=float(getenv("PREFETCH_TTL") or DEFAULT_TTL_SECONDS),
+        match_threshold=float(getenv("PREFETCH_MATCH_THRESHOLD") or DEFAULT_MATCH_THRESHOLD),
+    )
@@ -0,0 +1,280 @@
+import logging
+import re
+import threading
+
+from advisor.catalogue import get_catalogue
+from advisor.config import getenv
+from advisor.resources import shared_resource
+from advisor.response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+# Routed answers below this confidence fall back to the LLM
+DEFAULT_MIN_CONFIDENCE = 0.75
+
+# Keyword patterns for each catalogue intent (matched against the normalized question)
+INTENT_PATTERNS = {
+    "industries_with": re.compile(
+        r"\b(which|what) (industries|industry|sectors|fields|careers)\b.*\b(need|needs|use|uses|require|requires|want|wants|with|for|involve|involves)\b"
+    ),
+    "skills": re.compile(r"\b(skill|skills|abilities|competencies)\b"),
+    "subjects": re.compile(r"\b(subject|subjects|study|studies|course|courses|degree|degrees|major|majors)\b"),
+    "growth": re.compile(r"\b(growth|growing|grow|grows|outlook|expanding)\b"),
+}
+
+# Words that never identify a skill or subject on their own
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it me my need needs of on or that the "
+    "to use uses what which who with you your industries industry sectors fields careers require "
+    "requires want wants involve involves".split()
+)
+
+# Words shared by many skills and subjects; they only count as part of a whole skill or subject
+GENERIC_TERMS = frozenset(
+    "skill skills knowledge management systems care research design development planning control "
+    "platforms administration science engineering analysis analytics content learning software".split()
+)
+
+# Confidence of a clear single-intent lookup, and the cap for questions the catalogue cannot
+# answer literally (negations, comparisons, several industries, references to earlier turns)
+CLEAR_CONFIDENCE = 0.9
+HEDGED_CONFIDENCE = 0.3
+
+# Words that turn a lookup into a question the canned answer would get wrong
+NEGATIONS = frozenset(
+    "not no never without except instead else besides nor neither cannot don doesn isn aren didn won "
+    "wouldn shouldn".split()
+)
+COMPARISONS = frozenset(
+    "or vs versus compare compared comparison than better worse best worst between difference "
+    "slower faster higher lower more less".split()
+)
+REFERENCES = frozenset("it its that this those these they them their there same above previous".split())
+
+
+def _aliases(name):
+    """
+    Phrases that identify an industry: its full name plus the parts around '&' and brackets.
+    """
+    normalized = normalize_prompt(name)
+    aliases = {normalized, normalized.replace("&", "and")}
+    for part in re.split(r"[&()]", name):
+        part = normalize_prompt(part)
+        if part:
+            aliases.add(part)
+    if "e commerce" in normalize_prompt(name.replace("-", " ")):
+        aliases.update({"e commerce", "ecommerce"})
+    return aliases
+
+
+def _contains_phrase(text, phrase):
+    return re.search(rf"(?<![\w]){re.escape(phrase)}(?![\w])", text) is not None
+
+
+class CatalogueIndex:
+    """
+    Industry name aliases plus a word index over the catalogue's skill and subject indexes.
+    """
+
+    def __init__(self, catalogue):
+        self.catalogue = catalogue
+        self.aliases = sorted(
+            ((alias, entry) for entry in catalogue.industries for alias in _aliases(entry["industry"])),
+            key=lambda item: -len(item[0]),
+        )
+
+        # Normalized skill/subject phrase -> its Catalogue.by_skill/by_subject key, and each
+        # significant word -> the phrases containing it
+        self.phrases = {}
+        self.words = {}
+        for value in list(catalogue.by_skill) + list(catalogue.by_subject):
+            phrase = normalize_prompt(value.replace("-", " "))
+            self.phrases[phrase] = value
+            for word in phrase.split():
+                if word in STOPWORDS or word in GENERIC_TERMS or len(word) < 2:
+                    continue
+                self.words.setdefault(word, set()).add(phrase)
+
+    def _industries_with(self, value):
+        """
+        (industry name, value as the catalogue spells it) for every industry listing value.
+        """
+        for entry in self.catalogue.with_skill(value) + self.catalogue.with_subject(value):
+            for original in entry["key_skills"] + entry["subjects"]:
+                if original.lower() == value:
+                    yield entry["industry"], original
+                    break
+
+    def find_industry(self, text):
+        """
+        The industry named in the text, preferring the longest alias (e.g. 'education technology').
+        """
+        for alias, entry in self.aliases:
+            if _contains_phrase(text, alias):
+                return entry
+        return None
+
+    def find_industries(self, text):
+        """
+        Every industry named in the text; a longer alias hides the shorter ones inside it.
+        """
+        found = {}
+        for alias, entry in self.aliases:
+            pattern = rf"(?<![\w]){re.escape(alias)}(?![\w])"
+            if re.search(pattern, text):
+                found.setdefault(entry["industry"], entry)
+                text = re.sub(pattern, " ", text)
+        return list(found.values())
+
+    def find_term_matches(self, text):
+        """
+        Industries whose skills or subjects share the most words with the text.
+
+        A skill or subject matches when the text contains all of it, or one of its significant
+        words; generic words such as "skills" only count as part of a whole phrase.
+        """
+        words = set(text.split())
+        # phrase -> words of the text it matched
+        matched = {phrase: set(phrase.split()) for phrase in self.phrases if _contains_phrase(text, phrase)}
+        for word in words:
+            for phrase in self.words.get(word, ()):
+                matched.setdefault(phrase, set()).add(word)
+
+        matches = {}
+        for phrase, matched_words in matched.items():
+            for industry, original in self._industries_with(self.phrases[phrase]):
+                industry_words, values = matches.setdefault(industry, (set(), set()))
+                industry_words.update(matched_words)
+                values.add(original)
+
+        if not matches:
+            return {}
+        best = max(len(industry_words) for industry_words, _ in matches.values())
+        return {industry: values for industry, (industry_words, values) in matches.items() if len(industry_words) == best}
+
+
+class QueryRouter:
+    """
+    Answers plain catalogue lookups locally and leaves everything else to the LLM.
+    """
+
+    def __init__(self, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self._index = None
+        self._lock = threading.Lock()
+        self._stats = {"routed": 0, "fallback": 0}
+
+    def _index_for(self, catalogue):
+        index = self._index
+        if index is None or index.catalogue is not catalogue:
+            index = self._index = CatalogueIndex(catalogue)
+        return index
+
+    def route(self, question, catalogue=None):
+        """
+        Return a markdown answer for a catalogue question, or None to fall back to the LLM.
+        """
+        index = self._index_for(catalogue or get_catalogue())
+        text = normalize_prompt(question)
+
+        intent, confidence, answer = self._classify(index, text)
+        routed = answer is not None and confidence >= self.min_confidence
+
+        with self._lock:
+            self._stats["routed" if routed else "fallback"] += 1
+            hit_ratio = self._stats["routed"] / (self._stats["routed"] + self._stats["fallback"])
+        logger.info(
+            "query router: intent=%s confidence=%.2f routed=%s hit_ratio=%.2f",
+            intent, confidence, routed, hit_ratio,
+        )
+        return answer if routed else None
+
+    def mentioned_industries(self, question, catalogue=None):
+        """
+        Names of the industries a question is about: those it names, else those whose skills
+        or subjects it mentions.
+        """
+        index = self._index_for(catalogue or get_catalogue())
+        text = normalize_prompt(question)
+        named = index.find_industries(text)
+        if named:
+            return {entry["industry"] for entry in named}
+        return set(index.find_term_matches(text))
+
+    def catalogue_answer(self, question, catalogue=None, industry_name=None):
+        """
+        Best-effort catalogue answer for when no generation can be afforded: the card of the
+        industry named in the question (or of industry_name), else the industries whose skills
+        or subjects it mentions, else None.
+        """
+        catalogue = catalogue or get_catalogue()
+        index = self._index_for(catalogue)
+        text = normalize_prompt(question)
+        industry = index.find_industry(text) or (catalogue.get(industry_name) if industry_name else None)
+        if industry is not None:
+            return industry["detail_markdown"]
+        matches = index.find_term_matches(text)
+        if matches:
+            lines = [f"- **{industry}** ({', '.join(sorted(values))})" for industry, values in sorted(matches.items())]
+            return "These growing industries relate to what you asked about:\n\n" + "\n".join(lines)
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["routed"] + stats["fallback"]
+        stats["hit_ratio"] = stats["routed"] / total if total else 0.0
+        return stats
+
+    def _classify(self, index, text):
+        words = text.split()
+        # Long or open-ended questions need the model, whatever keywords they contain
+        if len(words) > 14:
+            return None, 0.0, None
+
+        intent, confidence, answer = self._lookup(index, text)
+        # A canned answer ignores "not", "or", "than" and "it", so those questions go to the model
+        hedged = NEGATIONS.union(COMPARISONS, REFERENCES).intersection(words)
+        if hedged:
+            confidence = min(confidence, HEDGED_CONFIDENCE)
+        return intent, confidence, answer
+
+    def _lookup(self, index, text):
+        if INTENT_PATTERNS["industries_with"].search(text):
+            matches = index.find_term_matches(text)
+            if matches:
+                lines = [
+                    f"- **{industry}** ({', '.join(sorted(values))})"
+                    for industry, values in sorted(matches.items())
+                ]
+                return "industries_with", CLEAR_CONFIDENCE, "These growing industries match what you asked about:\n\n" + "\n".join(lines)
+            return "industries_with", HEDGED_CONFIDENCE, None
+
+        industries = index.find_industries(text)
+        if not industries:
+            return None, 0.0, None
+
+        intents = [intent for intent in ("skills", "subjects", "growth") if INTENT_PATTERNS[intent].search(text)]
+        if not intents:
+            return None, 0.2, None
+        answer = self._answer(intents[0], industries[0])
+        # One industry and one thing asked about it is a lookup; anything more is a real question
+        if len(industries) > 1 or len(intents) > 1:
+            return intents[0], HEDGED_CONFIDENCE, answer
+        return intents[0], CLEAR_CONFIDENCE, answer
+
+    @staticmethod
+    def _answer(intent, industry):
+        if intent == "skills":
+            return f"**Key skills for {industry['industry']}**: {', '.join(industry['key_skills'])}."
+        if intent == "subjects":
+            return f"**High-level subjects for {industry['industry']}**: {', '.join(industry['subjects'])}."
+        return f"**{industry['industry']}** is growing at an estimated **{industry['growth_estimate']}**."
+
+
+@shared_resource
+def get_query_router():
+    """
+    Return the process-wide query router shared by every session.
+    """
+    return QueryRouter(min_confidence=float(getenv("ROUTER_MIN_CONFIDENCE") or DEFAULT_MIN_CONFIDENCE))
@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from advisor.config import getenv
+
+logger = logging.getLogger(__name__)
+
+# Defaults match the Groq free tier for llama-3.3-70b-versatile (override with GROQ_RPM / GROQ_TPM)
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 6000
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 20.0
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+
+# Chat messages a single session may send per minute, and how many it may send back to back
+DEFAULT_SESSION_MESSAGES_PER_MINUTE = 10
+DEFAULT_SESSION_BURST = 5
+MAX_TRACKED_SESSIONS = 10000
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling upstream while the circuit breaker is open.
+    """
+
+
+class UpstreamStatusError(Exception):
+    """
+    Non-2xx answer from an OpenAI-compatible endpoint called without the Groq SDK.
+    """
+
+    def __init__(self, response):
+        super().__init__(f"upstream answered {response.status_code}: {response.text[:200]}")
+        self.response = response
+        self.status_code = response.status_code
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute, holding at most capacity tokens.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount=1):
+        """
+        Take amount tokens if available; otherwise return the seconds until they will be.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    async def acquire(self, amount=1):
+        while True:
+            wait = self.try_acquire(amount)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def refund(self, amount):
+        """
+        Give back tokens that were reserved but not used (e.g. a reply shorter than max tokens).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class SessionRateLimiter:
+    """
+    One token bucket per session, for the number of chat messages it may send.
+
+    Buckets of the least recently seen sessions are dropped beyond max_sessions; a dropped
+    session simply starts again with a full bucket.
+    """
+
+    def __init__(self, messages_per_minute=DEFAULT_SESSION_MESSAGES_PER_MINUTE, burst=DEFAULT_SESSION_BURST,
+                 max_sessions=MAX_TRACKED_SESSIONS):
+        self.messages_per_minute = messages_per_minute
+        self.burst = burst
+        self.max_sessions = max_sessions
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, session_id):
+        """
+        Count one message; return 0.0 if it is allowed, else the seconds until it would be.
+        """
+        with self._lock:
+            bucket = self._buckets.get(session_id)
+            if bucket is None:
+                bucket = self._buckets[session_id] = TokenBucket(self.messages_per_minute, capacity=self.burst)
+                if len(self._buckets) > self.max_sessions:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(session_id)
+        return bucket.try_acquire()
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and fails fast for cooldown seconds,
+    then lets a single trial request through (half-open) before closing again.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_BREAKER_FAILURES, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "open" or (state == "half-open" and self._trial_running):
+                raise CircuitOpenError("The model API is unavailable right now; please try again shortly.")
+            if state == "half-open":
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def abandon(self):
+        """
+        The call was cancelled before it succeeded or failed; let another trial through.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                logger.warning("circuit breaker opened after %d consecutive failures", self._failures)
+
+
+def _status_code(error):
+    from groq import APIStatusError
+
+    if isinstance(error, (APIStatusError, UpstreamStatusError)):
+        return error.status_code
+    return None
+
+
+def is_retryable(error):
+    import httpx
+    from groq import APIConnectionError, APITimeoutError
+
+    if isinstance(error, (APIConnectionError, APITimeoutError, httpx.TransportError)):
+        return True
+    status_code = _status_code(error)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+def is_upstream_failure(error):
+    """
+    Errors that mean upstream is unhealthy (as opposed to rate limiting or a bad request).
+    """
+    return is_retryable(error) and _status_code(error) != 429
+
+
+def retry_after(error):
+    """
+    Seconds the server asked us to wait (retry-after header), or None.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """
+    Exponential backoff with full jitter for the given (1-based) attempt.
+    """
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+class RateLimitedStream:
+    """
+    Wraps an engine stream function with rate limiting, retries and a circuit breaker.
+
+    Requests wait on local request/token buckets before going upstream. 429s, 5xx and
+    connection errors are retried with jittered exponential backoff (honouring retry-after)
+    as long as no text has been streamed yet, and repeated failures trip the breaker.
+    """
+
+    def __init__(self, stream, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, breaker=None, count_tokens=None,
+                 on_event=None):
+        self._stream = stream
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._buckets = {}
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._count_tokens = count_tokens or (lambda text: len(text) // 4 + 1)
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+        # Called with the event name ("requests", "retries", ...) for metrics export
+        self._on_event = on_event
+
+    @classmethod
+    def from_env(cls, stream, count_tokens=None, on_event=None):
+        return cls(
+            stream,
+            requests_per_minute=float(getenv("GROQ_RPM") or DEFAULT_REQUESTS_PER_MINUTE),
+            tokens_per_minute=float(getenv("GROQ_TPM") or DEFAULT_TOKENS_PER_MINUTE),
+            max_attempts=int(getenv("GROQ_RETRY_ATTEMPTS") or DEFAULT_MAX_ATTEMPTS),
+            breaker=CircuitBreaker(
+                failure_threshold=int(getenv("GROQ_BREAKER_FAILURES") or DEFAULT_BREAKER_FAILURES),
+                cooldown=float(getenv("GROQ_BREAKER_COOLDOWN") or DEFAULT_BREAKER_COOLDOWN),
+            ),
+            count_tokens=count_tokens,
+            on_event=on_event,
+        )
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["breaker"] = self.breaker.state
+        return stats
+
+    def buckets(self, model):
+        """
+        (requests, tokens) buckets for a model; Groq enforces its limits per model.
+        """
+        with self._stats_lock:
+            if model not in self._buckets:
+                self._buckets[model] = (TokenBucket(self.requests_per_minute), TokenBucket(self.tokens_per_minute))
+            return self._buckets[model]
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+        if self._on_event is not None:
+            self._on_event(key)
+
+    def _reserve_tokens(self, request):
+        prompt = sum(self._count_tokens(message["content"]) for message in request["messages"])
+        return prompt + request.get("max_completion_tokens", 1024)
+
+    async def __call__(self, client, request):
+        reserved = self._reserve_tokens(request)
+        requests, tokens = self.buckets(request.get("model"))
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+
+            try:
+                await requests.acquire()
+                await tokens.acquire(reserved)
+            except BaseException:
+                # Cancelled while waiting for a bucket: a half-open trial must not stay claimed
+                self.breaker.abandon()
+                raise
+            self._count("requests")
+
+            produced = []
+            try:
+                async for text in self._stream(client, request):
+                    produced.append(text)
+                    yield text
+            except Exception as e:
+                if is_upstream_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.abandon()
+                self._count("failures")
+                # Only retry before anything has been shown, otherwise the reply would repeat
+                if produced or not is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                tokens.refund(reserved)
+                delay = retry_after(e)
+                if delay is None:
+                    delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                self._count("retries")
+                logger.info("retrying upstream call in %.2fs after %s (attempt %d)", delay, type(e).__name__, attempt)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled by the consumer (e.g. a stopped generation): hand back the unused tokens
+                self.breaker.abandon()
+                used = sum(self._count_tokens(text) for text in produced)
+                tokens.refund(max(0, request.get("max_completion_tokens", 1024) - used))
+                raise
+
+            self.breaker.record_success()
+            used = sum(self._count_tokens(text) for text in produced)
+            tokens.refund(max(0, request.get("max_completion_tokens", 1024) - used))
+            return
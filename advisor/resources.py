@@ -0,0 +1,24 @@
+import functools
+import threading
+
+
+def shared_resource(func=None, *, max_entries=None):
+    """
+    Memoize a getter per process, like st.cache_resource but without importing Streamlit.
+
+    Creation is serialized per getter so concurrent sessions never build two copies, and
+    getter.clear() drops the cached values (e.g. to rebuild a broken connection pool).
+    """
+    if func is None:
+        return lambda func: shared_resource(func, max_entries=max_entries)
+
+    cached = functools.lru_cache(maxsize=max_entries)(func)
+    lock = threading.RLock()
+
+    @functools.wraps(func)
+    def getter(*args, **kwargs):
+        with lock:
+            return cached(*args, **kwargs)
+
+    getter.clear = cached.cache_clear
+    return getter
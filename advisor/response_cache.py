@@ -0,0 +1,229 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from advisor.config import getenv
+from advisor.resources import shared_resource
+
+# Defaults for the shared response cache (overridable through the environment)
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+
+# MinHash signature layout: NUM_BANDS * ROWS_PER_BAND permutations
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_rng = random.Random(1234)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_BANDS * ROWS_PER_BAND)
+]
+
+_NON_WORD = re.compile(r"[^a-z0-9&+# ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_prompt(text):
+    """
+    Lower-case a prompt and strip punctuation and repeated whitespace.
+    """
+    text = _NON_WORD.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def _shingles(normalized):
+    """
+    Word unigrams and bigrams of a normalized prompt.
+    """
+    words = normalized.split()
+    shingles = set(words)
+    shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return shingles
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash_signature(normalized):
+    """
+    MinHash signature of a normalized prompt (one value per permutation).
+    """
+    hashes = [_hash64(shingle) for shingle in _shingles(normalized)] or [0]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def signature_similarity(left, right):
+    """
+    Estimated Jaccard similarity of two MinHash signatures.
+    """
+    return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+def _bands(signature):
+    for band in range(NUM_BANDS):
+        start = band * ROWS_PER_BAND
+        yield band, signature[start:start + ROWS_PER_BAND]
+
+
+class ResponseCache:
+    """
+    Bounded LRU/TTL cache of assistant replies keyed on the normalized prompt and its context.
+
+    Near-duplicate prompts (same context, similar wording) are matched through a local
+    MinHash/LSH index, so "What skills do I need for Technology?" and "what skills do i need
+    for technology" share one entry.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD, near_duplicates=True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.near_duplicates = near_duplicates
+
+        self._entries = OrderedDict()
+        self._bands = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(model, prompt, context):
+        """
+        Exact-match key for a prompt: model, normalized prompt and a digest of the context.
+        """
+        context_digest = hashlib.sha256(context.encode("utf-8")).hexdigest()[:16]
+        return (model, context_digest, normalize_prompt(prompt))
+
+    def get(self, model, prompt, context=""):
+        """
+        Return the cached reply for the prompt, or None on a miss.
+        """
+        key = self.make_key(model, prompt, context)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry, now):
+                self._remove(key)
+                self._stats["expired"] += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry["reply"]
+
+            if self.near_duplicates:
+                match = self._find_near_duplicate(key, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self._stats["near_hits"] += 1
+                    return self._entries[match]["reply"]
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, model, prompt, reply, context=""):
+        """
+        Store a reply, evicting the least recently used entries beyond max_entries.
+        """
+        if not reply:
+            return
+        key = self.make_key(model, prompt, context)
+        signature = minhash_signature(key[2]) if self.near_duplicates else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"reply": reply, "stored_at": time.monotonic(), "signature": signature}
+            if signature is not None:
+                for band in _bands(signature):
+                    self._bands.setdefault((key[0], key[1]) + band, set()).add(key)
+            self._stats["stores"] += 1
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        """
+        Snapshot of the hit/miss counters, including the overall hit rate.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+
+    def _is_expired(self, entry, now):
+        return self.ttl_seconds is not None and now - entry["stored_at"] > self.ttl_seconds
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        if entry["signature"] is None:
+            return
+        for band in _bands(entry["signature"]):
+            band_key = (key[0], key[1]) + band
+            bucket = self._bands.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bands[band_key]
+
+    def _find_near_duplicate(self, key, now):
+        signature = minhash_signature(key[2])
+
+        candidates = set()
+        for band in _bands(signature):
+            candidates.update(self._bands.get((key[0], key[1]) + band, ()))
+
+        best_key, best_score = None, self.similarity_threshold
+        for candidate in candidates:
+            entry = self._entries[candidate]
+            if self._is_expired(entry, now):
+                continue
+            score = signature_similarity(signature, entry["signature"])
+            if score >= best_score:
+                best_key, best_score = candidate, score
+        return best_key
+
+
+def replay_chunks(reply, words_per_chunk=3):
+    """
+    Split a cached reply into small text chunks so it can be replayed like a live stream.
+    """
+    words = reply.split(" ")
+    for start in range(0, len(words), words_per_chunk):
+        chunk = " ".join(words[start:start + words_per_chunk])
+        yield chunk if start + words_per_chunk >= len(words) else chunk + " "
+
+
+@shared_resource
+def get_response_cache():
+    """
+    Return the process-wide response cache shared by every session.
+    """
+    ttl = getenv("RESPONSE_CACHE_TTL")
+    return ResponseCache(
+        max_entries=int(getenv("RESPONSE_CACHE_MAX_ENTRIES") or DEFAULT_MAX_ENTRIES),
+        ttl_seconds=float(ttl) if ttl else DEFAULT_TTL_SECONDS,
+        similarity_threshold=float(getenv("RESPONSE_CACHE_SIMILARITY") or DEFAULT_SIMILARITY_THRESHOLD),
+        near_duplicates=getenv("RESPONSE_CACHE_NEAR_DUPLICATES", "1") != "0",
+    )
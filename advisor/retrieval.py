@@ -0,0 +1,383 @@
+import glob
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+from advisor.catalogue import get_catalogue
+from advisor.config import ROOT, env_number, getenv
+from advisor.resources import shared_resource
+
+logger = logging.getLogger(__name__)
+
+# Where extra career documents (markdown or JSON) are dropped, and where the index is written
+DEFAULT_CORPUS_DIR = os.path.join(ROOT, "corpus")
+DEFAULT_INDEX_DIR = os.path.join(ROOT, ".cache", "retrieval")
+
+# BM25 parameters and passage sizing
+BM25_K1 = 1.2
+BM25_B = 0.75
+DEFAULT_TOP_K = 3
+MAX_PASSAGE_WORDS = 120
+
+# Seconds between background checks of the corpus for changes (RETRIEVAL_RECHECK_SECONDS)
+DEFAULT_RECHECK_INTERVAL = 30.0
+
+_WORDS = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a about an and are as at be by can do does for from how i in into is it its me my of on or so "
+    "that the their there this to was what when which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    return [word for word in _WORDS.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _split_markdown(text, source):
+    """
+    Split a markdown document into passages of at most MAX_PASSAGE_WORDS words, keeping headings.
+    """
+    passages = []
+    heading = ""
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        if block.startswith("#"):
+            heading = block.lstrip("#").strip()
+            continue
+        words = block.split()
+        for start in range(0, len(words), MAX_PASSAGE_WORDS):
+            body = " ".join(words[start:start + MAX_PASSAGE_WORDS])
+            passages.append({"source": source, "title": heading, "text": body})
+    return passages
+
+
+def _load_json(path, source):
+    """
+    JSON corpus files hold a list of passages: strings or objects with "text" (and optional "title").
+
+    Items without a text are skipped and logged.
+    """
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    if isinstance(data, dict):
+        data = data.get("passages", [])
+    if not isinstance(data, list):
+        raise ValueError("expected a list of passages")
+
+    passages = []
+    skipped = 0
+    for item in data:
+        if isinstance(item, str):
+            item = {"text": item}
+        if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+            skipped += 1
+            continue
+        passages.append({"source": source, "title": str(item.get("title") or ""), "text": item["text"]})
+    if skipped:
+        logger.warning("retrieval: skipped %d passages without a text in %s", skipped, source)
+    return passages
+
+
+def _corpus_files(corpus_dir):
+    patterns = ("**/*.md", "**/*.markdown", "**/*.json")
+    files = set()
+    for pattern in patterns:
+        files.update(glob.glob(os.path.join(corpus_dir, pattern), recursive=True))
+    return sorted(files)
+
+
+def collect_passages(catalogue, corpus_dir):
+    """
+    Passages from the industry catalogue followed by every document in the corpus directory;
+    files that cannot be read or parsed are logged and left out.
+    """
+    passages = [
+        {"source": "catalogue", "title": entry["industry"], "text": entry["detail_markdown"]}
+        for entry in catalogue.industries
+    ]
+    for path in _corpus_files(corpus_dir):
+        source = os.path.relpath(path, corpus_dir)
+        try:
+            if path.endswith(".json"):
+                passages.extend(_load_json(path, source))
+            else:
+                with open(path, encoding="utf-8") as handle:
+                    passages.extend(_split_markdown(handle.read(), source))
+        except (OSError, ValueError) as e:
+            # One broken document must not keep the rest of the corpus out of the index
+            logger.error("retrieval: skipped corpus file %s (%s: %s)", source, type(e).__name__, e)
+    return passages
+
+
+def corpus_fingerprint(catalogue, corpus_dir):
+    """
+    Digest of everything the index is built from, used as the on-disk index directory name.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"bm25:{BM25_K1}:{BM25_B}:{MAX_PASSAGE_WORDS}".encode())
+    for entry in catalogue.industries:
+        digest.update(entry["detail_markdown"].encode("utf-8"))
+    for path in _corpus_files(corpus_dir):
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:20]
+
+
+def build_index(passages, index_path):
+    """
+    Build the BM25 term-major sparse matrix and write it to index_path.
+
+    Layout (CSR by term): term_ptr[t]:term_ptr[t + 1] slices doc_ids/weights for term t, and each
+    weight is the full BM25 contribution of that term to that passage, so a query is a gather
+    and a bincount.
+    """
+    import numpy as np
+
+    tokenized = [tokenize(f"{passage['title']} {passage['text']}") for passage in passages]
+    lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float32)
+    avg_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+    postings = {}
+    for doc_id, tokens in enumerate(tokenized):
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings.setdefault(token, []).append((doc_id, count))
+
+    vocabulary = {}
+    term_ptr = [0]
+    doc_ids = []
+    weights = []
+    num_docs = len(passages)
+    for term_id, (token, entries) in enumerate(sorted(postings.items())):
+        vocabulary[token] = term_id
+        idf = math.log(1 + (num_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+        for doc_id, count in entries:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avg_length)
+            doc_ids.append(doc_id)
+            weights.append(idf * count * (BM25_K1 + 1) / (count + norm))
+        term_ptr.append(len(doc_ids))
+
+    # Passage texts go into one UTF-8 blob with offsets so they can be memory-mapped as well
+    blobs = [json.dumps(passage, ensure_ascii=False).encode("utf-8") for passage in passages]
+    text_offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(blob) for blob in blobs], out=text_offsets[1:])
+
+    parent = os.path.dirname(index_path)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent)
+    np.save(os.path.join(staging, "term_ptr.npy"), np.array(term_ptr, dtype=np.int64))
+    np.save(os.path.join(staging, "doc_ids.npy"), np.array(doc_ids, dtype=np.int32))
+    np.save(os.path.join(staging, "weights.npy"), np.array(weights, dtype=np.float32))
+    np.save(os.path.join(staging, "text_offsets.npy"), text_offsets)
+    with open(os.path.join(staging, "passages.bin"), "wb") as handle:
+        handle.write(b"".join(blobs))
+    with open(os.path.join(staging, "vocabulary.json"), "w", encoding="utf-8") as handle:
+        json.dump({"num_docs": num_docs, "terms": vocabulary}, handle)
+
+    try:
+        os.rename(staging, index_path)
+    except OSError:
+        # Another process finished the same index first
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class BM25Index:
+    """
+    Memory-mapped BM25 index over the career corpus.
+
+    numpy is imported on first use so importing this module stays cheap.
+    """
+
+    def __init__(self, index_path):
+        import numpy as np
+
+        with open(os.path.join(index_path, "vocabulary.json"), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        self.num_docs = meta["num_docs"]
+        self.vocabulary = meta["terms"]
+        self.term_ptr = np.load(os.path.join(index_path, "term_ptr.npy"), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(index_path, "doc_ids.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(index_path, "weights.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(index_path, "text_offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(index_path, "passages.bin")
+        self.passages_blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+
+    def passage(self, doc_id):
+        start, end = int(self.text_offsets[doc_id]), int(self.text_offsets[doc_id + 1])
+        return json.loads(bytes(self.passages_blob[start:end]).decode("utf-8"))
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """
+        Return [(score, passage)] for the top_k passages, best first.
+        """
+        import numpy as np
+
+        term_ids = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not term_ids or not self.num_docs:
+            return []
+
+        slices = [slice(self.term_ptr[term_id], self.term_ptr[term_id + 1]) for term_id in term_ids]
+        doc_ids = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        scores = np.bincount(doc_ids, weights=weights, minlength=self.num_docs)
+
+        top_k = min(top_k, self.num_docs)
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[doc_id]), self.passage(int(doc_id))) for doc_id in best if scores[doc_id] > 0]
+
+
+@shared_resource(max_entries=2)
+def _open_index(index_path):
+    return BM25Index(index_path)
+
+
+def remove_stale_indexes(index_dir, keep):
+    """
+    Delete index directories other than keep (a fingerprint); staging directories are left alone.
+
+    Readers that still have an old index memory-mapped keep working until they reopen.
+    """
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if name != keep and not name.startswith("tmp") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info("retrieval: removed stale index %s", name)
+
+
+class _RetrieverState:
+    """
+    The open index, the catalogue it was built from and when the corpus was last fingerprinted.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.catalogue = None
+        self.checked_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+
+_retriever = _RetrieverState()
+
+
+def _refresh(catalogue):
+    """
+    Fingerprint the corpus and open its index, building it (and removing stale ones) if it changed.
+    """
+    corpus_dir = getenv("CORPUS_DIR") or DEFAULT_CORPUS_DIR
+    index_dir = getenv("RETRIEVAL_INDEX_DIR") or DEFAULT_INDEX_DIR
+    with _retriever.build_lock:
+        fingerprint = corpus_fingerprint(catalogue, corpus_dir)
+        index_path = os.path.join(index_dir, fingerprint)
+        if not os.path.isdir(index_path):
+            build_index(collect_passages(catalogue, corpus_dir), index_path)
+            remove_stale_indexes(index_dir, fingerprint)
+        index = _open_index(index_path)
+    with _retriever.lock:
+        _retriever.index = index
+        _retriever.catalogue = catalogue
+        _retriever.checked_at = time.monotonic()
+        _retriever.refreshing = False
+    return index
+
+
+def _refresh_in_background(catalogue):
+    try:
+        _refresh(catalogue)
+    except Exception:
+        logger.exception("retrieval: refreshing the index failed, still serving the previous one")
+        with _retriever.lock:
+            _retriever.checked_at = time.monotonic()
+            _retriever.refreshing = False
+
+
+def get_retriever():
+    """
+    Return the shared BM25 index, building it on disk first if the corpus has changed.
+
+    The corpus is fingerprinted when the index is first opened (or the catalogue was reloaded),
+    then again at most every RETRIEVAL_RECHECK_SECONDS on a background thread, so queries
+    keep using the current index instead of scanning the corpus directory each time. If a
+    refresh fails, the last index that opened keeps being served.
+    """
+    catalogue = get_catalogue()
+    interval = env_number("RETRIEVAL_RECHECK_SECONDS", DEFAULT_RECHECK_INTERVAL)
+    with _retriever.lock:
+        index = _retriever.index
+        current = index is not None and _retriever.catalogue is catalogue
+        recheck = current and not _retriever.refreshing and time.monotonic() - _retriever.checked_at >= interval
+        if recheck:
+            _retriever.refreshing = True
+    if not current:
+        if index is None:
+            return _refresh(catalogue)
+        try:
+            return _refresh(catalogue)
+        except Exception:
+            logger.exception("retrieval: refreshing the index failed, still serving the previous one")
+            with _retriever.lock:
+                # Retried by the background recheck rather than on every query
+                _retriever.catalogue = catalogue
+                _retriever.checked_at = time.monotonic()
+            return index
+    if recheck:
+        threading.Thread(
+            target=_refresh_in_background, args=(catalogue,), name="retrieval-refresh", daemon=True
+        ).start()
+    return index
+
+
+@shared_resource
+def warm_retriever():
+    """
+    Build or open the index on a background thread, once per process, so the first question
+    does not wait for it. Returns the thread.
+    """
+    def warm():
+        try:
+            get_retriever()
+        except Exception:
+            logger.exception("retrieval: warming the index failed")
+
+    thread = threading.Thread(target=warm, name="retrieval-warm", daemon=True)
+    thread.start()
+    return thread
+
+
+def retrieve_context(query, top_k=None):
+    """
+    Retrieve the top-k passages for a query and format them for the prompt.
+
+    Returns (context_text, latency_ms); context_text is empty when nothing matched or no index
+    could be built, so the turn is answered without references. The latency covers the whole
+    call: getting the index, searching and formatting.
+    """
+    started_at = time.perf_counter()
+    top_k = top_k or int(getenv("RETRIEVAL_TOP_K") or DEFAULT_TOP_K)
+    try:
+        results = get_retriever().search(query, top_k)
+    except Exception:
+        logger.exception("retrieval: no index available, answering without reference material")
+        results = []
+
+    context = ""
+    if results:
+        sections = [
+            f"[{passage['title'] or passage['source']}]\n{passage['text']}"
+            for _, passage in results
+        ]
+        context = "Reference material for this question:\n\n" + "\n\n".join(sections)
+    return context, (time.perf_counter() - started_at) * 1000
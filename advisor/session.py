@@ -0,0 +1,115 @@
+import logging
+import time
+import uuid
+
+from advisor.history import PINNED_MESSAGES, HistoryManager
+from advisor.message_log import MessageLog
+
+logger = logging.getLogger(__name__)
+
+# Number of messages each conversation keeps in memory by default; older ones stay in the store
+DEFAULT_MAX_RESIDENT_MESSAGES = 200
+
+# Seconds a conversation's write lease lasts; it is renewed by writing after half of that
+DEFAULT_LEASE_SECONDS = 120.0
+
+
+class Conversation:
+    """
+    One student's conversation: the resident message log, its token-budgeted prompt history
+    and the durable store every message is written through to.
+
+    Only the holder of a conversation's store lease writes to it. A second tab opening the same
+    link, or a tab whose lease expired and was taken over, continues in a fork of the
+    conversation instead, so id can change; callers that put it in a URL should re-read it.
+    """
+
+    def __init__(self, store, conversation_id, message_log, history_manager=None,
+                 max_resident=DEFAULT_MAX_RESIDENT_MESSAGES, owner=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.store = store
+        self.id = conversation_id
+        self.log = message_log
+        self.history = history_manager or HistoryManager.from_env()
+        self.max_resident = max_resident
+        self.owner = owner or uuid.uuid4().hex
+        self.lease_seconds = lease_seconds
+        self._renew_at = 0.0
+
+    @classmethod
+    def start(cls, store, system_prompt, overview, max_resident=DEFAULT_MAX_RESIDENT_MESSAGES,
+              lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        A new conversation seeded with the (hidden) system prompt and industries overview.
+        """
+        conversation = cls(store, uuid.uuid4().hex, MessageLog(), max_resident=max_resident,
+                           lease_seconds=lease_seconds)
+        conversation.record("system", system_prompt, display=False)
+        conversation.record("assistant", overview, display=False)
+        return conversation
+
+    @classmethod
+    def resume(cls, store, conversation_id, max_resident=DEFAULT_MAX_RESIDENT_MESSAGES,
+               lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Reload a stored conversation (pinned messages plus the most recent ones), or None if unknown.
+
+        If another tab holds the conversation, the returned one is a fork with a new id.
+        """
+        store.flush()
+        last_seq = store.last_seq(conversation_id)
+        if last_seq < 0:
+            return None
+        owner = uuid.uuid4().hex
+        if not store.acquire(conversation_id, owner, lease_seconds):
+            forked_id = uuid.uuid4().hex
+            store.fork(conversation_id, forked_id)
+            logger.info("conversation %s is open elsewhere, continuing in %s", conversation_id, forked_id)
+            conversation_id = forked_id
+            last_seq = store.last_seq(conversation_id)
+        message_log = MessageLog.restore(
+            store.load_pinned(conversation_id, PINNED_MESSAGES),
+            store.load_recent(conversation_id, max_resident),
+            last_seq + 1,
+        )
+        return cls(store, conversation_id, message_log, max_resident=max_resident, owner=owner,
+                   lease_seconds=lease_seconds)
+
+    def record(self, role, content, display=True, api=True):
+        """
+        The single append path: the resident log, then the store, then the resident cap.
+        """
+        self._hold_lease()
+        message = self.log.append(role, content, display, api)
+        self.store.append(self.id, message.seq, {"role": role, "content": content, "display": display, "api": api})
+        self._enforce_resident_cap()
+        return message
+
+    def load_before(self, before_seq, limit):
+        """
+        Displayed messages older than before_seq that were trimmed from memory, oldest first.
+        """
+        return self.store.load_before(self.id, before_seq, limit)
+
+    def _hold_lease(self):
+        now = time.monotonic()
+        if now < self._renew_at:
+            return
+        if not self.store.acquire(self.id, self.owner, self.lease_seconds):
+            # The lease expired and another tab took the conversation over: fork what this one has
+            forked_id = uuid.uuid4().hex
+            self.store.fork(self.id, forked_id, before_seq=self.log.next_seq)
+            logger.info("conversation %s was taken over elsewhere, continuing in %s", self.id, forked_id)
+            self.id = forked_id
+            self.store.acquire(self.id, self.owner, self.lease_seconds)
+        self._renew_at = now + self.lease_seconds / 2
+
+    def _enforce_resident_cap(self):
+        # API turns normally leave memory long after the background summary covers them, but
+        # the cap holds even when summaries fail: the turns are in the store either way
+        summarized = self.history.forgettable()
+        dropped = self.log.trim(self.max_resident)
+        if dropped > summarized:
+            logger.info("conversation %s: %d turns left memory before a summary covered them",
+                        self.id, dropped - summarized)
+        if dropped:
+            self.history.forget(dropped)
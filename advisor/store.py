@@ -0,0 +1,340 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from advisor.config import ROOT, getenv
+from advisor.resources import shared_resource
+
+logger = logging.getLogger(__name__)
+
+# Default SQLite database (override with CONVERSATION_DB, or CONVERSATION_STORE=memory)
+DEFAULT_DB_PATH = os.path.join(ROOT, ".cache", "conversations.sqlite3")
+
+# Write-behind batching: flush after this many messages or this many seconds
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.25
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    display INTEGER NOT NULL,
+    api INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS leases (
+    session_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+INSERT_MESSAGE = (
+    "INSERT INTO messages (session_id, seq, role, content, display, api, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+_STOP = object()
+
+
+class ConversationStore:
+    """
+    Append-only message store for chat sessions.
+
+    Each message is a dict with role, content, display (shown in the chat) and api (sent to the
+    model), numbered per session by seq. A seq is written once: a second message with the same
+    seq is logged and dropped, never overwrites the first. Writers hold a lease on the session
+    (see acquire), so two tabs on one shared link do not number messages over each other.
+    """
+
+    def append(self, session_id, seq, message):
+        raise NotImplementedError
+
+    def acquire(self, session_id, owner, ttl):
+        """
+        Take or renew the write lease on a session for ttl seconds; False if another owner holds it.
+        """
+        raise NotImplementedError
+
+    def fork(self, session_id, new_session_id, before_seq=None):
+        """
+        Copy a session's messages (those below before_seq, if given) into a new session.
+        """
+        raise NotImplementedError
+
+    def load_recent(self, session_id, limit, api_only=False):
+        """
+        The newest `limit` messages of a session, oldest first.
+        """
+        raise NotImplementedError
+
+    def load_before(self, session_id, before_seq, limit, display_only=True):
+        """
+        Up to `limit` messages older than before_seq, oldest first (for lazy loading).
+        """
+        raise NotImplementedError
+
+    def load_pinned(self, session_id, count):
+        """
+        The first `count` API messages of a session (system prompt and seeded message).
+        """
+        raise NotImplementedError
+
+    def last_seq(self, session_id):
+        """
+        Highest stored seq of a session, or -1 if the session is unknown.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryConversationStore(ConversationStore):
+    """
+    In-process store, for tests and single-user runs; nothing survives a restart.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def append(self, session_id, seq, message):
+        with self._lock:
+            rows = self._sessions.setdefault(session_id, [])
+            if rows and rows[-1]["seq"] >= seq:
+                logger.warning("conversation store: %s already has message %d, dropping the new one", session_id, seq)
+                return
+            rows.append(dict(message, seq=seq))
+
+    def acquire(self, session_id, owner, ttl):
+        now = time.time()
+        with self._lock:
+            holder, expires_at = self._leases.get(session_id, (owner, 0.0))
+            if holder != owner and expires_at > now:
+                return False
+            self._leases[session_id] = (owner, now + ttl)
+            return True
+
+    def fork(self, session_id, new_session_id, before_seq=None):
+        with self._lock:
+            rows = [
+                dict(row) for row in self._sessions.get(session_id, [])
+                if before_seq is None or row["seq"] < before_seq
+            ]
+            self._sessions[new_session_id] = rows
+
+    def load_recent(self, session_id, limit, api_only=False):
+        with self._lock:
+            rows = [row for row in self._sessions.get(session_id, []) if row["api"] or not api_only]
+        return [dict(row) for row in rows[-limit:]] if limit else []
+
+    def load_before(self, session_id, before_seq, limit, display_only=True):
+        with self._lock:
+            rows = [
+                row for row in self._sessions.get(session_id, [])
+                if row["seq"] < before_seq and (row["display"] or not display_only)
+            ]
+        return [dict(row) for row in rows[-limit:]] if limit else []
+
+    def load_pinned(self, session_id, count):
+        with self._lock:
+            rows = [row for row in self._sessions.get(session_id, []) if row["api"]]
+        return [dict(row) for row in rows[:count]]
+
+    def last_seq(self, session_id):
+        with self._lock:
+            rows = self._sessions.get(session_id)
+            return rows[-1]["seq"] if rows else -1
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    SQLite store in WAL mode with write-behind batching.
+
+    append() only enqueues; a writer thread commits batches so the script thread never waits
+    on disk. Readers use their own per-thread connections, which WAL lets run alongside the
+    writer.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        writer = self._connect()
+        writer.execute("PRAGMA journal_mode=WAL")
+        writer.executescript(SCHEMA)
+        writer.commit()
+
+        self._local = threading.local()
+        self._pending = queue.Queue()
+        self._flushed = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+        self._thread = threading.Thread(target=self._write_loop, args=(writer,), name="conversation-store", daemon=True)
+        self._thread.start()
+
+        # Commit whatever is still queued when the server shuts down
+        atexit.register(self.close)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def append(self, session_id, seq, message):
+        with self._flushed:
+            self._enqueued += 1
+        self._pending.put((
+            session_id, seq, message["role"], message["content"],
+            int(message["display"]), int(message["api"]), time.time(),
+        ))
+
+    def acquire(self, session_id, owner, ttl):
+        connection = self._reader()
+        now = time.time()
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO leases (session_id, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (session_id, owner, now + ttl, now),
+            )
+        return cursor.rowcount == 1
+
+    def fork(self, session_id, new_session_id, before_seq=None):
+        self.flush()
+        connection = self._reader()
+        with connection:
+            connection.execute(
+                "INSERT INTO messages (session_id, seq, role, content, display, api, created_at) "
+                "SELECT ?, seq, role, content, display, api, created_at FROM messages "
+                "WHERE session_id = ? AND seq < ?",
+                (new_session_id, session_id, before_seq if before_seq is not None else 2 ** 62),
+            )
+
+    def flush(self, timeout=5.0):
+        """
+        Block until everything appended so far has been committed.
+        """
+        with self._flushed:
+            target = self._enqueued
+            self._flushed.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self):
+        self._pending.put(_STOP)
+        self._thread.join(timeout=5.0)
+
+    def _write_loop(self, connection):
+        while True:
+            item = self._pending.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._pending.put(_STOP)
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch(connection, batch)
+            except sqlite3.Error as e:
+                # Keep the thread alive: later messages still get written
+                logger.error("conversation store: dropped %d messages (%s)", len(batch), e)
+            finally:
+                with self._flushed:
+                    self._written += len(batch)
+                    self._flushed.notify_all()
+        connection.close()
+
+    @staticmethod
+    def _write_batch(connection, batch):
+        try:
+            with connection:
+                connection.executemany(INSERT_MESSAGE, batch)
+            return
+        except sqlite3.IntegrityError:
+            pass
+        # Some seq was already written (e.g. by another tab): keep the first copy of each message
+        for row in batch:
+            try:
+                with connection:
+                    connection.execute(INSERT_MESSAGE, row)
+            except sqlite3.IntegrityError:
+                logger.warning("conversation store: %s already has message %d, dropping the new one", row[0], row[1])
+
+    @staticmethod
+    def _rows(cursor):
+        return [
+            {"seq": seq, "role": role, "content": content, "display": bool(display), "api": bool(api)}
+            for seq, role, content, display, api in cursor
+        ]
+
+    def load_recent(self, session_id, limit, api_only=False):
+        rows = self._rows(self._reader().execute(
+            "SELECT seq, role, content, display, api FROM messages WHERE session_id = ? "
+            + ("AND api = 1 " if api_only else "")
+            + "ORDER BY seq DESC LIMIT ?",
+            (session_id, limit),
+        ))
+        rows.reverse()
+        return rows
+
+    def load_before(self, session_id, before_seq, limit, display_only=True):
+        rows = self._rows(self._reader().execute(
+            "SELECT seq, role, content, display, api FROM messages WHERE session_id = ? AND seq < ? "
+            + ("AND display = 1 " if display_only else "")
+            + "ORDER BY seq DESC LIMIT ?",
+            (session_id, before_seq, limit),
+        ))
+        rows.reverse()
+        return rows
+
+    def load_pinned(self, session_id, count):
+        return self._rows(self._reader().execute(
+            "SELECT seq, role, content, display, api FROM messages WHERE session_id = ? AND api = 1 "
+            "ORDER BY seq LIMIT ?",
+            (session_id, count),
+        ))
+
+    def last_seq(self, session_id):
+        row = self._reader().execute("SELECT MAX(seq) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row and row[0] is not None else -1
+
+
+@shared_resource
+def get_conversation_store():
+    """
+    Return the process-wide conversation store selected by CONVERSATION_STORE (sqlite or memory).
+    """
+    if getenv("CONVERSATION_STORE", "sqlite") == "memory":
+        return MemoryConversationStore()
+    return SQLiteConversationStore(getenv("CONVERSATION_DB") or DEFAULT_DB_PATH)
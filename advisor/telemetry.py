@@ -0,0 +1,443 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from advisor.config import env_number, getenv
+from advisor.resources import shared_resource
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached reply up to a slow generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800, 1600)
+
+# Rotating JSONL trace file defaults (overridable through the environment)
+DEFAULT_JSONL_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_JSONL_BACKUPS = 5
+
+# Trace records waiting for the writer thread; beyond this they are dropped rather than block a turn
+MAX_PENDING_RECORDS = 10000
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def exposition(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self, **labels):
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]} if series else None
+
+    def exposition(self):
+        with self._lock:
+            series = {key: (list(value["counts"]), value["sum"], value["count"]) for key, value in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class RotatingJsonlWriter:
+    """
+    Appends one JSON object per line, rotating to path.1 ... path.N once max_bytes is reached.
+
+    write() only enqueues; a writer thread owns the file, so sizing, rotating and appending
+    never happen on the script thread. Records beyond MAX_PENDING_RECORDS are dropped.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_JSONL_MAX_BYTES, backups=DEFAULT_JSONL_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._queue = queue.Queue(maxsize=MAX_PENDING_RECORDS)
+        self._flushed = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+        self._writer = threading.Thread(target=self._write_loop, name="telemetry-jsonl", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        with self._flushed:
+            self._enqueued += 1
+
+    def flush(self, timeout=5.0):
+        """
+        Block until every record written so far is on disk (or dropped by a failed write).
+        """
+        with self._flushed:
+            target = self._enqueued
+            self._flushed.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def _write_loop(self):
+        stream = None
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                try:
+                    stream = self._append(stream, json.dumps(record, separators=(",", ":"), default=str) + "\n")
+                except OSError as e:
+                    logger.warning("telemetry: dropped a trace record for %s (%s)", self.path, e)
+                    if stream is not None:
+                        stream.close()
+                        stream = None
+                finally:
+                    with self._flushed:
+                        self._written += 1
+                        self._flushed.notify_all()
+        finally:
+            if stream is not None:
+                stream.close()
+
+    def _append(self, stream, line):
+        if stream is None:
+            stream = open(self.path, "a", encoding="utf-8")
+        size = stream.tell()
+        if size and size + len(line) > self.max_bytes:
+            stream.close()
+            self._rotate()
+            stream = open(self.path, "a", encoding="utf-8")
+        stream.write(line)
+        if self._queue.empty():
+            stream.flush()
+        return stream
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Trace:
+    """
+    Timeline of one chat turn: named phase spans plus attributes, finished exactly once.
+    """
+
+    def __init__(self, telemetry, name, sampled, attributes=None):
+        self.telemetry = telemetry
+        self.name = name
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.spans = []
+        self.started_at = time.perf_counter()
+        self.wall_started_at = time.time()
+        self._finished = False
+
+    def span(self, phase):
+        return _Span(self, phase)
+
+    def record_span(self, phase, started_at, ended_at):
+        """
+        Add a span measured by the caller (perf_counter timestamps).
+        """
+        self.spans.append((phase, started_at, ended_at - started_at))
+
+    def add_duration(self, phase, seconds):
+        """
+        Add a phase made of scattered pieces (e.g. all re-renders of a streaming reply).
+        """
+        self.spans.append((phase, None, seconds))
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error=None):
+        if self._finished:
+            return
+        self._finished = True
+        self.telemetry._finish(self, time.perf_counter(), error)
+
+
+class _Span:
+    def __init__(self, trace, phase):
+        self.trace = trace
+        self.phase = phase
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.record_span(self.phase, self.started_at, time.perf_counter())
+        return False
+
+
+class _NullTrace:
+    """
+    Stand-in when telemetry is disabled, so instrumented code never branches on it.
+    """
+
+    sampled = False
+    attributes = {}
+
+    def span(self, phase):
+        return _NullSpan()
+
+    def record_span(self, phase, started_at, ended_at):
+        pass
+
+    def add_duration(self, phase, seconds):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+    def finish(self, error=None):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Telemetry:
+    """
+    Low-overhead counters, histograms and per-turn traces.
+
+    Metrics are always aggregated in memory (a lock and a few additions per observation) and
+    can be scraped in Prometheus text format; full traces are written to a rotating JSONL file
+    for a sampled share of turns only.
+    """
+
+    def __init__(self, sample_rate=1.0, jsonl_writer=None, enabled=True):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.jsonl_writer = jsonl_writer
+        self._metrics = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+        self.turns = self.counter("advisor_turns_total", "Chat turns by answer source")
+        self.errors = self.counter("advisor_errors_total", "Failed chat turns by error type")
+        self.upstream_events = self.counter(
+            "advisor_upstream_events_total", "Upstream requests, retries, failures and breaker rejections"
+        )
+        self.phase_seconds = self.histogram(
+            "advisor_turn_phase_seconds", "Time spent in each phase of a chat turn", LATENCY_BUCKETS
+        )
+        self.turn_seconds = self.histogram("advisor_turn_seconds", "Total chat turn time by source", LATENCY_BUCKETS)
+        self.ttft_seconds = self.histogram("advisor_ttft_seconds", "Time to first token by source", LATENCY_BUCKETS)
+        self.tokens_per_second = self.histogram(
+            "advisor_tokens_per_second", "Streaming rate of generated replies", TOKENS_PER_SECOND_BUCKETS
+        )
+
+    def counter(self, name, help_text):
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name, help_text, buckets):
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def gauge(self, name, help_text, read):
+        """
+        Register a gauge whose value (or {labels_tuple: value}) is read at scrape time.
+        """
+        with self._lock:
+            self._gauges[name] = (help_text, read)
+
+    def start_trace(self, name, **attributes):
+        if not self.enabled:
+            return NULL_TRACE
+        return Trace(self, name, random.random() < self.sample_rate, attributes)
+
+    def _finish(self, trace, ended_at, error):
+        source = trace.attributes.get("source", "unknown")
+        for phase, _, duration in trace.spans:
+            self.phase_seconds.observe(duration, phase=phase)
+        self.turn_seconds.observe(ended_at - trace.started_at, source=source)
+        if error is not None:
+            self.errors.inc(type=type(error).__name__)
+        else:
+            self.turns.inc(source=source)
+        if trace.attributes.get("ttft") is not None:
+            self.ttft_seconds.observe(trace.attributes["ttft"], source=source)
+        if trace.attributes.get("tokens_per_second"):
+            self.tokens_per_second.observe(trace.attributes["tokens_per_second"], source=source)
+
+        if trace.sampled and self.jsonl_writer is not None:
+            record = {
+                "trace": trace.name,
+                "ts": trace.wall_started_at,
+                "duration_ms": round((ended_at - trace.started_at) * 1000, 3),
+                "error": repr(error) if error is not None else None,
+                "attributes": trace.attributes,
+                "spans": [
+                    {
+                        "phase": phase,
+                        "start_ms": round((started_at - trace.started_at) * 1000, 3) if started_at is not None else None,
+                        "duration_ms": round(duration * 1000, 3),
+                    }
+                    for phase, started_at, duration in trace.spans
+                ],
+            }
+            try:
+                self.jsonl_writer.write(record)
+            except OSError as e:
+                logger.warning("telemetry: could not write trace (%s)", e)
+
+    def exposition(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            gauges = dict(self._gauges)
+        lines = []
+        for metric in metrics:
+            lines += metric.exposition()
+        for name, (help_text, read) in gauges.items():
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            if isinstance(value, dict):
+                lines += [f"{name}{_format_labels(key)} {sample}" for key, sample in sorted(value.items())]
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """
+        Serve /metrics on a background thread (Streamlit has no hook for extra routes).
+        """
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = telemetry.exposition().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="telemetry-metrics", daemon=True).start()
+        logger.info("telemetry: serving Prometheus metrics on %s:%d/metrics", host, server.server_address[1])
+        return server
+
+
+@shared_resource
+def get_telemetry():
+    """
+    Return the process-wide telemetry, configured by TELEMETRY (0 turns tracing off),
+    TELEMETRY_SAMPLE_RATE, TELEMETRY_JSONL and TELEMETRY_PROMETHEUS_PORT (both exports are off
+    unless set).
+    """
+    jsonl_path = getenv("TELEMETRY_JSONL")
+    telemetry = Telemetry(
+        enabled=getenv("TELEMETRY", "1") != "0",
+        sample_rate=env_number("TELEMETRY_SAMPLE_RATE", 1.0),
+        jsonl_writer=RotatingJsonlWriter(
+            jsonl_path,
+            max_bytes=env_number("TELEMETRY_JSONL_MAX_BYTES", DEFAULT_JSONL_MAX_BYTES, int),
+            backups=env_number("TELEMETRY_JSONL_BACKUPS", DEFAULT_JSONL_BACKUPS, int),
+        ) if jsonl_path else None,
+    )
+    port = env_number("TELEMETRY_PROMETHEUS_PORT", None, int)
+    if port is not None:
+        try:
+            telemetry.serve(port)
+        except OSError as e:
+            # Another process (e.g. a second Streamlit worker) already owns the port
+            logger.warning("telemetry: metrics endpoint not started on port %d (%s)", port, e)
+    return telemetry
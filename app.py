@@ -1,58 +1,96 @@
-import os
-from dotenv import load_dotenv
+import statistics
+import time
+from collections import deque
 import streamlit as st
-from groq import Groq
+from streamlit.runtime.scriptrunner import RerunException, StopException, get_script_run_ctx
+from advisor.catalogue import get_catalogue
+from advisor.chat import STOPPED_MARKER, SYSTEM_PROMPT, get_advisor
+from advisor.config import getenv
+from advisor.groq_client import is_connection_error
+from advisor.history import count_tokens
+from advisor.retrieval import warm_retriever
+from advisor.session import Conversation
+from advisor.store import get_conversation_store
+from advisor.telemetry import NULL_TRACE, get_telemetry
+from static_assets import inject_assets
 
 # Set page configuration - Must be called at the beginning
 st.set_page_config(page_title="Career Advisor ChatBot", layout="wide")
 
-# Load environment variables from the .env file
-load_dotenv()  # This will load variables from the .env file into the environment
+# Start of this script run, for the rerun time shown in the performance panel
+RERUN_STARTED_AT = time.perf_counter()
 
-# Retrieve the API key from the environment
-api_key = os.getenv("GROQ_API_KEY")
+# Shared chat core: engine, caches, routers and prefetcher (see the advisor package)
+advisor = get_advisor()
 
-# Ensure the API key is loaded
-if not api_key:
-    raise ValueError("API key not found. Please make sure the .env file contains 'GROQ_API_KEY'.")
+# Build or open the retrieval index in the background, so the first question does not wait for it
+warm_retriever()
 
-# Create Groq client with the API key
-client = Groq(api_key=api_key)
+# Per-turn traces and metrics (Prometheus endpoint and JSONL export are configured by env)
+telemetry = get_telemetry()
 
-# Function to get growing industries and their growth estimates dynamically
+# How often (in seconds) a streaming reply is re-rendered while chunks are arriving
+STREAM_FLUSH_INTERVAL = 0.05
+
+# Growing industries and their growth estimates, loaded once per process from data/industries.json
 def get_growing_industries():
-    industries = [
-        {"industry": "Technology", "growth_estimate": "5-10% annually", "icon": "💻", "description": "The technology industry is rapidly evolving, with sectors like AI, software development, cloud computing, and cybersecurity expanding. Professionals in this field are in high demand.",
-         "key_skills": ["Programming (Python, Java)", "Machine Learning", "Cloud Computing", "Cybersecurity", "Data Analysis"], "subjects": ["Computer Science", "Artificial Intelligence", "Software Engineering", "Mathematics", "Data Science"]},
-        {"industry": "Healthcare", "growth_estimate": "7-10% annually", "icon": "🏥", "description": "Healthcare is an essential and expanding field, covering areas such as medical services, health technology, pharmaceuticals, and patient care. Job opportunities continue to grow globally.",
-         "key_skills": ["Clinical Skills", "Patient Care", "Medical Research", "Pharmaceutical Knowledge", "Medical Coding"], "subjects": ["Medicine", "Pharmacy", "Nursing", "Biotechnology", "Healthcare Administration"]},
-        {"industry": "Renewable Energy", "growth_estimate": "8-12% annually", "icon": "🌱", "description": "Renewable energy is booming with an increasing global demand for sustainable power solutions, including solar, wind, and geothermal energy. Professionals in this field work on solving environmental challenges.",
-         "key_skills": ["Renewable Energy Systems", "Sustainable Engineering", "Project Management", "Environmental Science", "Energy Efficiency"], "subjects": ["Environmental Engineering", "Renewable Energy", "Sustainability", "Electrical Engineering", "Climate Science"]},
-        {"industry": "E-commerce", "growth_estimate": "6-9% annually", "icon": "🛒", "description": "E-commerce continues to expand globally as consumers shift toward online shopping. The industry includes online marketplaces, digital marketing, supply chain management, and logistics.",
-         "key_skills": ["Digital Marketing", "E-commerce Platforms", "SEO", "Supply Chain Management", "Data Analytics"], "subjects": ["Marketing", "Logistics", "Business Administration", "E-commerce", "Computer Science"]},
-        {"industry": "Finance & Fintech", "growth_estimate": "6-8% annually", "icon": "💰", "description": "Fintech is transforming financial services with new technologies like blockchain, digital currencies, and mobile banking. The financial industry is adapting to tech-driven innovations.",
-         "key_skills": ["Financial Analysis", "Blockchain", "Risk Management", "Cryptocurrency", "Data Analytics"], "subjects": ["Finance", "Economics", "Accounting", "Mathematics", "Computer Science"]},
-        {"industry": "Education Technology (EdTech)", "growth_estimate": "15% annually", "icon": "🎓", "description": "EdTech provides innovative solutions for online learning, virtual classrooms, and digital tools that enhance education. This sector is expanding rapidly with more people seeking remote learning options.",
-         "key_skills": ["Instructional Design", "Learning Management Systems", "Educational Software", "Data Analytics", "Content Development"], "subjects": ["Education", "Instructional Design", "Technology", "Psychology", "Business"]},
-        {"industry": "Logistics & Supply Chain", "growth_estimate": "4-8% annually", "icon": "🚚", "description": "Logistics and supply chain management ensures goods and services are delivered efficiently worldwide. This industry includes distribution networks, transportation management, and inventory control.",
-         "key_skills": ["Logistics Management", "Supply Chain Optimization", "Project Management", "Inventory Control", "Transportation Planning"], "subjects": ["Business Administration", "Logistics", "Operations Management", "Industrial Engineering", "Supply Chain Management"]},
-    ]
-    return industries
+    return get_catalogue().industries
+
+# Durable conversation store shared by every session
+conversation_store = get_conversation_store()
+
+# Number of messages each session keeps in memory; older ones stay in the store
+MAX_RESIDENT_MESSAGES = int(getenv("MAX_RESIDENT_MESSAGES") or 200)
+
+# Seconds a tab keeps its conversation to itself after its last message; another tab opening
+# the same link meanwhile continues in a copy of it
+CONVERSATION_LEASE_SECONDS = float(getenv("CONVERSATION_LEASE_SECONDS") or 120)
+
+# Single append path: the session's message log plus the durable store
+def record_message(role, content, display=True, api=True):
+    conversation = st.session_state.conversation
+    conversation.record(role, content, display, api)
+    # A conversation taken over by another tab continues under a new id
+    if st.query_params.get("sid") != conversation.id:
+        st.query_params["sid"] = conversation.id
+
+# Chat messages rendered on each rerun; older ones are paged in with "Load earlier messages"
+HISTORY_RENDER_WINDOW = int(getenv("HISTORY_RENDER_WINDOW") or 30)
+HISTORY_PAGE_SIZE = int(getenv("HISTORY_PAGE_SIZE") or 30)
+
+# Resume the conversation named by ?sid= in the URL, or start a new one
+def start_or_resume_session():
+    conversation_id = st.query_params.get("sid")
+    conversation = None
+    if conversation_id:
+        conversation = Conversation.resume(
+            conversation_store, conversation_id, MAX_RESIDENT_MESSAGES, CONVERSATION_LEASE_SECONDS
+        )
+    if conversation is None:
+        conversation = Conversation.start(
+            conversation_store, SYSTEM_PROMPT, get_catalogue().overview_markdown, MAX_RESIDENT_MESSAGES,
+            CONVERSATION_LEASE_SECONDS,
+        )
+    # A new conversation, or a fork when another tab already has this one open
+    if conversation.id != conversation_id:
+        st.query_params["sid"] = conversation.id
+    st.session_state.conversation = conversation
 
 # Initialize session state if not already initialized
-if "messages" not in st.session_state:
-    st.session_state.messages = []  # Initialize messages list
+if "conversation" not in st.session_state:
+    start_or_resume_session()
 
-if "conversation_history" not in st.session_state:
-    industries = get_growing_industries()
-    industries_message = "Here are 7 growing industries along with their estimated growth:\n\n"
-    for idx, industry in enumerate(industries):
-        industries_message += f"{idx + 1}. **{industry['industry']}** - Estimated Growth: {industry['growth_estimate']}\n"
-    
-    st.session_state.conversation_history = [
-        {"role": "system", "content": "You are a helpful assistant."},
-        {"role": "assistant", "content": industries_message},
-    ]
+# Recent per-turn streaming timings (time-to-first-token and total generation time)
+if "turn_timings" not in st.session_state:
+    st.session_state.turn_timings = deque(maxlen=50)
+
+# Number of chat messages to render, grown a page at a time by "Load earlier messages"
+if "history_window" not in st.session_state:
+    st.session_state.history_window = HISTORY_RENDER_WINDOW
+
+# Recent rerun timings (whole script and chat history rendering)
+if "rerun_timings" not in st.session_state:
+    st.session_state.rerun_timings = deque(maxlen=50)
 
 # Sidebar toggler and custom styling
 if "sidebar_visible" not in st.session_state:
@@ -60,107 +98,203 @@ if "sidebar_visible" not in st.session_state:
 
 # Sidebar content
 with st.sidebar:
-    # Apply custom styles for sidebar and nav items
-    st.markdown(
-        """
-        <style>
-        /* Change the sidebar background color */
-        [data-testid="stSidebar"] {
-            background-color: #f9fafb; /* Light purple */
-            padding-top: 0;  /* Remove any padding at the top */
-        }
-
-        /* Make the nav items align to the top left */
-        .nav-item {
-            font-size: 16px;
-            margin: 5px 0;  /* Adjusted margins to ensure spacing */
-            display: flex;
-            align-items: center;
-            justify-content: flex-start;  /* Align items to the left */
-        }
-
-        /* Style for the link */
-        .nav-item a {
-            text-decoration: none;
-            color: black;
-            display: flex;
-            align-items: center;
-            padding: 5px 10px;
-            border-radius: 5px;
-            width: 100%;  /* Ensure the item takes the full width of the sidebar */
-        }
-
-        /* Hover effect */
-        .nav-item a:hover {
-            background-color: #9C29B0;
-        }
-
-        /* Icon styling */
-        .nav-item i {
-            margin-right: 10px;  /* Space between icon and text */
-            font-size: 18px;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-     # Add Font Awesome CDN for icons and custom CSS for the spinning effect and positioning
-    st.markdown(
-            """
-            <style>
-            /* Add Font Awesome CDN */
-            @import url('https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.3/css/all.min.css');
-
-            /* Define the spin animation */
-            @keyframes spin {
-                0% { transform: rotate(0deg); }
-                100% { transform: rotate(360deg); }
-            }
-
-            /* Make the Exit link appear at the top left of the sidebar */
-            .nav-item {
-                display: flex;
-                align-items: center;
-                margin-bottom: 20px; /* Optional: space between items */
-                padding-left: 10px;
-            }
-
-            /* Exit link style */
-            .nav-item a {
-                text-decoration: none;
-                color: #B57EDC;
-                display: flex;
-                align-items: center;
-                font-size: 18px;
-            }
-
-            /* Icon style */
-            .nav-item i {
-                margin-right: 10px;
-                font-size: 20px; /* Adjust the size of the icon */
-            }
-
-            /* Apply spin effect on hover */
-            .nav-item a:hover i {
-                animation: spin 1s linear infinite;
-            }
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
+    # Self-hosted stylesheet bundle (sidebar, icons and cards), see static_assets.py
+    inject_assets()
 
     # Navigation item with the exit icon that spins on hover
     st.sidebar.markdown(
         """
         <div class="nav-item">
             <a href="https://career-chat-ai.vercel.app" target="_self">
-                <i class="fas fa-sign-out-alt"></i> Exit
+                <i class="app-icon app-icon-sign-out-alt"></i> Exit
             </a>
         </div>
         """,
         unsafe_allow_html=True,
     )
 
+# Identify the current browser session (used for fair scheduling across sessions)
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+# Show the queue position in the chat bubble until the engine starts the generation
+def wait_for_slot(handle, placeholder, poll_interval=0.25):
+    while not handle.started.wait(poll_interval):
+        ahead = handle.position()
+        wait = handle.estimated_wait()
+        eta = f" (about {max(1, round(wait))} s)" if wait is not None else ""
+        placeholder.markdown(
+            f"⏳ The advisor is busy with other students. You are number {ahead + 1} in the queue{eta}..."
+        )
+
+# Stream text chunks into a placeholder, flushing at most once per interval
+def stream_reply(chunks, placeholder, started_at, flush_interval=STREAM_FLUSH_INTERVAL, trace=NULL_TRACE, parts=None):
+    """
+    Render streamed chunks as they arrive and return the full reply with its timings.
+
+    Chunks are collected into parts, so the caller still has what was shown if the run is
+    interrupted mid-stream.
+    """
+    parts = [] if parts is None else parts
+    first_token_at = None
+    last_flush = time.perf_counter()
+    stream_started_at = last_flush
+    render_seconds = 0.0
+
+    for content in chunks:
+        now = time.perf_counter()
+        if first_token_at is None:
+            first_token_at = now
+        parts.append(content)
+
+        # Only re-render once the flush interval has elapsed to avoid a redraw per token
+        if now - last_flush >= flush_interval:
+            placeholder.markdown("".join(parts) + "▌")
+            last_flush = time.perf_counter()
+            render_seconds += last_flush - now
+
+    render_started_at = time.perf_counter()
+    assistant_reply = "".join(parts)
+    placeholder.markdown(assistant_reply)
+
+    finished_at = time.perf_counter()
+    render_seconds += finished_at - render_started_at
+    if first_token_at is not None:
+        trace.record_span("first_token", stream_started_at, first_token_at)
+        trace.record_span("stream", first_token_at, render_started_at)
+    trace.add_duration("render", render_seconds)
+    timings = {
+        "ttft": (first_token_at - started_at) if first_token_at is not None else None,
+        "total": finished_at - started_at,
+        "chunks": len(parts),
+    }
+    return assistant_reply, timings
+
+# Older messages that were trimmed from memory, fetched from the store once per page
+def load_earlier_messages(before_seq, count):
+    page = st.session_state.get("earlier_page")
+    if page is None or page["before_seq"] != before_seq or page["count"] != count:
+        rows = st.session_state.conversation.load_before(before_seq, count)
+        page = {
+            "before_seq": before_seq,
+            "count": count,
+            "messages": [(row["role"], row["content"]) for row in rows],
+        }
+        st.session_state.earlier_page = page
+    return page["messages"]
+
+def show_earlier_messages():
+    st.session_state.history_window += HISTORY_PAGE_SIZE
+
+# Render only the newest messages so a rerun costs the same however long the session is
+def render_history():
+    started_at = time.perf_counter()
+    message_log = st.session_state.conversation.log
+    window = st.session_state.history_window
+
+    recent, more_resident = message_log.recent_display(window)
+    shortfall = window - len(recent)
+    earlier = []
+    if shortfall > 0 and message_log.truncated():
+        earlier = load_earlier_messages(message_log.oldest_seq(), shortfall)
+        more_stored = len(earlier) == shortfall
+    else:
+        more_stored = shortfall <= 0 and message_log.truncated()
+
+    if more_resident or more_stored:
+        st.button("Load earlier messages", key="load_earlier_messages", on_click=show_earlier_messages)
+
+    for role, content in earlier:
+        with st.chat_message(role):
+            st.markdown(content)
+    for message in recent:
+        with st.chat_message(message.role):
+            st.markdown(message.content)
+
+    st.session_state.history_render = {
+        "ms": (time.perf_counter() - started_at) * 1000,
+        "messages": len(earlier) + len(recent),
+    }
+
+# Keep the duration of each rerun so the panel can show it stays flat as sessions grow
+def record_rerun_time():
+    history_render = st.session_state.get("history_render", {"ms": 0.0, "messages": 0})
+    st.session_state.rerun_timings.append({
+        "total_ms": (time.perf_counter() - RERUN_STARTED_AT) * 1000,
+        "history_ms": history_render["ms"],
+        "messages": history_render["messages"],
+    })
+
+# Operator-facing performance counters, shown in the sidebar when SHOW_PERF_STATS=1
+def render_perf_stats():
+    if getenv("SHOW_PERF_STATS") != "1":
+        return
+
+    cache_stats = advisor.response_cache.stats()
+    router_stats = advisor.query_router.stats()
+    prefetch_stats = advisor.prefetcher.stats()
+    engine_stats = advisor.engine.stats()
+    with st.sidebar.expander("Performance", expanded=False):
+        st.caption(
+            f"Generations: {engine_stats['active']}/{engine_stats['max_concurrency']} running, "
+            f"{engine_stats['queued']}/{engine_stats['max_queue'] or '∞'} queued, {engine_stats['shed']} shed, "
+            f"{engine_stats['coalescing_ratio']:.0%} coalesced "
+            f"({engine_stats['coalesced']} of {engine_stats['submitted']} requests)"
+        )
+        if "upstream" in engine_stats:
+            upstream = engine_stats["upstream"]
+            st.caption(
+                f"Upstream: {upstream['requests']} requests, {upstream['retries']} retries, "
+                f"{upstream['failures']} failures, breaker {upstream['breaker']}"
+            )
+        for name, backend in engine_stats.get("backends", {}).items():
+            p95 = f"{backend['p95_ttft']:.2f}s" if backend["p95_ttft"] is not None else "n/a"
+            st.caption(
+                f"Backend {name}: {'healthy' if backend['healthy'] else 'unhealthy'}, {backend['requests']} requests, "
+                f"{backend['errors']} errors, p95 first token {p95}, {backend['wins']}/{backend['hedges']} hedges won"
+            )
+        st.caption(
+            f"Query router: {router_stats['hit_ratio']:.0%} answered locally "
+            f"({router_stats['routed']} routed, {router_stats['fallback']} sent on)"
+        )
+        st.caption(
+            f"Prefetch: {prefetch_stats['hit_rate']:.0%} hit rate ({prefetch_stats['hits']} hits, "
+            f"{prefetch_stats['misses']} misses, {prefetch_stats['launched']} launched), "
+            f"{prefetch_stats['used_tokens']} tokens used, {prefetch_stats['wasted_tokens']} wasted"
+        )
+        st.caption(
+            f"Response cache: {cache_stats['hit_rate']:.0%} hit rate "
+            f"({cache_stats['hits']} exact, {cache_stats['near_hits']} near, {cache_stats['misses']} misses, "
+            f"{cache_stats['entries']} entries)"
+        )
+        for tier_model, tier in advisor.model_router.stats().items():
+            avg_ttft = f"{tier['avg_ttft']:.2f}s" if tier["avg_ttft"] is not None else "n/a"
+            st.caption(
+                f"{tier_model}: {tier['turns']} turns, avg first token {avg_ttft}, "
+                f"{tier['input_tokens']} in / {tier['output_tokens']} out tokens, "
+                f"{tier['errors']} errors, {tier['fallbacks']} fallbacks"
+            )
+        if st.session_state.rerun_timings:
+            last_rerun = st.session_state.rerun_timings[-1]
+            median_rerun = statistics.median(timing["total_ms"] for timing in st.session_state.rerun_timings)
+            st.caption(
+                f"Rerun: {last_rerun['total_ms']:.1f} ms (median {median_rerun:.1f} ms over "
+                f"{len(st.session_state.rerun_timings)}), history {last_rerun['history_ms']:.1f} ms "
+                f"for {last_rerun['messages']} messages"
+            )
+        if st.session_state.turn_timings:
+            last_turn = st.session_state.turn_timings[-1]
+            ttft = f"{last_turn['ttft']:.2f}s" if last_turn["ttft"] is not None else "n/a"
+            st.caption(f"Last turn ({last_turn['source']}): first token {ttft}, total {last_turn['total']:.2f}s")
+            if "queue_wait" in last_turn:
+                st.caption(f"Last turn queue wait: {last_turn['queue_wait']:.2f}s")
+            if "input_tokens" in last_turn:
+                st.caption(
+                    f"Last turn input tokens: {last_turn['input_tokens']}, "
+                    f"retrieval {last_turn['retrieval_ms']:.1f} ms"
+                )
+
 # Streamlit application for displaying industries and chatbot interface
 def chatbot_interface():
     """
@@ -175,131 +309,135 @@ def chatbot_interface():
     # Add growing industries dynamically in cards
     st.markdown(industries_description, unsafe_allow_html=True)
 
-    # Add custom CSS for larger cards, bold industry names, and same width cards
-    st.markdown(
-        """
-        <style>
-        .industry-card {
-            border: 2px solid #B57EDC;
-            padding: 20px; /* Increased padding */
-            border-radius: 15px; /* Rounded corners */
-            margin-bottom: 20px;
-            height: 500px; /* Adjusted height for better proportion */
-            width: 100%; /* Ensure cards fill the available space */
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            align-items: center;
-            background-color: #f9fafb;
-            cursor: pointer;
-            transition: transform 0.3s ease;
-        }
-        .industry-card:hover {
-            transform: scale(1.05); /* Slight scaling effect on hover */
-        }
-        .industry-card h3 {
-            margin-bottom: 10px;
-            font-size: 22px; /* Larger font size for industry name */
-            font-weight: bold; /* Make the industry name bold */
-            color: #E0B0FF; /* Update the color to lavender */
-            text-align: center;
-        }
-        .industry-card p {
-            font-size: 16px; /* Larger font size for description */
-            margin: 0;
-            text-align: center;
-        }
-        .industry-card .icon {
-            font-size: 40px; /* Larger icon size */
-            margin-bottom: 10px;
-        }
-        .container {
-            display: flex;
-            justify-content: space-around;
-            flex-wrap: wrap;
-        }
-        .column {
-            width: 30%; /* Adjust this value to make cards uniformly sized */
-            margin: 10px;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
-
     # Get the industries dynamically
     industries = get_growing_industries()
 
     # Create a card layout for each industry with fixed height and width
-    col1, col2, col3 = st.columns(3)
-    for col, industries_subset in zip([col1, col2, col3], [industries[:3], industries[3:5], industries[5:]]):
+    columns = st.columns(3)
+    column_sizes = [len(industries) // 3 + (1 if idx < len(industries) % 3 else 0) for idx in range(3)]
+    column_starts = [sum(column_sizes[:idx]) for idx in range(3)]
+    for col, start, size in zip(columns, column_starts, column_sizes):
+        industries_subset = industries[start:start + size]
         with col:
             for industry in industries_subset:
                 # Clickable card with industry name and growth estimate
-                if st.button(f"{industry['icon']} **{industry['industry']}**\nGrowth Estimate: {industry['growth_estimate']}"):
+                if st.button(industry["button_label"]):
                     # When a card is clicked, display detailed info about that industry
                     st.session_state.selected_industry = industry['industry']
                     st.session_state.industry_info = industry['description']
-                    # Add more detailed information including skills and subjects
-                    detailed_info = f"**Industry**: {industry['industry']}\n\n"
-                    detailed_info += f"**Growth Estimate**: {industry['growth_estimate']}\n\n"
-                    detailed_info += f"**Key Skills**: {', '.join(industry['key_skills'])}\n\n"
-                    detailed_info += f"**High-Level Subjects**: {', '.join(industry['subjects'])}\n\n"
-                    detailed_info += f"**Description**: {industry['description']}"
-
-                    # Update chat history with detailed industry info
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": detailed_info
-                    })
-
-    # Display chat history (including initial assistant message)
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-
-    # User input field
-    if user_input := st.chat_input("Type your message here..."):
-        # Add user input to chat history
-        st.session_state.messages.append({"role": "user", "content": user_input})
-        with st.chat_message("user"):
-            st.markdown(user_input)
+                    # Detailed information (skills and subjects) is precomputed in the catalogue
+                    detailed_info = industry["detail_markdown"]
 
-        # Add user input to conversation history
-        st.session_state.conversation_history.append({"role": "user", "content": user_input})
+                    # Start answering the most likely follow-up questions in the background
+                    advisor.select_industry(current_session_id(), industry)
 
-        try:
-            # Create chat completion with the conversation history
-            completion = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=st.session_state.conversation_history,
-                temperature=1,
-                max_completion_tokens=1024,
-                top_p=1,
-                stream=True,
-                stop=None
-            )
+                    # Update chat history with detailed industry info (the model sees it too)
+                    record_message("assistant", detailed_info)
+
+    # Display the most recent chat history; older messages load on demand
+    render_history()
+
+    # User input field, capped at the input filter's length limit unless the filter is off
+    input_filter = advisor.input_filter
+    max_chars = input_filter.max_chars if input_filter is not None and input_filter.mode != "off" else None
+    if user_input := st.chat_input("Type your message here...", max_chars=max_chars):
+        # Conversation state before this turn, used as the response cache context
+        cache_context = st.session_state.conversation.log.api_digest()
+        trace = telemetry.start_trace("chat_turn", session=current_session_id())
 
-            # Collect the chunks and combine them into a single response
-            assistant_reply = ""
-            for chunk in completion:
-                assistant_reply += chunk.choices[0].delta.content or ""
+        # Off-topic, spam and abusive messages (and those over the session's rate limit) are
+        # shown but kept out of the model's context
+        verdict = advisor.screen(user_input, trace=trace, session_id=current_session_id())
 
-            # Add AI response to chat history
-            st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
-            st.session_state.conversation_history.append({"role": "assistant", "content": assistant_reply})
+        # Add user input to chat and conversation history
+        record_message("user", user_input, api=verdict.allowed)
+        with st.chat_message("user"):
+            st.markdown(user_input)
+
+        turn = None
+        shown_parts = []
+        try:
             with st.chat_message("assistant"):
-                st.markdown(assistant_reply)
+                placeholder = st.empty()
+                stop_slot = st.empty()
+                started_at = time.perf_counter()
+
+                # Catalogue router, prefetched answer, response cache or a queued generation (or a
+                # catalogue-only answer when the queue is full)
+                turn = advisor.start_turn(
+                    current_session_id(),
+                    st.session_state.conversation,
+                    user_input,
+                    cache_context,
+                    selected_industry=st.session_state.get("selected_industry"),
+                    trace=trace,
+                    verdict=verdict,
+                )
+                trace.set(source=turn.source, model=turn.details.get("model"))
+
+                # The card's prefetched follow-ups only apply until the student asks something else
+                if turn.source != "prefetch":
+                    st.session_state.selected_industry = None
+                if turn.handle is not None:
+                    # Any click reruns the script, which stops the stream below; this makes it explicit
+                    stop_slot.button("Stop generating", key="stop_generating", icon=":material/stop_circle:")
+                    with trace.span("queue"):
+                        wait_for_slot(turn.handle, placeholder)
+                queue_wait = time.perf_counter() - started_at
+
+                # Render the chunks into the chat bubble as they arrive
+                assistant_reply, timings = stream_reply(
+                    turn.chunks, placeholder, started_at, trace=trace, parts=shown_parts
+                )
+                stop_slot.empty()
+                timings["source"] = turn.source
+                timings.update(turn.details)
+                if turn.source == "llm":
+                    timings["queue_wait"] = queue_wait
+                advisor.finish_turn(turn, assistant_reply)
+
+            # Add AI response to chat and conversation history
+            with trace.span("persist"):
+                record_message("assistant", assistant_reply, api=turn.api)
+            st.session_state.turn_timings.append(timings)
+
+            # Streaming rate only means something for replies that were actually generated
+            tokens_per_second = None
+            if turn.handle is not None and timings["ttft"] is not None:
+                stream_seconds = timings["total"] - timings["ttft"]
+                if stream_seconds > 0:
+                    tokens_per_second = count_tokens(assistant_reply) / stream_seconds
+            trace.set(ttft=timings["ttft"], tokens_per_second=tokens_per_second, chunks=timings["chunks"])
+            trace.finish()
+
+        except (RerunException, StopException):
+            # A new message, a click (including Stop generating) or a closed tab interrupted the
+            # stream: cancel the generation so its tokens and connection are released, keep the
+            # partial reply, then let Streamlit carry on with the rerun or shutdown
+            partial_reply = advisor.stop_turn(turn, "".join(shown_parts))
+            record_message("assistant", partial_reply, api=partial_reply != STOPPED_MARKER)
+            trace.set(stopped=True)
+            trace.finish()
+            raise
 
         except Exception as e:
+            trace.finish(error=e)
+
+            # A broken pooled connection would keep failing, so start the next turn with a fresh pool
+            if is_connection_error(e):
+                advisor.engine.reset_client()
+
             # Handle API issues
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": f"Oops, there was an issue with the API: {str(e)}. Please try again later."
-            })
+            record_message(
+                "assistant",
+                f"Oops, there was an issue with the API: {str(e)}. Please try again later.",
+                api=False,
+            )
             with st.chat_message("assistant"):
                 st.markdown(f"Oops, there was an issue with the API: {str(e)}. Please try again later.")
  
 # Run the chatbot interface
 if __name__ == "__main__":
     chatbot_interface()
+    record_rerun_time()
+    render_perf_stats()
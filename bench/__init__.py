@@ -0,0 +1,3 @@
+"""
+Offline benchmark suite: a fake Groq streaming server and AppTest-driven load scenarios.
+"""
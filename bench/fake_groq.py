@@ -0,0 +1,214 @@
+"""
+Local stand-in for the Groq (OpenAI-compatible) chat completions API, for offline benchmarks.
+
+    python -m bench.fake_groq --port 8765 --tokens-per-second 80 --latency 0.3 --error-rate 0.02
+
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:8765 and any GROQ_API_KEY. Replies
+stream as server-sent events at a fixed token rate after a configurable first-token latency;
+a share of requests can fail with a 500, be rate limited with a 429 and retry-after, or stall
+before the first token (to exercise hedging).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Filler vocabulary for generated replies
+WORDS = (
+    "students often start with internships and short courses before choosing a degree that "
+    "matches the skills employers in this industry keep asking for such as data analysis "
+    "communication project work and practical experience"
+).split()
+
+
+class FakeGroqConfig:
+    """
+    Behaviour of the fake server; attributes can be changed while it runs.
+    """
+
+    def __init__(self, tokens_per_second=100.0, latency=0.2, jitter=0.05, reply_tokens=120,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0, stall_rate=0.0, stall_latency=5.0, seed=None):
+        self.tokens_per_second = tokens_per_second
+        self.latency = latency
+        self.jitter = jitter
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stall_rate = stall_rate
+        self.stall_latency = stall_latency
+        self.random = random.Random(seed)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        event = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        self.server.count("requests")
+
+        config = self.config
+        roll = config.random.random()
+        if roll < config.error_rate:
+            self.server.count("errors")
+            self._send_json(500, {"error": {"message": "injected server error", "type": "internal_server_error"}})
+            return
+        if roll < config.error_rate + config.rate_limit_rate:
+            self.server.count("rate_limited")
+            self._send_json(
+                429,
+                {"error": {"message": "injected rate limit", "type": "rate_limit_exceeded"}},
+                headers=[("retry-after", str(config.retry_after))],
+            )
+            return
+
+        latency = config.latency + config.random.uniform(-config.jitter, config.jitter)
+        if config.random.random() < config.stall_rate:
+            self.server.count("stalled")
+            latency = config.stall_latency
+        time.sleep(max(0.0, latency))
+        plan = self.server.reply_plan(request)
+        model = request.get("model", "fake")
+
+        if not request.get("stream"):
+            content = "".join(text for _, text in plan)
+            self._send_json(200, {
+                "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(plan), "total_tokens": len(plan)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for delay, text in plan:
+                if delay > 0:
+                    time.sleep(delay)
+                self._send_chunk(json.dumps({
+                    "id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+                }))
+            self._send_chunk("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-stream (e.g. a cancelled generation)
+            self.server.count("disconnects")
+            self.close_connection = True
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    """
+    Threaded fake API server; use as a context manager to run it on a background thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, config=None):
+        super().__init__((host, port), _Handler)
+        self.config = config or FakeGroqConfig()
+        self._stats = {"requests": 0, "errors": 0, "rate_limited": 0, "stalled": 0, "disconnects": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_plan(self, request):
+        """
+        [(seconds to wait, text), ...] chunks of the reply, after the first-token latency.
+        """
+        config = self.config
+        reply_tokens = min(config.reply_tokens, request.get("max_completion_tokens") or config.reply_tokens)
+        interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        return [
+            (interval if index else 0.0, config.random.choice(WORDS) + " ")
+            for index in range(max(1, reply_tokens))
+        ]
+
+    def count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-groq", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Groq streaming server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of requests stalling before the first token")
+    parser.add_argument("--stall-latency", type=float, default=5.0, help="seconds a stalled request waits")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    config = FakeGroqConfig(
+        tokens_per_second=args.tokens_per_second, latency=args.latency, jitter=args.jitter,
+        reply_tokens=args.reply_tokens, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, stall_rate=args.stall_rate, stall_latency=args.stall_latency, seed=args.seed,
+    )
+    server = FakeGroqServer(args.host, args.port, config)
+    print(f"fake Groq API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
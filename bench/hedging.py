@@ -0,0 +1,88 @@
+"""
+Tail-latency benchmark for hedged requests across two local OpenAI-compatible stub servers.
+
+    python -m bench.hedging [--requests 200] [--concurrency 8] [--stall-rate 0.08]
+
+The primary backend is fast but stalls on a share of requests (a slow GPU, a long prefill);
+the secondary is steadier but slower. The same requests are streamed through the backend pool
+with hedging off and on, and the first-token latency percentiles are compared.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from advisor.backends import Backend, BackendPool
+from bench.fake_groq import FakeGroqConfig, FakeGroqServer
+from bench.run import percentiles
+
+REQUEST = {
+    "model": "llama-3.3-70b-versatile",
+    "messages": [{"role": "user", "content": "How do I become a data analyst?"}],
+    "max_completion_tokens": 40,
+}
+
+
+async def run_requests(pool, count, concurrency):
+    clients = pool.build_clients()
+    limit = asyncio.Semaphore(concurrency)
+    ttfts = []
+
+    async def one():
+        async with limit:
+            started_at = time.perf_counter()
+            first = None
+            async for _ in pool.stream(clients, REQUEST):
+                if first is None:
+                    first = time.perf_counter() - started_at
+            ttfts.append(first)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(count)))
+    elapsed = time.perf_counter() - started_at
+    await clients.close()
+    return ttfts, elapsed
+
+
+def run(hedging, args, primary_url, secondary_url):
+    pool = BackendPool(
+        [
+            Backend("primary", base_url=primary_url),
+            Backend("secondary", base_url=secondary_url),
+        ],
+        hedging=hedging,
+        hedge_min_samples=10,
+    )
+    ttfts, elapsed = asyncio.run(run_requests(pool, args.requests, args.concurrency))
+    result = {
+        f"ttft_{name}_ms": value for name, value in percentiles([t * 1000 for t in ttfts]).items() if name != "count"
+    }
+    result["elapsed_s"] = round(elapsed, 2)
+    result["backends"] = {
+        name: {key: stats[key] for key in ("requests", "hedges", "wins", "errors")}
+        for name, stats in pool.stats().items()
+    }
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stall-rate", type=float, default=0.08, help="share of primary requests that stall")
+    parser.add_argument("--stall-latency", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    primary = FakeGroqConfig(latency=0.15, jitter=0.05, reply_tokens=40, tokens_per_second=400,
+                             stall_rate=args.stall_rate, stall_latency=args.stall_latency, seed=1)
+    secondary = FakeGroqConfig(latency=0.35, jitter=0.05, reply_tokens=40, tokens_per_second=400, seed=2)
+    with FakeGroqServer(config=primary) as primary_server, FakeGroqServer(config=secondary) as secondary_server:
+        results = {
+            mode: run(mode == "hedged", args, primary_server.base_url + "/v1", secondary_server.base_url + "/v1")
+            for mode in ("single", "hedged")
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
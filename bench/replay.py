@@ -0,0 +1,210 @@
+"""
+Replay captured traffic (see advisor.capture) against the app, headless and offline.
+
+    python -m bench.replay captures/capture-*.jsonl.zst [--speedup 4] [--overlay 10 --stagger 2]
+
+Every captured session becomes a headless AppTest session that loads the page, clicks the
+same industry cards and sends the same (redacted) messages with the recorded think times.
+The fake backend answers each generation with the recorded chunks and inter-chunk gaps, found
+by the last user message of the request. --speedup divides the think times (and, with
+--scale-backend, the upstream timing); --overlay N replays N copies of every session, each
+started --stagger seconds after the previous one, to turn one class into a school.
+"""
+import argparse
+import glob
+import json
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from advisor.capture import read_capture
+from bench.fake_groq import FakeGroqConfig, FakeGroqServer
+from bench.run import (
+    BenchSession, configure_environment, patch_script_runner, percentiles, print_report, rss_mb,
+    share_test_runtime, _count_sources,
+)
+
+# Marker appended to each overlay copy's messages with --distinct, stripped by the backend
+COPY_SUFFIX = re.compile(r" \[copy \d+\]$")
+
+
+class Capture:
+    """
+    Sessions (ordered turn and click events) and generations loaded from capture files.
+    """
+
+    def __init__(self, paths):
+        texts = {}
+        self.sessions = defaultdict(list)
+        self.generations = []
+        for path in paths:
+            # Times restart in every file, so sessions of different files are kept apart
+            for record in read_capture(path):
+                kind = record["type"]
+                if kind == "text":
+                    texts[record["id"]] = record["text"]
+                elif kind in ("turn", "click"):
+                    event = dict(record, session=f"{path}:{record['session']}")
+                    if kind == "turn":
+                        event["input"] = texts.get(record["input"], "")
+                    self.sessions[event["session"]].append(event)
+                elif kind == "generation" and record.get("error") is None:
+                    messages = [(role, texts.get(text_id, "")) for role, text_id in record["messages"]]
+                    last_user = next((text for role, text in reversed(messages) if role == "user"), "")
+                    self.generations.append({"prompt": last_user, "chunks": record["chunks"]})
+        for events in self.sessions.values():
+            events.sort(key=lambda event: event["t"])
+
+
+class ReplayGroqServer(FakeGroqServer):
+    """
+    Fake backend that streams recorded generations with their recorded timing.
+
+    Requests are matched to recordings by their last user message; unmatched ones (e.g. after
+    a different cache or routing decision) get the next recording in round-robin order.
+    """
+
+    def __init__(self, generations, time_scale=1.0, **kwargs):
+        super().__init__(config=FakeGroqConfig(latency=0.0, jitter=0.0), **kwargs)
+        self.time_scale = time_scale
+        self._by_prompt = defaultdict(deque)
+        for generation in generations:
+            self._by_prompt[generation["prompt"]].append(generation)
+        self._all = list(generations)
+        self._next = 0
+        self._replay_lock = threading.Lock()
+        self._stats.update(matched=0, unmatched=0)
+
+    def reply_plan(self, request):
+        last_user = next(
+            (message["content"] for message in reversed(request.get("messages", [])) if message["role"] == "user"), ""
+        )
+        last_user = COPY_SUFFIX.sub("", last_user)
+        with self._replay_lock:
+            matches = self._by_prompt.get(last_user)
+            if matches:
+                generation = matches[0]
+                matches.rotate(-1)
+                self._stats["matched"] += 1
+            elif self._all:
+                generation = self._all[self._next % len(self._all)]
+                self._next += 1
+                self._stats["unmatched"] += 1
+            else:
+                return super().reply_plan(request)
+        return [(gap_ms / 1000 / self.time_scale, text) for gap_ms, text in generation["chunks"]] or [(0.0, " ")]
+
+
+def replay_session(session, events, start_delay, speedup, copy_index, distinct):
+    """
+    Drive one headless session through a captured session's events at their recorded pace.
+    """
+    time.sleep(start_delay)
+    started_at = time.perf_counter()
+    origin = events[0]["t"]
+    session.load()
+    for event in events:
+        wait = (event["t"] - origin) / speedup - (time.perf_counter() - started_at)
+        if wait > 0:
+            time.sleep(wait)
+        if event["type"] == "click":
+            labels = [button.label for button in session.at.button]
+            position = next((index for index, label in enumerate(labels) if event["industry"] in label), None)
+            if position is not None:
+                session.click_card(position)
+        else:
+            text = event["input"]
+            if distinct:
+                text = f"{text} [copy {copy_index}]"
+            session.ask(text)
+
+
+def run_replay(capture, speedup, overlay, stagger, distinct, timeout):
+    sessions = [events for events in capture.sessions.values() if any(event["type"] == "turn" for event in events)]
+    plans = [
+        (BenchSession(copy_index * len(sessions) + index, timeout), events, copy_index * stagger, copy_index)
+        for copy_index in range(overlay)
+        for index, events in enumerate(sessions)
+    ]
+    rss_before = rss_mb()
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(plans)), thread_name_prefix="replay") as pool:
+        futures = [
+            pool.submit(replay_session, session, events, delay, speedup, copy_index, distinct)
+            for session, events, delay, copy_index in plans
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started_at
+
+    bench_sessions = [session for session, _, _, _ in plans]
+    turns = [timing for session in bench_sessions for timing in session.turn_timings()]
+    return {
+        "sessions": len(bench_sessions),
+        "elapsed_s": elapsed,
+        "turns": len(turns),
+        "throughput_turns_per_s": len(turns) / elapsed if elapsed else 0.0,
+        "errors": sum(session.errors for session in bench_sessions),
+        "ttft_ms": percentiles([timing["ttft"] * 1000 for timing in turns if timing.get("ttft") is not None]),
+        "turn_ms": percentiles([timing["total"] * 1000 for timing in turns]),
+        "page_rerun_ms": percentiles([ms for session in bench_sessions for ms in session.page_reruns_ms]),
+        "turn_rerun_ms": percentiles([ms for session in bench_sessions for ms in session.turn_reruns_ms]),
+        "script_ms": percentiles([
+            timing["total_ms"] for session in bench_sessions for timing in session.app_rerun_timings()
+        ]),
+        "rss_mb_per_session": max(0.0, rss_mb() - rss_before) / max(1, len(bench_sessions)),
+        "sources": _count_sources(turns),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="capture files (globs are expanded)")
+    parser.add_argument("--speedup", type=float, default=1.0, help="divide recorded think times by this factor")
+    parser.add_argument("--scale-backend", action="store_true", help="also speed up the recorded upstream timing")
+    parser.add_argument("--overlay", type=int, default=1, help="copies of every captured session to run at once")
+    parser.add_argument("--stagger", type=float, default=0.0, help="seconds between the starts of overlay copies")
+    parser.add_argument("--distinct", action="store_true", help="tag each copy's messages so caches cannot share them")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per script run")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    paths = sorted({path for pattern in args.captures for path in (glob.glob(pattern) or [pattern])})
+    capture = Capture(paths)
+    print(f"loaded {len(capture.sessions)} sessions and {len(capture.generations)} generations from {len(paths)} file(s)")
+
+    time_scale = args.speedup if args.scale_backend else 1.0
+    with tempfile.TemporaryDirectory(prefix="advisor-replay-") as workdir, \
+            ReplayGroqServer(capture.generations, time_scale=time_scale) as server:
+        configure_environment(server.base_url, workdir)
+        share_test_runtime()
+        patch_script_runner()
+
+        # Warm-up session so imports, script compilation and the retrieval index are not
+        # charged to the replayed sessions
+        warm_up = BenchSession(-1, args.timeout)
+        warm_up.load()
+
+        results = {
+            "config": {
+                "captures": paths, "speedup": args.speedup, "scale_backend": args.scale_backend,
+                "overlay": args.overlay, "stagger": args.stagger, "distinct": args.distinct,
+            },
+            "scenarios": {
+                "replay": run_replay(capture, args.speedup, args.overlay, args.stagger, args.distinct, args.timeout),
+            },
+        }
+        results["fake_server"] = server.stats()
+
+    print_report(results)
+    print(f"\nfake backend: {results['fake_server']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+Offline load test: concurrent headless sessions of app.py against the fake Groq server.
+
+    python -m bench.run                                  # all scenarios, 4 concurrent sessions
+    python -m bench.run --scenario short_chat --sessions 16 --latency 0.5
+    python -m bench.run --compare bench/baseline.json    # exit 1 on a regression
+    python -m bench.run --save-baseline bench/baseline.json
+    python -m bench.run --store memory                   # in-memory conversations instead of SQLite
+
+Each session is a Streamlit AppTest driven from its own thread, so all sessions share one
+process (and one engine, cache and rate limiter) the way real students share a server. Each
+one gets its own script-run session id, so fair queuing and per-session rate limits treat
+them as separate students.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_groq import FakeGroqConfig, FakeGroqServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+
+DEFAULT_BASELINE = os.path.join(ROOT, "bench", "baseline.json")
+
+# Allowed slowdown (or throughput drop) against the baseline before --compare fails
+DEFAULT_TOLERANCE = 0.25
+
+QUESTIONS = (
+    "How do I become a data analyst?",
+    "What should I study to work in renewable energy?",
+    "Is nursing a good career for someone who likes biology?",
+    "What does a supply chain planner do every day?",
+    "Which programming languages should I learn first?",
+    "How can I get experience in finance while still at school?",
+    "What is the difference between a software engineer and a data scientist?",
+    "Can you give me a plan to get into cybersecurity?",
+)
+
+FOLLOW_UPS = ("What jobs are in {industry}?", "What should I study for {industry}?")
+
+# Session id of the BenchSession driving the script run on this thread
+_current_session = threading.local()
+
+
+def share_test_runtime():
+    """
+    Let AppTest sessions run concurrently in one process.
+
+    Each AppTest run installs a mock Runtime singleton and resets it to None when it finishes,
+    which breaks any other session still running; keep serving the last mock instead.
+    """
+    from streamlit.runtime import Runtime
+
+    if getattr(Runtime, "_bench_shared", False):
+        return
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+        elif last:
+            return last[0]
+        return cls._instance if cls._instance is not None else Runtime._original_instance()
+
+    def exists(cls):
+        return cls._instance is not None or bool(last)
+
+    Runtime._original_instance = Runtime.instance
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    Runtime._bench_shared = True
+
+
+def patch_script_runner():
+    """
+    Make AppTest script runs behave like sessions of one server.
+
+    AppTest runs every script as "test session id", which would make every simulated student
+    the same student to the engine's round-robin queue and the per-session rate limit; each
+    BenchSession's runs get its own id instead. Each run also gets a fresh script cache, so
+    concurrent sessions compile app.py at the same time, which Python 3.11's parser does not
+    survive; like a real server, they share one cache and compile it once.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    if getattr(LocalScriptRunner, "_bench_patched", False):
+        return
+    original_init = LocalScriptRunner.__init__
+    script_cache = ScriptCache()
+
+    def __init__(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self._script_cache = script_cache
+        session_id = getattr(_current_session, "id", None)
+        if session_id is not None:
+            self._session_id = session_id
+
+    LocalScriptRunner.__init__ = __init__
+    LocalScriptRunner._bench_patched = True
+
+
+class BenchSession:
+    """
+    One headless student session with timing of every script rerun.
+    """
+
+    def __init__(self, index, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.session_id = f"bench-{index}-{uuid.uuid4().hex[:8]}"
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.page_reruns_ms = []
+        self.turn_reruns_ms = []
+        self.turns = []
+        self.errors = 0
+
+    def _timed(self, action, samples):
+        _current_session.id = self.session_id
+        started_at = time.perf_counter()
+        action()
+        samples.append((time.perf_counter() - started_at) * 1000)
+        if self.at.exception:
+            self.errors += 1
+        # The app only keeps its latest turns, so collect each one as the rerun that made it ends
+        if "turn_timings" in self.at.session_state:
+            timings = self.at.session_state["turn_timings"]
+            if timings and (not self.turns or timings[-1] != self.turns[-1]):
+                self.turns.append(dict(timings[-1]))
+
+    def load(self):
+        self._timed(self.at.run, self.page_reruns_ms)
+
+    def click_card(self, position):
+        buttons = [button for button in self.at.button if button.key != "load_earlier_messages"]
+        button = buttons[position % len(buttons)]
+        self._timed(button.click().run, self.page_reruns_ms)
+        return button.label
+
+    def ask(self, text):
+        self._timed(self.at.chat_input[0].set_value(text).run, self.turn_reruns_ms)
+
+    def question(self, turn):
+        # Sessions start on different questions and tag them, so they mostly miss the shared cache
+        return f"{QUESTIONS[(self.index + turn) % len(QUESTIONS)]} (student {self.index}, turn {turn})"
+
+    def turn_timings(self):
+        return list(self.turns)
+
+    def app_rerun_timings(self):
+        return list(self.at.session_state["rerun_timings"]) if "rerun_timings" in self.at.session_state else []
+
+
+def scenario_cards(session):
+    """
+    Open the page, click three industry cards and ask a likely follow-up after each.
+    """
+    session.load()
+    for position in range(3):
+        label = session.click_card(session.index + position)
+        industry = label.split("**")[1] if "**" in label else label
+        session.ask(FOLLOW_UPS[position % len(FOLLOW_UPS)].format(industry=industry))
+
+
+def scenario_short_chat(session):
+    session.load()
+    for turn in range(3):
+        session.ask(session.question(turn))
+
+
+def scenario_long_chat(session):
+    session.load()
+    for turn in range(20):
+        session.ask(session.question(turn))
+
+
+SCENARIOS = {
+    "cards": scenario_cards,
+    "short_chat": scenario_short_chat,
+    "long_chat": scenario_long_chat,
+}
+
+
+def percentiles(values):
+    """
+    p50/p95/p99 (nearest rank) and the mean of a list of numbers, or None if it is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "p50": rank(50), "p95": rank(95), "p99": rank(99),
+        "mean": sum(ordered) / len(ordered), "count": len(ordered),
+    }
+
+
+def rss_mb():
+    """
+    Resident set size of this process in MiB.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(name, sessions, timeout):
+    from advisor.response_cache import get_response_cache
+
+    # Every scenario starts from a cold response cache
+    get_response_cache().clear()
+
+    rss_before = rss_mb()
+    bench_sessions = [BenchSession(index, timeout) for index in range(sessions)]
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix=f"bench-{name}") as pool:
+        list(pool.map(SCENARIOS[name], bench_sessions))
+    elapsed = time.perf_counter() - started_at
+    rss_after = rss_mb()
+
+    turns = [timing for session in bench_sessions for timing in session.turn_timings()]
+    return {
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "turns": len(turns),
+        "throughput_turns_per_s": len(turns) / elapsed if elapsed else 0.0,
+        "errors": sum(session.errors for session in bench_sessions),
+        "ttft_ms": percentiles([timing["ttft"] * 1000 for timing in turns if timing.get("ttft") is not None]),
+        "turn_ms": percentiles([timing["total"] * 1000 for timing in turns]),
+        "page_rerun_ms": percentiles([ms for session in bench_sessions for ms in session.page_reruns_ms]),
+        "turn_rerun_ms": percentiles([ms for session in bench_sessions for ms in session.turn_reruns_ms]),
+        "script_ms": percentiles([
+            timing["total_ms"] for session in bench_sessions for timing in session.app_rerun_timings()
+        ]),
+        "rss_mb_per_session": max(0.0, rss_after - rss_before) / sessions,
+        "sources": _count_sources(turns),
+    }
+
+
+def _count_sources(turns):
+    sources = {}
+    for timing in turns:
+        sources[timing["source"]] = sources.get(timing["source"], 0) + 1
+    return sources
+
+
+def flatten(results):
+    """
+    {"scenario.metric.stat": value} for every number that can be compared with a baseline.
+    """
+    flat = {}
+    for scenario, metrics in results["scenarios"].items():
+        for metric, value in metrics.items():
+            if isinstance(value, dict) and "p50" in value:
+                for stat in ("p50", "p95", "p99"):
+                    flat[f"{scenario}.{metric}.{stat}"] = value[stat]
+            elif metric in ("throughput_turns_per_s", "rss_mb_per_session"):
+                flat[f"{scenario}.{metric}"] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return [(metric, baseline, current, change)] for metrics that got worse than tolerance allows.
+    """
+    current = flatten(results)
+    regressions = []
+    for metric, previous in flatten(baseline).items():
+        value = current.get(metric)
+        if value is None or not previous:
+            continue
+        change = (value - previous) / previous
+        higher_is_better = metric.endswith("throughput_turns_per_s")
+        if (change < -tolerance) if higher_is_better else (change > tolerance):
+            regressions.append((metric, previous, value, change))
+    return regressions
+
+
+def print_report(results):
+    for scenario, metrics in results["scenarios"].items():
+        print(
+            f"\n{scenario}: {metrics['sessions']} sessions, {metrics['turns']} turns in {metrics['elapsed_s']:.1f}s "
+            f"({metrics['throughput_turns_per_s']:.2f} turns/s), {metrics['errors']} errors, "
+            f"{metrics['rss_mb_per_session']:.1f} MiB RSS/session, sources {metrics['sources']}"
+        )
+        for metric in ("ttft_ms", "turn_ms", "page_rerun_ms", "turn_rerun_ms", "script_ms"):
+            stats = metrics[metric]
+            if stats:
+                print(
+                    f"  {metric:<14} p50 {stats['p50']:8.1f}  p95 {stats['p95']:8.1f}  "
+                    f"p99 {stats['p99']:8.1f}  (n={stats['count']})"
+                )
+
+
+def configure_environment(base_url, workdir, store="sqlite"):
+    """
+    Point the app at the fake server and keep all state in a scratch directory.
+    """
+    defaults = {
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": base_url,
+        "CONVERSATION_STORE": store,
+        "CONVERSATION_DB": os.path.join(workdir, "conversations.sqlite3"),
+        "RETRIEVAL_INDEX_DIR": os.path.join(workdir, "retrieval"),
+        # Load is limited by the engine, not the free-tier rate limits
+        "GROQ_RPM": "100000",
+        "GROQ_TPM": "100000000",
+        # The per-session limit stays on, with a burst that fits the longest scripted session
+        "SESSION_MESSAGES_PER_MINUTE": "60",
+        "SESSION_MESSAGE_BURST": "25",
+    }
+    for name, value in defaults.items():
+        if name == "GROQ_BASE_URL" or not os.environ.get(name):
+            os.environ[name] = value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the career advisor app")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions per scenario")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds allowed per script run")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--store", choices=("sqlite", "memory"), default="sqlite", help="conversation store")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="store the results as the baseline")
+    args = parser.parse_args(argv)
+
+    config = FakeGroqConfig(
+        tokens_per_second=args.tokens_per_second, latency=args.latency, reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed,
+    )
+    scenarios = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+
+    with tempfile.TemporaryDirectory(prefix="advisor-bench-") as workdir, FakeGroqServer(config=config) as server:
+        configure_environment(server.base_url, workdir, args.store)
+
+        share_test_runtime()
+        patch_script_runner()
+
+        # Warm-up session so imports, the retrieval index and the client pool are not charged
+        # to the first scenario
+        warm_up = BenchSession(-1, args.timeout)
+        warm_up.load()
+        warm_up.ask("How do I become an electrician?")
+
+        results = {
+            "config": {
+                "sessions": args.sessions, "tokens_per_second": args.tokens_per_second, "latency": args.latency,
+                "reply_tokens": args.reply_tokens, "error_rate": args.error_rate,
+                "rate_limit_rate": args.rate_limit_rate, "store": args.store,
+            },
+            "scenarios": {name: run_scenario(name, args.sessions, args.timeout) for name in scenarios},
+        }
+        results["fake_server"] = server.stats()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nbaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("\nwarning: baseline was recorded with different settings", baseline.get("config"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for metric, previous, value, change in regressions:
+                print(f"  {metric}: {previous:.2f} -> {value:.2f} ({change:+.0%})")
+            return 1
+        print(f"\nno regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
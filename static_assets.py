@@ -0,0 +1,90 @@
+import hashlib
+import os
+import re
+import sys
+from urllib.parse import quote
+
+import streamlit as st
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(ROOT, "assets")
+
+# Served by Streamlit at app/static/ (server.enableStaticServing in .streamlit/config.toml)
+STATIC_DIR = os.path.join(ROOT, "static")
+BUNDLE_NAME = "app.min.css"
+
+# Stylesheets in cascade order; later rules win, as they did when each was its own <style> block
+STYLESHEETS = ("sidebar.css", "icons.css", "cards.css")
+
+# icon("name") in a stylesheet becomes a data URI of assets/icons/<name>.svg
+ICON_REFERENCE = re.compile(r'icon\("([\w-]+)"\)')
+
+
+def minify_css(css):
+    """
+    Strip comments and collapse whitespace; enough for hand-written CSS without strings.
+    """
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+def _icon_uri(name):
+    with open(os.path.join(ASSETS_DIR, "icons", f"{name}.svg"), encoding="utf-8") as f:
+        svg = re.sub(r"<!--.*?-->", "", f.read(), flags=re.S).strip()
+    return f'url("data:image/svg+xml,{quote(svg, safe=" =:/")}")'
+
+
+def build_bundle():
+    """
+    Concatenate, minify and write the stylesheet bundle; return (css, version).
+
+    The file is only rewritten when its content changes, so the ETag the static server
+    derives from it stays stable between restarts.
+    """
+    parts = []
+    for name in STYLESHEETS:
+        with open(os.path.join(ASSETS_DIR, name), encoding="utf-8") as f:
+            parts.append(f.read())
+    css = minify_css("\n".join(parts))
+    css = ICON_REFERENCE.sub(lambda match: _icon_uri(match.group(1)), css)
+    version = hashlib.sha256(css.encode("utf-8")).hexdigest()[:12]
+
+    path = os.path.join(STATIC_DIR, BUNDLE_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            unchanged = f.read() == css
+    except FileNotFoundError:
+        unchanged = False
+    if not unchanged:
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(css)
+        os.replace(tmp_path, path)
+    return css, version
+
+
+@st.cache_resource(show_spinner=False)
+def _asset_tag(static_serving):
+    css, version = build_bundle()
+    if static_serving:
+        # A few bytes per rerun; the browser fetches the bundle once and revalidates it by ETag
+        return f'<link rel="stylesheet" href="app/static/{BUNDLE_NAME}?v={version}">'
+    return f"<style>{css}</style>"
+
+
+def inject_assets():
+    """
+    Emit the app stylesheet: a link to the static bundle, or the minified CSS inline when
+    static serving is disabled. Built once per process; no third-party CDN is involved.
+    """
+    st.markdown(_asset_tag(bool(st.get_option("server.enableStaticServing"))), unsafe_allow_html=True)
+
+
+if __name__ == "__main__":
+    # Rebuild static/app.min.css after editing the stylesheets: python static_assets.py
+    css, version = build_bundle()
+    sys.stdout.write(f"{os.path.join(STATIC_DIR, BUNDLE_NAME)}: {len(css)} bytes, version {version}\n")
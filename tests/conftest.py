@@ -0,0 +1,24 @@
+import pytest
+
+from bench.fake_groq import FakeGroqConfig, FakeGroqServer
+
+
+@pytest.fixture
+def fake_server():
+    """
+    Start fake Groq servers for a test: fake_server(**FakeGroqConfig options) returns a running one.
+    """
+    servers = []
+
+    def start(**options):
+        options.setdefault("latency", 0.0)
+        options.setdefault("jitter", 0.0)
+        options.setdefault("tokens_per_second", 0)
+        options.setdefault("reply_tokens", 5)
+        server = FakeGroqServer(config=FakeGroqConfig(seed=0, **options)).__enter__()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from advisor.backends import Backend, BackendPool
+
+REQUEST = {"model": "fake", "messages": [{"role": "user", "content": "hi"}], "max_completion_tokens": 5}
+
+
+def pool_for(*servers, **options):
+    events = []
+    backends = [Backend(f"backend{index}", base_url=server.base_url + "/v1") for index, server in enumerate(servers)]
+    options.setdefault("hedge_max_delay", 0.1)
+    pool = BackendPool(backends, on_event=lambda event, backend: events.append((event, backend)), **options)
+    return pool, events
+
+
+def collect(pool, request=REQUEST):
+    async def run():
+        clients = pool.build_clients()
+        try:
+            return [text async for text in pool.stream(clients, request)]
+        finally:
+            await clients.close()
+    return asyncio.run(run())
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled(fake_server):
+    slow = fake_server(stall_rate=1.0, stall_latency=0.5, reply_tokens=50)
+    fast = fake_server()
+    pool, events = pool_for(slow, fast)
+
+    started_at = time.monotonic()
+    assert len(collect(pool)) == 5
+    assert time.monotonic() - started_at < 0.5
+    assert events == [("hedged", "backend1"), ("hedge_won", "backend1")]
+    assert pool.stats()["backend1"]["wins"] == 1
+
+    # The losing stream was closed, so the slow server finds its client gone once it replies
+    assert wait_for(lambda: slow.stats()["disconnects"] == 1)
+
+
+def test_failing_primary_fails_over(fake_server):
+    broken = fake_server(error_rate=1.0)
+    healthy = fake_server()
+    pool, events = pool_for(broken, healthy, hedging=False)
+    pool.backends[0].rate_limiter.max_attempts = 1
+
+    assert len(collect(pool)) == 5
+    assert events == [("failover", "backend1")]
+    assert broken.stats()["errors"] == 1
+    assert pool.stats()["backend0"]["errors"] == 1
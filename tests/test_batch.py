@@ -0,0 +1,105 @@
+import asyncio
+import io
+import json
+import threading
+
+import pytest
+
+from advisor import batch
+
+
+def write_input(tmp_path, count):
+    path = tmp_path / "questions.jsonl"
+    path.write_text("".join(json.dumps({"id": f"q{n}", "question": f"question {n}"}) + "\n" for n in range(count)))
+    return str(path)
+
+
+def output_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def run(input_path, output_path, **options):
+    options.setdefault("checkpoint_interval", 3600)
+    options.setdefault("progress_interval", 0)
+    return asyncio.run(batch.run_batch(input_path, output_path, 2, log=io.StringIO(), **options))
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    """
+    Replace the advisor with a stub; questions in answers.fail raise and those in answers.blocked
+    wait for answers.gate.
+    """
+    def answer(advisor, overview, record):
+        if record["question"] in answer.fail:
+            raise ConnectionError("upstream down")
+        if record["question"] in answer.blocked:
+            answer.started.append(record["id"])
+            answer.gate.wait(5)
+        return {"reply": f"reply to {record['question']}", "source": "llm", "output_tokens": 3}
+
+    answer.fail = set()
+    answer.blocked = set()
+    answer.gate = threading.Event()
+    answer.started = []
+    monkeypatch.setattr(batch, "get_advisor", lambda: None)
+    monkeypatch.setattr(batch, "answer", answer)
+    return answer
+
+
+def test_failed_lines_are_retried_on_resume(tmp_path, answers):
+    input_path = write_input(tmp_path, 6)
+    with open(input_path, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    output_path = str(tmp_path / "advice.jsonl")
+
+    answers.fail = {"question 1", "question 4"}
+    summary = run(input_path, output_path)
+    assert (summary["completed"], summary["failed"], summary["invalid"]) == (4, 2, 1)
+    assert sorted(line["line"] for line in output_lines(output_path)) == [0, 2, 3, 5, 6]
+
+    answers.fail = set()
+    summary = run(input_path, output_path, resume=True)
+    assert (summary["completed"], summary["failed"], summary["skipped"]) == (2, 0, 5)
+    lines = output_lines(output_path)
+    assert sorted(line["line"] for line in lines) == list(range(7))
+    assert [line["line"] for line in lines if "error" in line] == [6]
+
+
+def test_interrupted_run_resumes_without_duplicates(tmp_path, answers):
+    input_path = write_input(tmp_path, 8)
+    output_path = str(tmp_path / "advice.jsonl")
+    answers.blocked = {f"question {n}" for n in range(3, 8)}
+
+    async def interrupted():
+        task = asyncio.create_task(batch.run_batch(input_path, output_path, 2, progress_interval=0, log=io.StringIO()))
+        while len(answers.started) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(interrupted())
+    answers.gate.set()
+    assert sorted(line["line"] for line in output_lines(output_path)) == [0, 1, 2]
+    # A line half-written after the last checkpoint is cut off on resume
+    with open(output_path, "a", encoding="utf-8") as f:
+        f.write('{"line": 0, "rep')
+
+    answers.blocked = set()
+    summary = run(input_path, output_path, resume=True)
+    assert (summary["completed"], summary["skipped"]) == (5, 3)
+    assert sorted(line["line"] for line in output_lines(output_path)) == list(range(8))
+
+
+def test_resume_without_a_checkpoint_keeps_the_output(tmp_path, answers):
+    input_path = write_input(tmp_path, 2)
+    output_path = tmp_path / "advice.jsonl"
+    output_path.write_text('{"line": 0, "reply": "kept"}\n')
+
+    with pytest.raises(FileNotFoundError):
+        run(input_path, str(output_path), resume=True)
+    with pytest.raises(FileExistsError):
+        run(input_path, str(output_path))
+    assert output_path.read_text() == '{"line": 0, "reply": "kept"}\n'
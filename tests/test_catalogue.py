@@ -0,0 +1,25 @@
+import json
+import logging
+import os
+
+from advisor.catalogue import DEFAULT_CATALOGUE_PATH, get_catalogue
+
+
+def test_broken_catalogue_file_keeps_the_last_good_one(tmp_path, caplog):
+    path = str(tmp_path / "industries.json")
+    with open(DEFAULT_CATALOGUE_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    good = get_catalogue(path)
+
+    # A half-written file, with a newer mtime so the cache sees it as changed
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"version": 1, "industries": [')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    with caplog.at_level(logging.ERROR, logger="advisor.catalogue"):
+        assert get_catalogue(path) is good
+        assert get_catalogue(path) is good
+    assert caplog.text.count("could not load") == 1
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from advisor import chat
+from advisor.chat import BUSY_NOTICE, SYSTEM_PROMPT, Advisor
+from advisor.engine import GenerationEngine
+from advisor.model_router import ModelRouter
+from advisor.query_router import QueryRouter
+from advisor.ratelimit import SessionRateLimiter
+from advisor.response_cache import ResponseCache
+from advisor.session import Conversation
+from advisor.store import MemoryConversationStore
+
+QUESTION = "How should I plan a switch from retail into nursing over two years?"
+
+
+@pytest.fixture
+def busy_engine(monkeypatch):
+    """
+    An engine whose only slot is taken and whose queue holds nothing more.
+    """
+    monkeypatch.setattr(chat, "retrieve_context", lambda query: ("", 0.0))
+    release = threading.Event()
+
+    async def stream(client, request):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        yield "done"
+
+    engine = GenerationEngine(lambda: object(), stream=stream, max_concurrency=1, max_queue=0)
+    engine.submit("someone", {"messages": ["long answer"]})
+    deadline = time.monotonic() + 2
+    while engine.stats()["active"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield engine
+    release.set()
+
+
+def advisor_over(engine, **options):
+    return Advisor(engine, ResponseCache(), QueryRouter(), ModelRouter(), prefetcher=None, **options)
+
+
+def ask(advisor, session_id, question):
+    conversation = Conversation.start(MemoryConversationStore(), SYSTEM_PROMPT, "overview")
+    cache_context = conversation.log.api_digest()
+    verdict = advisor.screen(question, session_id=session_id)
+    conversation.record("user", question, api=verdict.allowed)
+    return advisor.start_turn(session_id, conversation, question, cache_context, verdict=verdict), cache_context
+
+
+def test_full_queue_answers_from_the_catalogue(busy_engine):
+    turn, _ = ask(advisor_over(busy_engine), "student", QUESTION)
+
+    assert turn.source == "degraded"
+    assert turn.details == {"shed": "queue_full"}
+    assert not turn.api and turn.handle is None
+    reply = "".join(turn.chunks)
+    assert reply.startswith(BUSY_NOTICE)
+    assert "Healthcare" in reply
+
+
+def test_full_queue_prefers_a_cached_reply_from_another_tier(busy_engine):
+    advisor = advisor_over(busy_engine)
+    model, fallback_models, _ = advisor.model_router.choose(QUESTION)
+    conversation = Conversation.start(MemoryConversationStore(), SYSTEM_PROMPT, "overview")
+    advisor.response_cache.put(fallback_models[0], QUESTION, "A cached plan.", conversation.log.api_digest())
+
+    turn, _ = ask(advisor, "student", QUESTION)
+    assert turn.source == "cache"
+    assert turn.details == {"shed": "queue_full"}
+    assert "".join(turn.chunks).strip() == "A cached plan."
+
+
+def test_sessions_over_their_message_rate_are_turned_away(busy_engine):
+    shed = []
+    advisor = advisor_over(
+        busy_engine, session_limiter=SessionRateLimiter(messages_per_minute=6, burst=2), on_shed=shed.append,
+    )
+
+    verdicts = [advisor.screen(QUESTION, session_id="fast") for _ in range(3)]
+    assert [verdict.allowed for verdict in verdicts] == [True, True, False]
+    rejected = verdicts[-1]
+    assert rejected.reason == "rate_limited"
+    # One message every 10 s refills the bucket
+    assert "wait 10 s" in rejected.reply
+    assert shed == ["rate_limited"]
+    assert advisor.screen(QUESTION, session_id="other").allowed
+
+    turn, _ = ask(advisor, "fast", QUESTION)
+    assert turn.source == "filter" and not turn.api
+    assert "".join(turn.chunks) == rejected.reply
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from advisor.backends import Backend, BackendPool
+from advisor.engine import GenerationCancelled, GenerationEngine, QueueFull
+
+
+def engine_with(stream, **options):
+    return GenerationEngine(lambda: object(), stream=stream, **options)
+
+
+def held_until(release):
+    """
+    A stream that keeps its slot until release is set.
+    """
+    async def stream(client, request):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        yield "done"
+
+    return stream
+
+
+def wait_for_active(engine, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while engine.stats()["active"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert engine.stats()["active"] == count
+
+
+def test_full_queue_sheds_bounded_submits_only():
+    release = threading.Event()
+    sheds = []
+    engine = engine_with(held_until(release), max_concurrency=1, max_queue=1, on_shed=lambda: sheds.append(1))
+
+    running = engine.submit("student-a", {"messages": ["running"]})
+    wait_for_active(engine, 1)
+    waiting = engine.submit("student-b", {"messages": ["waiting"]})
+
+    with pytest.raises(QueueFull):
+        engine.submit("student-c", {"messages": ["new"]})
+    # Joining a generation already in flight needs no slot, and batch work may still wait
+    assert engine.submit("student-c", {"messages": ["waiting"]}) is waiting
+    unbounded = engine.submit("student-c", {"messages": ["batch"]}, bounded=False)
+    assert engine.stats()["shed"] == 1 and sheds == [1]
+
+    release.set()
+    assert ["".join(handle) for handle in (running, waiting, unbounded)] == ["done"] * 3
+
+
+def test_queue_position_and_estimated_wait_follow_round_robin_order():
+    release = threading.Event()
+    engine = engine_with(held_until(release), max_concurrency=1, max_queue=None)
+    running = engine.submit("student-a", {"messages": ["running"]})
+    wait_for_active(engine, 1)
+
+    a_first = engine.submit("student-a", {"messages": ["a1"]})
+    a_second = engine.submit("student-a", {"messages": ["a2"]})
+    b_first = engine.submit("student-b", {"messages": ["b1"]})
+    assert [handle.position() for handle in (a_first, b_first, a_second)] == [0, 1, 2]
+
+    # No generation has finished yet, so there is no average duration to estimate from
+    assert a_first.estimated_wait() is None
+    engine._average_duration = 2.0
+    assert [handle.estimated_wait() for handle in (a_first, b_first, a_second)] == [2.0, 4.0, 6.0]
+    assert running.estimated_wait() == 0.0
+
+    release.set()
+    for handle in (running, a_first, a_second, b_first):
+        "".join(handle)
+
+
+def test_cancel_between_dispatch_and_first_step_finishes_the_handle():
+    calls = []
+
+    async def stream(client, request):
+        calls.append(request)
+        yield "never sent"
+
+    engine = engine_with(stream, max_concurrency=1)
+    create_task = engine._loop.create_task
+    cancelled = threading.Event()
+
+    # Cancel right after the handle left the queue, before its task has taken a step
+    def cancel_then_create(coroutine):
+        handle.cancel()
+        cancelled.set()
+        return create_task(coroutine)
+
+    engine._loop.create_task = cancel_then_create
+    # Hold the loop until the test has its handle
+    submitted = threading.Event()
+    engine._loop.call_soon_threadsafe(submitted.wait)
+    handle = engine.submit("session", {"messages": []})
+    submitted.set()
+
+    assert handle.finished.wait(2)
+    assert cancelled.is_set()
+    assert isinstance(handle.error, GenerationCancelled)
+    assert calls == []
+    assert engine.stats()["active"] == 0
+
+    # The slot was released: the next generation still runs
+    engine._loop.create_task = create_task
+    assert "".join(engine.submit("session", {"messages": [1]})) == "never sent"
+
+
+def engine_for(server, **options):
+    pool = BackendPool([Backend("fake", base_url=server.base_url + "/v1")], hedging=False)
+    return GenerationEngine(pool.build_clients, stream=pool.stream, **options)
+
+
+def request(content="hi"):
+    return {"model": "fake", "messages": [{"role": "user", "content": content}], "max_completion_tokens": 100}
+
+
+def wait_for_disconnect(server, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while server.stats()["disconnects"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return server.stats()["disconnects"] == 1
+
+
+def test_identical_requests_share_one_upstream_stream(fake_server):
+    server = fake_server(latency=0.3)
+    engine = engine_for(server)
+
+    first = engine.submit("student-a", request())
+    second = engine.submit("student-b", request())
+    other = engine.submit("student-c", request("something else"))
+
+    assert second is first
+    assert "".join(first) == "".join(second)
+    "".join(other)
+    assert server.stats()["requests"] == 2
+    assert engine.stats()["coalesced"] == 1
+
+
+def test_cancel_stops_a_running_generation_once_nobody_listens(fake_server):
+    server = fake_server(reply_tokens=100, tokens_per_second=20)
+    engine = engine_for(server)
+
+    handle = engine.submit("student-a", request())
+    assert engine.submit("student-b", request()) is handle
+    chunks = iter(handle)
+    next(chunks)
+
+    # One of two subscribers leaving keeps the stream going
+    assert not handle.cancel()
+    assert not handle.finished.is_set()
+
+    assert handle.cancel()
+    assert handle.finished.wait(2)
+    assert isinstance(handle.error, GenerationCancelled)
+    assert engine.stats()["active"] == 0
+    assert len(handle.text().split()) < 100
+    assert wait_for_disconnect(server)
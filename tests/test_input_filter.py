@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from advisor.input_filter import DEFAULT_MODEL_PATH, InputFilter, LinearModel, enforce_allowed, report_path
+
+
+@pytest.fixture(scope="module")
+def shipped_filter():
+    return InputFilter(LinearModel.load(DEFAULT_MODEL_PATH), mode="enforce")
+
+
+@pytest.mark.parametrize("text", [
+    "thanks!",
+    "ok",
+    "Explain that shorter",
+    "Can you help me write my CV?",
+    "what's the salary of a plumber",
+    "can you explain that a bit more simply",
+])
+def test_conversation_and_career_asks_are_allowed(shipped_filter, text):
+    assert shipped_filter.screen(text).allowed
+
+
+def test_short_messages_skip_the_model(shipped_filter):
+    verdict = shipped_filter.screen("you are trash")
+    assert verdict.allowed and verdict.reason == "short"
+
+
+def test_clear_off_topic_and_spam_are_still_screened(shipped_filter):
+    assert shipped_filter.screen("write my essay on the causes of world war 1").action == "redirect"
+    assert shipped_filter.screen("FREE CRYPTO GIVEAWAY visit www.getrich.biz now").action == "reject"
+
+
+def test_enforce_needs_a_precise_evaluation_report(tmp_path):
+    assert enforce_allowed(DEFAULT_MODEL_PATH)[0]
+
+    model_path = str(tmp_path / "model.json")
+    assert not enforce_allowed(model_path)[0]
+    with open(report_path(model_path), "w") as f:
+        json.dump({"examples": 100, "blocking": {"precision": 0.8}}, f)
+    assert not enforce_allowed(model_path)[0]
@@ -0,0 +1,87 @@
+import pytest
+
+from advisor.message_log import Message, MessageLog
+
+
+def seeded_log():
+    log = MessageLog()
+    log.append("system", "system prompt", display=False)
+    log.append("assistant", "overview", display=False)
+    return log
+
+
+def test_messages_are_slotted_with_interned_roles():
+    first = Message(0, "user", "hi", 3)
+    second = Message(1, "".join(["us", "er"]), "hello", 3)
+    assert first.role is second.role
+    with pytest.raises(AttributeError):
+        first.extra = True
+
+
+def test_api_view_is_extended_in_place():
+    log = seeded_log()
+    view = log.api_view()
+    log.append("user", "question")
+    log.append("assistant", "card details", api=False)
+    log.append("assistant", "answer")
+
+    assert log.api_view() is view
+    assert view == [
+        {"role": "system", "content": "system prompt"},
+        {"role": "assistant", "content": "overview"},
+        {"role": "user", "content": "question"},
+        {"role": "assistant", "content": "answer"},
+    ]
+    # Payloads are built once per message and shared by every later turn
+    assert view[2] is log._body[0].payload()
+
+
+def test_trim_keeps_pinned_messages_and_drops_payloads():
+    log = seeded_log()
+    for turn in range(4):
+        log.append("user", f"question {turn}")
+        log.append("assistant", f"card {turn}", api=False)
+
+    assert log.trim(3) == 3
+    assert [message.content for message in log.render_view()] == ["card 2", "question 3", "card 3"]
+    assert [payload["content"] for payload in log.api_view()] == [
+        "system prompt", "overview", "question 3",
+    ]
+    assert log.truncated()
+    assert log.oldest_seq() == 7
+    assert log.trim(3) == 0
+
+
+def test_digest_depends_only_on_api_messages():
+    first, second = seeded_log(), seeded_log()
+    assert first.api_digest() == second.api_digest()
+
+    first.append("user", "question")
+    second.append("assistant", "card details", api=False)
+    second.append("user", "question")
+    assert first.api_digest() == second.api_digest()
+
+    digest = first.api_digest()
+    first.append("assistant", "answer")
+    assert first.api_digest() != digest
+
+    # Trimming memory does not change the conversation state the digest stands for
+    digest = first.api_digest()
+    first.trim(0)
+    assert first.api_digest() == digest
+
+
+def test_restore_rebuilds_the_same_views():
+    log = seeded_log()
+    log.append("user", "question")
+    log.append("assistant", "answer")
+    rows = [
+        {"seq": message.seq, "role": message.role, "content": message.content,
+         "display": message.display, "api": message.api}
+        for message in log._pinned + log._body
+    ]
+
+    restored = MessageLog.restore(rows[:2], rows, log.next_seq)
+    assert restored.api_view() == log.api_view()
+    assert restored.api_digest() == log.api_digest()
+    assert restored.next_seq == 4 and not restored.truncated()
@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+
+from advisor.backends import openai_stream
+from advisor.model_router import ModelRouter
+from advisor.ratelimit import UpstreamStatusError
+
+ROUTER_OPTIONS = {"fast_model": "fast", "large_model": "large", "max_fast_words": 12}
+
+
+@pytest.mark.parametrize("question, model, reason", [
+    ("Thanks!", "fast", "simple"),
+    ("Can you make that shorter?", "fast", "simple"),
+    ("Nursing salaries", "fast", "simple"),
+    ("Should I study medicine?", "large", "complex"),
+    ("Compare nursing and teaching", "large", "complex"),
+    ("Tell me about jobs in mining today", "large", "default"),
+    ("Thanks, and what else do students in my town usually do after they finish school?", "large", "long"),
+])
+def test_tier_rules(question, model, reason):
+    chosen, fallbacks, why = ModelRouter(**ROUTER_OPTIONS).choose(question)
+    assert (chosen, why) == (model, reason)
+    assert fallbacks == ["large" if model == "fast" else "fast"]
+
+
+def generate(router, server, request):
+    """
+    Run a request through router.wrap over openai_stream; returns (reply, models tried).
+    """
+    tried = []
+
+    async def stream(client, request):
+        tried.append(request["model"])
+        if len(tried) > 1:
+            # Only the first tier misbehaves
+            server.config.stall_rate = server.config.error_rate = 0.0
+        async for text in openai_stream(client, request):
+            yield text
+
+    async def run():
+        async with httpx.AsyncClient(base_url=server.base_url + "/v1/") as client:
+            return "".join([text async for text in router.wrap(stream)(client, request)])
+
+    return asyncio.run(run()), tried
+
+
+def chat(model, fallback_models):
+    return {
+        "model": model, "fallback_models": fallback_models,
+        "messages": [{"role": "user", "content": "hi"}], "max_completion_tokens": 5,
+    }
+
+
+def test_slow_first_token_falls_back_to_the_large_tier(fake_server):
+    server = fake_server(stall_rate=1.0, stall_latency=2.0)
+    router = ModelRouter(first_token_timeout=0.3, **ROUTER_OPTIONS)
+
+    reply, tried = generate(router, server, chat("fast", ["large"]))
+    assert reply
+    assert tried == ["fast", "large"]
+    stats = router.stats()
+    assert stats["fast"]["errors"] == 1 and stats["fast"]["turns"] == 0
+    assert stats["large"]["fallbacks"] == 1 and stats["large"]["turns"] == 1
+
+
+def test_failed_tier_falls_back_and_last_tier_errors_surface(fake_server):
+    server = fake_server(error_rate=1.0)
+    router = ModelRouter(**ROUTER_OPTIONS)
+    reply, tried = generate(router, server, chat("fast", ["large"]))
+    assert reply and tried == ["fast", "large"]
+
+    server.config.error_rate = 1.0
+    with pytest.raises(UpstreamStatusError):
+        generate(router, server, chat("large", []))
+    assert router.stats()["large"]["errors"] == 1
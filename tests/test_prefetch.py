@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from advisor import prefetch
+from advisor.catalogue import get_catalogue
+from advisor.engine import GenerationEngine
+from advisor.prefetch import PREFETCH_MAX_COMPLETION_TOKENS, Prefetcher
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def release(monkeypatch):
+    """
+    Generations answer once release is set; retrieval is skipped.
+    """
+    monkeypatch.setattr(prefetch, "retrieve_context", lambda question: ("", 0.0))
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+def prefetcher_for(release, **options):
+    async def stream(client, request):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        yield f"answer to {request['messages'][-1]['content']}"
+
+    engine = GenerationEngine(lambda: object(), stream=stream, max_concurrency=4)
+    return Prefetcher(engine, "system prompt", **options)
+
+
+def industry(name):
+    return next(entry for entry in get_catalogue().industries if entry["industry"] == name)
+
+
+def wait_for_answers(prefetcher, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with prefetcher._lock:
+            if sum(entry["text"] is not None for entry in prefetcher._entries.values()) >= count:
+                return
+        time.sleep(0.01)
+    raise AssertionError("prefetches did not finish")
+
+
+def test_prefetch_stops_when_the_budget_runs_out(release):
+    prefetcher = prefetcher_for(release, tokens_per_hour=2 * PREFETCH_MAX_COMPLETION_TOKENS)
+    prefetcher.prefetch(industry("Technology"))
+
+    stats = prefetcher.stats()
+    assert (stats["launched"], stats["skipped_budget"], stats["entries"]) == (2, 1, 2)
+
+    # Unused reservations come back once the answers are in, so later clicks can prefetch again
+    release.set()
+    wait_for_answers(prefetcher, 2)
+    assert prefetcher.budget.available() > PREFETCH_MAX_COMPLETION_TOKENS
+
+
+def test_entries_are_keyed_by_industry_and_expire(release, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(prefetch, "time", clock)
+    release.set()
+    prefetcher = prefetcher_for(release, max_per_click=1, ttl_seconds=60)
+    prefetcher.prefetch(industry("Technology"))
+    wait_for_answers(prefetcher, 1)
+
+    assert prefetcher.lookup("Healthcare", "What jobs are there?") is None
+    assert prefetcher.lookup("Technology", "what jobs are there?") == (
+        "text", "answer to What jobs are in Technology?",
+    )
+
+    clock.now += 61
+    assert prefetcher.lookup("Technology", "What jobs are there?") is None
+    assert prefetcher.stats()["entries"] == 0
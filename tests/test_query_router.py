@@ -0,0 +1,36 @@
+import pytest
+
+from advisor.query_router import QueryRouter
+
+
+@pytest.fixture
+def router():
+    return QueryRouter()
+
+
+@pytest.mark.parametrize("question", [
+    "I don't want to study technology, what else?",
+    "Is healthcare growing slower than technology?",
+    "Should I study medicine or is technology growth better?",
+    "which fields are good for people with no skills",
+    "what skills do i need for it",
+    "what skills and subjects for finance",
+])
+def test_questions_a_canned_answer_would_get_wrong_go_to_the_model(router, question):
+    assert router.route(question) is None
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("What skills do I need for Technology?", "Key skills for Technology"),
+    ("what subjects for healthcare", "High-level subjects for Healthcare"),
+    ("Is renewable energy growing?", "**Renewable Energy** is growing"),
+    ("What should I study for education technology?", "Education Technology (EdTech)"),
+    ("which industries require clinical skills", "**Healthcare** (Clinical Skills)"),
+])
+def test_plain_lookups_are_answered_locally(router, question, expected):
+    assert expected in router.route(question)
+
+
+def test_generic_words_alone_do_not_match_a_skill(router):
+    assert router.mentioned_industries("which careers use skills") == set()
+    assert router.mentioned_industries("what should i study for medicine") == {"Healthcare"}
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from advisor.backends import openai_stream
+from advisor.ratelimit import CircuitBreaker, CircuitOpenError, RateLimitedStream
+
+REQUEST = {"model": "fake", "messages": [{"role": "user", "content": "hi"}], "max_completion_tokens": 5}
+
+
+def collect(limiter, server, request=REQUEST):
+    async def run():
+        async with httpx.AsyncClient(base_url=server.base_url + "/v1/") as client:
+            return [text async for text in limiter(client, request)]
+    return asyncio.run(run())
+
+
+def healthy_after(server, failed_calls):
+    """
+    openai_stream, with the server's injected failures switched off after failed_calls calls.
+    """
+    calls = []
+
+    async def stream(client, request):
+        calls.append(request)
+        if len(calls) > failed_calls:
+            server.config.error_rate = server.config.rate_limit_rate = 0.0
+        async for text in openai_stream(client, request):
+            yield text
+
+    return stream
+
+
+def limiter_for(stream, **options):
+    options.setdefault("base_delay", 0.01)
+    options.setdefault("max_delay", 0.01)
+    return RateLimitedStream(stream, requests_per_minute=1e9, tokens_per_minute=1e9, **options)
+
+
+def test_429_is_retried_after_the_servers_retry_after(fake_server):
+    server = fake_server(rate_limit_rate=1.0, retry_after=0.3)
+    # Backoff alone would wait 30 s, so a quick success means retry-after was used
+    limiter = limiter_for(healthy_after(server, 1), base_delay=30, max_delay=30)
+
+    started_at = time.monotonic()
+    reply = collect(limiter, server)
+    elapsed = time.monotonic() - started_at
+
+    assert len(reply) == 5
+    assert 0.3 <= elapsed < 5
+    assert server.stats()["rate_limited"] == 1
+    assert limiter.stats()["retries"] == 1
+    # Rate limiting is not an outage
+    assert limiter.breaker.state == "closed"
+
+
+def test_5xx_is_retried_with_backoff(fake_server):
+    server = fake_server(error_rate=1.0)
+    limiter = limiter_for(healthy_after(server, 2), max_attempts=3)
+
+    assert len(collect(limiter, server)) == 5
+    assert server.stats()["errors"] == 2
+    assert limiter.stats()["retries"] == 2
+
+
+def test_no_retry_once_text_has_streamed(fake_server):
+    server = fake_server()
+
+    async def breaks_mid_stream(client, request):
+        async for text in openai_stream(client, request):
+            yield text
+            raise httpx.ReadError("connection dropped mid-stream")
+
+    limiter = limiter_for(breaks_mid_stream, max_attempts=3)
+    shown = []
+
+    async def run():
+        async with httpx.AsyncClient(base_url=server.base_url + "/v1/") as client:
+            async for text in limiter(client, REQUEST):
+                shown.append(text)
+
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(run())
+    assert len(shown) == 1
+    assert server.stats()["requests"] == 1
+    assert limiter.stats()["retries"] == 0
+
+
+def test_breaker_opens_then_half_opens_then_closes(fake_server):
+    server = fake_server(error_rate=1.0)
+    limiter = limiter_for(openai_stream, max_attempts=1, breaker=CircuitBreaker(failure_threshold=2, cooldown=0.3))
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            collect(limiter, server)
+    assert limiter.breaker.state == "open"
+
+    # Open: fail fast without calling upstream
+    with pytest.raises(CircuitOpenError):
+        collect(limiter, server)
+    assert server.stats()["requests"] == 2
+
+    time.sleep(0.3)
+    assert limiter.breaker.state == "half-open"
+    server.config.error_rate = 0.0
+    assert len(collect(limiter, server)) == 5
+    assert limiter.breaker.state == "closed"
+
+
+def test_trial_cancelled_while_waiting_for_a_bucket_frees_the_breaker(fake_server):
+    server = fake_server()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    limiter = RateLimitedStream(openai_stream, requests_per_minute=60, tokens_per_minute=1e9, breaker=breaker)
+    requests, _ = limiter.buckets(REQUEST["model"])
+    requests.try_acquire(requests.capacity)
+
+    async def cancelled_trial():
+        async with httpx.AsyncClient(base_url=server.base_url + "/v1/") as client:
+            task = asyncio.ensure_future(limiter(client, REQUEST).__anext__())
+            await asyncio.sleep(0.05)
+            assert not task.done()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(cancelled_trial())
+    assert not breaker._trial_running
+    assert server.stats()["requests"] == 0
+
+    requests.refund(requests.capacity)
+    assert len(collect(limiter, server)) == 5
+    assert breaker.state == "closed"
@@ -0,0 +1,83 @@
+import pytest
+
+from advisor import response_cache
+from advisor.response_cache import ResponseCache, minhash_signature, normalize_prompt, signature_similarity
+
+LONG_QUESTION = (
+    "I am in grade eleven and I enjoy maths and physics, so what skills do I need for a career in "
+    "technology and which subjects should I take next year?"
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+def similarity(left, right):
+    return signature_similarity(minhash_signature(normalize_prompt(left)), minhash_signature(normalize_prompt(right)))
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResponseCache(max_entries=2, near_duplicates=False)
+    cache.put("fast", "first", "reply 1")
+    cache.put("fast", "second", "reply 2")
+    assert cache.get("fast", "first") == "reply 1"
+
+    cache.put("fast", "third", "reply 3")
+    assert cache.get("fast", "second") is None
+    assert cache.get("fast", "first") == "reply 1"
+    assert cache.get("fast", "third") == "reply 3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(ttl_seconds=60)
+    cache.put("fast", "What jobs are in Technology?", "Developers.")
+    clock.now += 60
+    assert cache.get("fast", "what jobs are in technology") == "Developers."
+
+    clock.now += 1
+    assert cache.get("fast", "What jobs are in Technology?") is None
+    # An expired entry is not served as a near duplicate either
+    assert cache.get("fast", "What jobs are in Technology? please") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_near_duplicates_hit_above_the_threshold_only(clock):
+    cache = ResponseCache(similarity_threshold=0.9)
+    cache.put("large", LONG_QUESTION, "Study maths and IT.", context="history")
+
+    polite = LONG_QUESTION + " Please"
+    assert similarity(LONG_QUESTION, polite) >= 0.9
+    assert cache.get("large", polite, context="history") == "Study maths and IT."
+    assert cache.stats()["near_hits"] == 1
+
+    # Just under the threshold: one word dropped from a shorter question
+    question = "What skills do I need for a career in technology as a student?"
+    cache.put("large", question, "Programming.")
+    dropped_word = "What skills do I need for career in technology as a student?"
+    assert 0.85 < similarity(question, dropped_word) < 0.9
+    assert cache.get("large", dropped_word) is None
+    assert cache.get("large", "What skills do I need for a career in healthcare as a student?") is None
+
+    # Near duplicates never cross models or conversation contexts
+    assert cache.get("fast", polite, context="history") is None
+    assert cache.get("large", polite, context="another conversation") is None
+
+
+def test_near_duplicates_can_be_switched_off(clock):
+    cache = ResponseCache(near_duplicates=False)
+    cache.put("large", LONG_QUESTION, "Study maths and IT.")
+    assert cache.get("large", LONG_QUESTION + " Please") is None
+    assert cache.get("large", LONG_QUESTION.upper()) == "Study maths and IT."
@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+from advisor import retrieval
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    corpus_dir = tmp_path / "corpus"
+    corpus_dir.mkdir()
+    (corpus_dir / "trades.md").write_text("# Trades\n\nElectricians wire homes and need an apprenticeship.\n")
+    index_dir = tmp_path / "index"
+    monkeypatch.setenv("CORPUS_DIR", str(corpus_dir))
+    monkeypatch.setenv("RETRIEVAL_INDEX_DIR", str(index_dir))
+    monkeypatch.setattr(retrieval, "_retriever", retrieval._RetrieverState())
+    return corpus_dir, index_dir
+
+
+def count_fingerprints(monkeypatch):
+    calls = []
+    fingerprint = retrieval.corpus_fingerprint
+
+    def counting(*args):
+        calls.append(args)
+        return fingerprint(*args)
+
+    monkeypatch.setattr(retrieval, "corpus_fingerprint", counting)
+    return calls
+
+
+def test_queries_do_not_fingerprint_the_corpus(corpus, monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_RECHECK_SECONDS", "3600")
+    calls = count_fingerprints(monkeypatch)
+
+    for _ in range(5):
+        context, latency_ms = retrieval.retrieve_context("electrician apprenticeship")
+    assert "Electricians wire homes" in context
+    assert latency_ms > 0
+    assert len(calls) == 1
+
+
+def test_changed_corpus_is_picked_up_and_stale_index_removed(corpus, monkeypatch):
+    corpus_dir, index_dir = corpus
+    monkeypatch.setenv("RETRIEVAL_RECHECK_SECONDS", "0")
+    retrieval.retrieve_context("electrician")
+    first_index = set(os.listdir(index_dir))
+
+    (corpus_dir / "care.md").write_text("# Care\n\nMidwives support families through pregnancy.\n")
+    # The first query after the interval starts a background refresh and keeps the old index
+    retrieval.retrieve_context("midwife")
+    deadline = time.monotonic() + 5
+    while retrieval._retriever.refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    context, _ = retrieval.retrieve_context("midwives pregnancy")
+    assert "Midwives support families" in context
+    remaining = set(os.listdir(index_dir))
+    assert len(remaining) == 1 and not remaining & first_index
+
+
+def test_bad_corpus_files_are_skipped(corpus, caplog):
+    corpus_dir, _ = corpus
+    (corpus_dir / "broken.json").write_text('[{"text": "half written')
+    (corpus_dir / "mixed.json").write_text(
+        '{"passages": ["Nurses care for patients on hospital wards.", {"title": "no text"}, 42]}'
+    )
+
+    context, _ = retrieval.retrieve_context("nurses hospital wards")
+    assert "Nurses care for patients" in context
+    assert "Electricians" in retrieval.retrieve_context("electrician apprenticeship")[0]
+    assert "broken.json" in caplog.text
+    assert "skipped 2 passages" in caplog.text
+
+
+def test_failed_refresh_keeps_serving_the_last_index(corpus, monkeypatch):
+    retrieval.retrieve_context("electrician")
+    index = retrieval._retriever.index
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(retrieval, "build_index", fail)
+    monkeypatch.setattr(retrieval._retriever, "catalogue", object())
+    (corpus[0] / "care.md").write_text("# Care\n\nMidwives support families through pregnancy.\n")
+
+    context, _ = retrieval.retrieve_context("electrician apprenticeship")
+    assert "Electricians wire homes" in context
+    assert retrieval._retriever.index is index
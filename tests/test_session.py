@@ -0,0 +1,61 @@
+from concurrent.futures import Future
+
+from advisor.history import PINNED_MESSAGES, HistoryManager
+from advisor.session import Conversation
+from advisor.store import MemoryConversationStore
+
+
+def inline(summarize):
+    """
+    A summarizer whose Future is already done, so summaries finish before the next turn.
+    """
+    def submit(previous_summary, turns):
+        future = Future()
+        try:
+            future.set_result(summarize(previous_summary, turns))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return submit
+
+
+def failing_summary(previous_summary, turns):
+    raise ConnectionError("summary model unavailable")
+
+
+def start(summarize, max_resident=20):
+    conversation = Conversation.start(MemoryConversationStore(), "system prompt", "overview", max_resident)
+    conversation.history = HistoryManager(window_messages=4, summarize=inline(summarize))
+    return conversation
+
+
+def chat(conversation, turns):
+    for turn in range(turns):
+        conversation.record("user", f"question {turn}")
+        conversation.history.build_messages(conversation.log.api_view())
+        conversation.record("assistant", f"answer {turn}")
+
+
+def test_resident_cap_holds_when_summaries_fail(caplog):
+    conversation = start(failing_summary)
+    chat(conversation, 300)
+
+    assert len(conversation.log) <= conversation.max_resident + PINNED_MESSAGES
+    assert "summarizing older turns failed" in caplog.text
+
+    # The evicted turns are still in the store, and the prompt only holds resident turns
+    assert conversation.store.last_seq(conversation.id) == conversation.log.next_seq - 1
+    messages, _ = conversation.history.build_messages(conversation.log.api_view())
+    assert messages[-1]["content"] == "answer 299"
+    assert all(message["content"] != "question 0" for message in messages)
+
+
+def test_resident_cap_with_working_summaries():
+    conversation = start(lambda previous, turns: f"{len(turns)} turns")
+    chat(conversation, 300)
+
+    assert len(conversation.log) <= conversation.max_resident + PINNED_MESSAGES
+    assert conversation.history.summary
+    messages, _ = conversation.history.build_messages(conversation.log.api_view())
+    assert messages[:PINNED_MESSAGES][0]["content"] == "system prompt"
+    assert messages[-1]["content"] == "answer 299"
@@ -0,0 +1,77 @@
+import logging
+
+from advisor.session import Conversation
+from advisor.store import MemoryConversationStore, SQLiteConversationStore
+
+
+def sqlite_store(tmp_path):
+    return SQLiteConversationStore(str(tmp_path / "conversations.sqlite3"), flush_interval=0.01)
+
+
+def contents(store, session_id):
+    store.flush()
+    return [row["content"] for row in store.load_recent(session_id, 100)]
+
+
+def test_second_tab_on_a_shared_link_forks(tmp_path):
+    store = sqlite_store(tmp_path)
+    first = Conversation.start(store, "system prompt", "overview")
+    first.record("user", "first tab question")
+
+    second = Conversation.resume(store, first.id)
+    assert second.id != first.id
+    second.record("user", "second tab question")
+    first.record("assistant", "first tab answer")
+
+    assert contents(store, first.id) == ["system prompt", "overview", "first tab question", "first tab answer"]
+    assert contents(store, second.id) == ["system prompt", "overview", "first tab question", "second tab question"]
+    store.close()
+
+
+def test_resume_keeps_the_id_once_the_lease_expired(tmp_path):
+    store = sqlite_store(tmp_path)
+    first = Conversation.start(store, "system prompt", "overview", lease_seconds=0)
+    first.record("user", "question")
+
+    resumed = Conversation.resume(store, first.id)
+    assert resumed.id == first.id
+    resumed.record("user", "follow-up")
+    assert contents(store, first.id)[-2:] == ["question", "follow-up"]
+    store.close()
+
+
+def test_lost_lease_forks_on_the_next_message():
+    store = MemoryConversationStore()
+    first = Conversation.start(store, "system prompt", "overview", lease_seconds=0)
+    first.record("user", "question")
+    original_id = first.id
+
+    # Another tab takes the expired lease over and keeps writing
+    other = Conversation.resume(store, original_id)
+    assert other.id == original_id
+    other.record("user", "other tab question")
+
+    first.record("assistant", "answer")
+    assert first.id != original_id
+    assert [row["content"] for row in store.load_recent(first.id, 100)] == [
+        "system prompt", "overview", "question", "answer",
+    ]
+    assert [row["content"] for row in store.load_recent(original_id, 100)][-1] == "other tab question"
+
+
+def test_duplicate_seq_is_dropped_and_the_writer_keeps_going(tmp_path, caplog):
+    store = sqlite_store(tmp_path)
+    message = {"role": "user", "content": "original", "display": True, "api": True}
+    store.append("session", 0, message)
+    store.flush()
+
+    with caplog.at_level(logging.WARNING, logger="advisor.store"):
+        store.append("session", 0, dict(message, content="duplicate"))
+        store.append("session", 1, dict(message, content="next"))
+        assert contents(store, "session") == ["original", "next"]
+    assert "already has message 0" in caplog.text
+
+    assert store._thread.is_alive()
+    store.append("session", 2, dict(message, content="later"))
+    assert contents(store, "session") == ["original", "next", "later"]
+    store.close()
@@ -0,0 +1,21 @@
+import json
+
+from advisor.telemetry import RotatingJsonlWriter
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["n"] for line in f]
+
+
+def test_jsonl_writer_rotates_in_the_background(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    writer = RotatingJsonlWriter(path, max_bytes=40, backups=2)
+    for n in range(6):
+        writer.write({"n": n, "pad": "x" * 10})
+    writer.flush()
+
+    # Each record is 25 bytes, so every file holds one of the newest three
+    assert [lines(f"{path}.2"), lines(f"{path}.1"), lines(path)] == [[3], [4], [5]]
+    writer.close()
+    assert not writer._writer.is_alive()